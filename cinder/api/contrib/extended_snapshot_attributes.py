@@ -62,17 +62,20 @@ class ExtendedSnapshotAttributesController(wsgi.Controller):
 
             self._extend_snapshot(context, resp_obj.obj['snapshot'], snapshot)
 
-    @wsgi.extends
-    def detail(self, req, resp_obj):
+    @wsgi.extends(batch='snapshots')
+    def detail(self, req, resp_obj, items):
         context = req.environ['cinder.context']
         if authorize(context):
             # Attach our slave template to the response object
             resp_obj.attach(xml=ExtendedSnapshotAttributesTemplate())
 
-            snapshots = list(resp_obj.obj.get('snapshots', []))
-            db_snapshots = self._get_snapshots(context)
+            # Use the snapshots the controller looked up for this request
+            # and only list them again if some of them are missing
+            db_snapshots = req.cached_resource() or {}
+            if any(snapshot['id'] not in db_snapshots for snapshot in items):
+                db_snapshots = self._get_snapshots(context)
 
-            for snapshot_object in snapshots:
+            for snapshot_object in items:
                 try:
                     snapshot_data = db_snapshots[snapshot_object['id']]
                 except KeyError:
@@ -86,6 +86,7 @@ class VolumeTypeExtraSpecsController(wsgi.Controller):
         db.volume_type_extra_specs_update_or_create(context,
                                                     type_id,
                                                     specs)
+        volume_types.invalidate_cache()
         notifier_info = dict(type_id=type_id, specs=specs)
         notifier_api.notify(context, 'volumeTypeExtraSpecs',
                             'volume_type_extra_specs.create',
@@ -109,6 +110,7 @@ class VolumeTypeExtraSpecsController(wsgi.Controller):
         db.volume_type_extra_specs_update_or_create(context,
                                                     type_id,
                                                     body)
+        volume_types.invalidate_cache()
         notifier_info = dict(type_id=type_id, id=id)
         notifier_api.notify(context, 'volumeTypeExtraSpecs',
                             'volume_type_extra_specs.update',
@@ -137,6 +139,7 @@ class VolumeTypeExtraSpecsController(wsgi.Controller):
             db.volume_type_extra_specs_delete(context, type_id, id)
         except exception.VolumeTypeExtraSpecsNotFound as error:
             raise webob.exc.HTTPNotFound(explanation=error.msg)
+        volume_types.invalidate_cache()
 
         notifier_info = dict(type_id=type_id, id=id)
         notifier_api.notify(context, 'volumeTypeExtraSpecs',
@@ -42,12 +42,12 @@ class VolumeHostAttributeController(wsgi.Controller):
             volume = resp_obj.obj['volume']
             self._add_volume_host_attribute(context, req, volume)
 
-    @wsgi.extends
-    def detail(self, req, resp_obj):
+    @wsgi.extends(batch='volumes')
+    def detail(self, req, resp_obj, items):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumeListHostAttributeTemplate())
-            for volume in list(resp_obj.obj['volumes']):
+            for volume in items:
                 self._add_volume_host_attribute(context, req, volume)
 
 
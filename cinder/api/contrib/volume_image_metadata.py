@@ -33,10 +33,11 @@ class VolumeImageMetadataController(wsgi.Controller):
         super(VolumeImageMetadataController, self).__init__(*args, **kwargs)
         self.volume_api = volume.API()
 
-    def _get_all_images_metadata(self, context):
-        """Returns the image metadata for all volumes."""
+    def _get_images_metadata(self, context, volume_ids):
+        """Returns the image metadata of the given volumes."""
         try:
-            all_metadata = self.volume_api.get_volumes_image_metadata(context)
+            all_metadata = self.volume_api.get_volumes_image_metadata(
+                context, volume_ids=volume_ids)
         except Exception as e:
             LOG.debug('Problem retrieving volume image metadata. '
                       'It will be skipped. Error: %s', e)
@@ -70,13 +71,14 @@ class VolumeImageMetadataController(wsgi.Controller):
             resp_obj.attach(xml=VolumeImageMetadataTemplate())
             self._add_image_metadata(context, resp_obj.obj['volume'])
 
-    @wsgi.extends
-    def detail(self, req, resp_obj):
+    @wsgi.extends(batch='volumes')
+    def detail(self, req, resp_obj, items):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumesImageMetadataTemplate())
-            all_meta = self._get_all_images_metadata(context)
-            for volume in list(resp_obj.obj.get('volumes', [])):
+            all_meta = self._get_images_metadata(
+                context, [volume['id'] for volume in items])
+            for volume in items:
                 image_meta = all_meta.get(volume['id'], {})
                 self._add_image_metadata(context, volume, image_meta)
 
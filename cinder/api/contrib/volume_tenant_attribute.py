@@ -40,12 +40,12 @@ class VolumeTenantAttributeController(wsgi.Controller):
             volume = resp_obj.obj['volume']
             self._add_volume_tenant_attribute(context, req, volume)
 
-    @wsgi.extends
-    def detail(self, req, resp_obj):
+    @wsgi.extends(batch='volumes')
+    def detail(self, req, resp_obj, items):
         context = req.environ['cinder.context']
         if authorize(context):
             resp_obj.attach(xml=VolumeListTenantAttributeTemplate())
-            for volume in list(resp_obj.obj['volumes']):
+            for volume in items:
                 self._add_volume_tenant_attribute(context, req, volume)
 
 
@@ -123,6 +123,7 @@ class VolumeTypeEncryptionController(wsgi.Controller):
 
         db.volume_type_encryption_update_or_create(context, type_id,
                                                    encryption_specs)
+        volume_types.invalidate_cache()
         notifier_info = dict(type_id=type_id, specs=encryption_specs)
         notifier_api.notify(context, 'volumeTypeEncryption',
                             'volume_type_encryption.create',
@@ -154,6 +155,7 @@ class VolumeTypeEncryptionController(wsgi.Controller):
             raise webob.exc.HTTPBadRequest(explanation=expl)
         else:
             db.volume_type_encryption_delete(context, type_id)
+            volume_types.invalidate_cache()
 
         return webob.Response(status_int=202)
 
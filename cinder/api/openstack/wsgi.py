@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
 import inspect
 import math
 import time
@@ -28,6 +29,7 @@ from cinder import exception
 from cinder.openstack.common import gettextutils
 from cinder.openstack.common import jsonutils
 from cinder.openstack.common import log as logging
+from cinder.openstack.common import timeutils
 from cinder import utils
 from cinder import wsgi
 
@@ -333,11 +335,22 @@ class DictSerializer(ActionDispatcher):
         return ""
 
 
+def _json_default(value):
+    """Convert a value json can't serialize on its own.
+
+    View builder output is plain data except for timestamps, so those
+    are converted directly instead of through to_primitive().
+    """
+    if isinstance(value, datetime.datetime):
+        return timeutils.strtime(value)
+    return jsonutils.to_primitive(value)
+
+
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
     def default(self, data):
-        return jsonutils.dumps(data)
+        return jsonutils.dumps(data, default=_json_default)
 
 
 class XMLDictSerializer(DictSerializer):
@@ -652,6 +665,18 @@ def action_peek_xml(body):
     return action_node.tagName
 
 
+def _response_items(obj, key):
+    """Return the resources under key in a response body as a list."""
+    if not isinstance(obj, dict):
+        return []
+    value = obj.get(key)
+    if isinstance(value, dict):
+        return [value]
+    if isinstance(value, list):
+        return value
+    return []
+
+
 class ResourceExceptionHandler(object):
     """Context manager to handle Resource exceptions.
 
@@ -863,6 +888,18 @@ class Resource(wsgi.Application):
                     continue
                 except Fault as ex:
                     response = ex
+            elif getattr(ext, 'wsgi_batch', None):
+                # Batch extensions get all the resources of the response
+                # in one call, so they can look up their data in bulk
+                items = _response_items(resp_obj.obj, ext.wsgi_batch)
+                if not items:
+                    continue
+                try:
+                    with ResourceExceptionHandler():
+                        response = ext(req=request, resp_obj=resp_obj,
+                                       items=items, **action_args)
+                except Fault as ex:
+                    response = ex
             else:
                 # Regular functions get post-processing...
                 try:
@@ -1054,11 +1091,23 @@ def extends(*args, **kwargs):
         @extends(action='resize')
         def _action_resize(...):
             pass
+
+    An extension that adds data to every resource of a response can ask
+    for them as one list, given the key of the resources in the response
+    body, instead of looking up the data for each resource on its own::
+
+        @extends(batch='volumes')
+        def detail(self, req, resp_obj, items):
+            pass
+
+    Batch extensions are not called when the response has no resources.
     """
 
     def decorator(func):
         # Store enough information to find what we're extending
         func.wsgi_extends = (func.__name__, kwargs.get('action'))
+        if kwargs.get('batch'):
+            func.wsgi_batch = kwargs['batch']
         return func
 
     # If we have positional arguments, call the decorator
@@ -42,6 +42,16 @@ def validate_schema(xml, schema_name):
     relaxng.assertValid(xml)
 
 
+# Bumped whenever a template element gains or loses children, which
+# invalidates the rendering plans merged from the element trees.
+_tree_generation = 0
+
+
+def _tree_changed():
+    global _tree_generation
+    _tree_generation += 1
+
+
 class Selector(object):
     """Selects datum to operate on from an object."""
 
@@ -53,6 +63,13 @@ class Selector(object):
 
         self.chain = chain
 
+        # Work out once which elements of the chain are callables
+        self._steps = [(callable(elem), elem) for elem in chain]
+        if len(chain) == 1 and not self._steps[0][0]:
+            self._key = chain[0]
+        else:
+            self._key = None
+
     def __repr__(self):
         """Return a representation of the selector."""
 
@@ -69,10 +86,19 @@ class Selector(object):
                          raise a KeyError.
         """
 
+        # Fast path for the common selection of a single key
+        if self._key is not None:
+            try:
+                return obj[self._key]
+            except (KeyError, IndexError):
+                if do_raise:
+                    raise KeyError(self._key)
+                return None
+
         # Walk the selector list
-        for elem in self.chain:
+        for is_callable, elem in self._steps:
             # If it's callable, call it
-            if callable(elem):
+            if is_callable:
                 obj = elem(obj)
             else:
                 # Use indexing
@@ -220,6 +246,7 @@ class TemplateElement(object):
 
         self._children.append(elem)
         self._childmap[elem.tag] = elem
+        _tree_changed()
 
     def extend(self, elems):
         """Append children to the element."""
@@ -241,6 +268,7 @@ class TemplateElement(object):
         # Update the children
         self._children.extend(elemlist)
         self._childmap.update(elemmap)
+        _tree_changed()
 
     def insert(self, idx, elem):
         """Insert a child element at the given index."""
@@ -254,6 +282,7 @@ class TemplateElement(object):
 
         self._children.insert(idx, elem)
         self._childmap[elem.tag] = elem
+        _tree_changed()
 
     def remove(self, elem):
         """Remove a child element."""
@@ -267,6 +296,7 @@ class TemplateElement(object):
 
         self._children.remove(elem)
         del self._childmap[elem.tag]
+        _tree_changed()
 
     def get(self, key):
         """Get an attribute.
@@ -577,6 +607,46 @@ class Template(object):
         self.nsmap = nsmap or {}
         self.serialize_options = dict(encoding='UTF-8', xml_declaration=True)
 
+        # Merged element trees, keyed by the root elements merged
+        self._plans = {}
+
+    def _compile(self, siblings):
+        """Merge sibling template elements into a rendering plan.
+
+        Returns a (siblings, child plans) tuple, where the child plans
+        are the plans of the children of the siblings merged by tag.
+        The plan only depends on the template elements, so it is computed
+        once and then reused for every object serialized.
+
+        :param siblings: The TemplateElement instances to merge.
+        """
+
+        children = []
+        seen = set()
+        for idx, sibling in enumerate(siblings):
+            for child in sibling:
+                # Have we handled this child already?
+                if child.tag in seen:
+                    continue
+                seen.add(child.tag)
+
+                # Determine the child's siblings
+                nieces = [child]
+                for sib in siblings[idx + 1:]:
+                    if child.tag in sib:
+                        nieces.append(sib[child.tag])
+                children.append(self._compile(nieces))
+
+        return (siblings, children)
+
+    def _get_plan(self, siblings):
+        key = tuple(siblings)
+        generation, plan = self._plans.get(key, (None, None))
+        if generation != _tree_generation:
+            plan = self._compile(list(siblings))
+            self._plans[key] = (_tree_generation, plan)
+        return plan
+
     def _serialize(self, parent, obj, siblings, nsmap=None):
         """Internal serialization.
 
@@ -594,27 +664,19 @@ class Template(object):
                       rendered.
         """
 
+        return self._render_plan(parent, obj, self._get_plan(siblings),
+                                 nsmap)
+
+    def _render_plan(self, parent, obj, plan, nsmap=None):
+        siblings, children = plan
+
         # First step, render the element
         elems = siblings[0].render(parent, obj, siblings[1:], nsmap)
 
         # Now, traverse all child elements
-        seen = set()
-        for idx, sibling in enumerate(siblings):
-            for child in sibling:
-                # Have we handled this child already?
-                if child.tag in seen:
-                    continue
-                seen.add(child.tag)
-
-                # Determine the child's siblings
-                nieces = [child]
-                for sib in siblings[idx + 1:]:
-                    if child.tag in sib:
-                        nieces.append(sib[child.tag])
-
-                # Now call this function for all data elements recursively
-                for elem, datum in elems:
-                    self._serialize(elem, datum, nieces)
+        for child in children:
+            for elem, datum in elems:
+                self._render_plan(elem, datum, child)
 
         # Return the first element; at the top level, this will be the
         # root element
@@ -801,9 +863,11 @@ class MasterTemplate(Template):
     def copy(self):
         """Return a copy of this master template."""
 
-        # Return a copy of the MasterTemplate
+        # Return a copy of the MasterTemplate, sharing the plans merged
+        # with the slaves attached to any copy
         tmp = self.__class__(self.root, self.version, self.nsmap)
         tmp.slaves = self.slaves[:]
+        tmp._plans = self._plans
         return tmp
 
 
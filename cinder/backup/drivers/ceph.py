@@ -41,10 +41,9 @@ was deemed the safest action to take. It is therefore recommended to always
 restore to a new volume (default).
 """
 
-import fcntl
+import contextlib
 import os
 import re
-import subprocess
 import time
 
 import eventlet
@@ -82,7 +81,24 @@ service_opts = [
                help='RBD stripe count to use when creating a backup image'),
     cfg.BoolOpt('restore_discard_excess_bytes', default=True,
                 help='If True, always discard excess bytes when restoring '
-                     'volumes.')
+                     'volumes.'),
+    cfg.IntOpt('backup_ceph_diff_chunk_size', default=(units.MiB * 4),
+               help='the chunk size in bytes that the extents of a '
+                    'differential transfer are read and written in'),
+    cfg.IntOpt('backup_ceph_diff_max_inflight', default=8,
+               help='Maximum number of asynchronous writes in flight during '
+                    'a differential transfer, each buffering up to '
+                    'backup_ceph_diff_chunk_size bytes (only used if librbd '
+                    'supports aio_write)'),
+    cfg.IntOpt('backup_ceph_diff_rate_limit', default=0,
+               help='Maximum rate in bytes per second at which differential '
+                    'transfers copy data. 0 means unlimited'),
+    cfg.IntOpt('backup_ceph_diff_retries', default=3,
+               help='Number of times a differential transfer will resume '
+                    'from the last completed extent after an error'),
+    cfg.IntOpt('backup_ceph_progress_interval', default=60,
+               help='Interval in seconds at which differential transfer '
+                    'progress is recorded against the backup'),
 ]
 
 CONF = cfg.CONF
@@ -107,6 +123,7 @@ class CephBackupDriver(BackupDriver):
         self.rados = rados
         self.context = context
         self.chunk_size = CONF.backup_ceph_chunk_size
+        self.diff_chunk_size = CONF.backup_ceph_diff_chunk_size
         self._execute = execute or utils.execute
 
         if self._supports_stripingv2:
@@ -134,27 +151,6 @@ class CephBackupDriver(BackupDriver):
         """Ensure all args are non-None and non-empty."""
         return all(args)
 
-    def _ceph_args(self, user, conf=None, pool=None):
-        """Create default ceph args for executing rbd commands.
-
-        If no --conf is provided, rbd will look in the default locations e.g.
-        /etc/ceph/ceph.conf
-        """
-
-        # Make sure user arg is valid since rbd command may not fail if
-        # invalid/no user provided, resulting in unexpected behaviour.
-        if not self._validate_string_args(user):
-            raise exception.BackupInvalidCephArgs(_("invalid user '%s'") %
-                                                  (user))
-
-        args = ['--id', user]
-        if conf:
-            args.extend(['--conf', conf])
-        if pool:
-            args.extend(['--pool', pool])
-
-        return args
-
     @property
     def _supports_layering(self):
         """Determine if copy-on-write is supported by our version of librbd."""
@@ -178,25 +174,47 @@ class CephBackupDriver(BackupDriver):
 
         return (old_format, features)
 
-    def _connect_to_rados(self, pool=None):
-        """Establish connection to the backup Ceph cluster."""
-        client = self.rados.Rados(rados_id=self._ceph_backup_user,
-                                  conffile=self._ceph_backup_conf)
-        try:
-            client.connect()
-            pool_to_open = self._utf8(pool or self._ceph_backup_pool)
-            ioctx = client.open_ioctx(pool_to_open)
-            return client, ioctx
-        except self.rados.Error:
-            # shutdown cannot raise an exception
-            client.shutdown()
-            raise
+    def _connect_to_rados(self, pool=None, user=None, conf=None):
+        """Establish connection to a Ceph cluster.
+
+        Connects to the backup Ceph cluster unless a user and/or conf are
+        provided.
+        """
+        user = self._utf8(user or self._ceph_backup_user)
+        conf = self._utf8(conf or self._ceph_backup_conf)
 
-    def _disconnect_from_rados(self, client, ioctx):
-        """Terminate connection with the backup Ceph cluster."""
-        # closing an ioctx cannot raise an exception
-        ioctx.close()
-        client.shutdown()
+        # Make sure user arg is valid since rados may not fail if invalid/no
+        # user provided, resulting in unexpected behaviour.
+        if not self._validate_string_args(user):
+            raise exception.BackupInvalidCephArgs(_("invalid user '%s'") %
+                                                  (user))
+
+        pool_to_open = self._utf8(pool or self._ceph_backup_pool)
+        return rbd_driver.get_rados_connection_pool().get(self.rados, conf,
+                                                          user, pool_to_open)
+
+    def _disconnect_from_rados(self, client, ioctx, discard=False):
+        """Release a connection obtained with _connect_to_rados()."""
+        rbd_driver.get_rados_connection_pool().put(client, ioctx,
+                                                   discard=discard)
+
+    @contextlib.contextmanager
+    def _open_rbd_image(self, name, pool, user, conf, snapshot=None,
+                        read_only=False):
+        """Open an rbd image in the given pool as the given Ceph user."""
+        client, ioctx = self._connect_to_rados(pool, user=user, conf=conf)
+        discard = True
+        try:
+            image = self.rbd.Image(ioctx, self._utf8(name),
+                                   snapshot=snapshot, read_only=read_only)
+            try:
+                yield image
+            finally:
+                image.close()
+            discard = False
+        finally:
+            # Do not reuse the connection if something went wrong with it.
+            self._disconnect_from_rados(client, ioctx, discard=discard)
 
     def _get_backup_base_name(self, volume_id, backup_id=None,
                               diff_format=False):
@@ -411,72 +429,198 @@ class CephBackupDriver(BackupDriver):
                 finally:
                     src_rbd.close()
 
-    def _piped_execute(self, cmd1, cmd2):
-        """Pipe output of cmd1 into cmd2."""
-        LOG.debug("piping cmd1='%s' into..." % (' '.join(cmd1)))
-        LOG.debug("cmd2='%s'" % (' '.join(cmd2)))
+    def _get_diff_extents(self, src_rbd, from_snap=None):
+        """Return list of (offset, length, exists) changed since from_snap.
 
-        try:
-            p1 = subprocess.Popen(cmd1, stdout=subprocess.PIPE,
-                                  stderr=subprocess.PIPE)
-        except OSError as e:
-            LOG.error("pipe1 failed - %s " % unicode(e))
-            raise
+        If from_snap is None, all extents that have ever been written to the
+        image are returned.
+        """
+        extents = []
+
+        def iter_cb(offset, length, exists):
+            extents.append((offset, length, exists))
 
-        # NOTE(dosaboy): ensure that the pipe is blocking. This is to work
-        # around the case where evenlet.green.subprocess is used which seems to
-        # use a non-blocking pipe.
-        flags = fcntl.fcntl(p1.stdout, fcntl.F_GETFL) & (~os.O_NONBLOCK)
-        fcntl.fcntl(p1.stdout, fcntl.F_SETFL, flags)
+        src_rbd.diff_iterate(0, src_rbd.size(), from_snap, iter_cb)
+        return extents
 
-        try:
-            p2 = subprocess.Popen(cmd2, stdin=p1.stdout,
-                                  stdout=subprocess.PIPE,
-                                  stderr=subprocess.PIPE)
-        except OSError as e:
-            LOG.error("pipe2 failed - %s " % unicode(e))
-            raise
+    def _throttle(self, start, transferred):
+        """Sleep as needed to keep transfer below configured rate limit."""
+        rate_limit = CONF.backup_ceph_diff_rate_limit
+        if rate_limit <= 0:
+            # yield to any other pending backups
+            eventlet.sleep(0)
+            return
+
+        expected = float(transferred) / rate_limit
+        elapsed = time.time() - start
+        if expected > elapsed:
+            eventlet.sleep(expected - elapsed)
+        else:
+            eventlet.sleep(0)
+
+    def _write_extent(self, dest_rbd, offset, data, inflight):
+        """Write data to dest at offset.
+
+        If librbd supports asynchronous io the write is queued and no more than
+        backup_ceph_diff_max_inflight writes are allowed to be outstanding at
+        any one time, otherwise the write is synchronous.
+        """
+        if not hasattr(dest_rbd, 'aio_write'):
+            dest_rbd.write(data, offset)
+            return
+
+        max_inflight = max(CONF.backup_ceph_diff_max_inflight, 1)
+        while len(inflight) >= max_inflight:
+            self._wait_for_write(inflight.pop(0))
+
+        inflight.append(dest_rbd.aio_write(data, offset, None))
+
+    def _wait_for_write(self, completion):
+        """Wait for an asynchronous write to complete and check result."""
+        completion.wait_for_complete_and_cb()
+        ret = completion.get_return_value()
+        if ret < 0:
+            msg = _("rbd aio write failed (ret=%s)") % (ret)
+            raise exception.BackupRBDOperationFailed(msg)
+
+    def _drain_writes(self, inflight):
+        """Wait for all outstanding asynchronous writes, ignoring errors.
 
-        p1.stdout.close()
-        stdout, stderr = p2.communicate()
-        return p2.returncode, stderr
+        Used when an extent transfer has already failed so that no
+        completion is left pending against the destination image before it
+        is retried or the transfer is abandoned.
+        """
+        while inflight:
+            completion = inflight.pop(0)
+            try:
+                completion.wait_for_complete_and_cb()
+            except Exception as exc:
+                LOG.debug(_("ignoring error waiting for aio write - %s") %
+                          (exc))
+
+    def _transfer_extents(self, src_rbd, dest_rbd, extents, backup_id=None):
+        """Copy the given extents from src to dest.
+
+        Extents that no longer exist in the source are discarded in the
+        destination. If a write fails, the transfer is resumed from the last
+        completed extent up to backup_ceph_diff_retries times. If a backup_id
+        is provided, progress is recorded against the backup.
+        """
+        total = sum([length for offset, length, exists in extents])
+        LOG.debug(_("%(extents)s extents (%(bytes)s bytes) to be "
+                    "transferred") % {'extents': len(extents), 'bytes': total})
+
+        start = time.time()
+        last_report = start
+        transferred = 0
+        copied = 0
+        retries = CONF.backup_ceph_diff_retries
+        index = 0
+        while index < len(extents):
+            offset, length, exists = extents[index]
+            inflight = []
+            try:
+                if exists:
+                    end = offset + length
+                    while offset < end:
+                        chunk = min(self.diff_chunk_size, end - offset)
+                        data = src_rbd.read(offset, chunk)
+                        self._write_extent(dest_rbd, offset, data, inflight)
+                        offset += chunk
+                else:
+                    dest_rbd.discard(offset, length)
+
+                while inflight:
+                    self._wait_for_write(inflight.pop(0))
+            except (self.rbd.Error, IOError,
+                    exception.BackupRBDOperationFailed) as exc:
+                self._drain_writes(inflight)
+                if retries <= 0:
+                    msg = (_("extent transfer at offset %(offset)s failed - "
+                             "%(exc)s") %
+                           {'offset': extents[index][0], 'exc': exc})
+                    raise exception.BackupRBDOperationFailed(msg)
+
+                retries -= 1
+                LOG.info(_("extent transfer at offset %(offset)s failed, "
+                           "resuming (%(retries)s retries remaining)") %
+                         {'offset': extents[index][0], 'retries': retries})
+                continue
+
+            transferred += length
+            if exists:
+                copied += length
+            index += 1
+            self._throttle(start, copied)
+
+            now = time.time()
+            if now - last_report >= CONF.backup_ceph_progress_interval:
+                last_report = now
+                LOG.debug(_("transferred %(done)s of %(total)s bytes "
+                            "(%(rate)dK/s)") %
+                          {'done': transferred, 'total': total,
+                           'rate': (transferred / (now - start)) / 1024})
+                if backup_id:
+                    self.db.backup_update(self.context, backup_id,
+                                          {'object_count': index})
+
+        if backup_id:
+            self.db.backup_update(self.context, backup_id,
+                                  {'object_count': len(extents)})
 
     def _rbd_diff_transfer(self, src_name, src_pool, dest_name, dest_pool,
                            src_user, src_conf, dest_user, dest_conf,
-                           src_snap=None, from_snap=None):
+                           src_snap=None, from_snap=None, backup_id=None):
         """Copy only extents changed between two points.
 
         If no snapshot is provided, the diff extents will be all those changed
         since the rbd volume/base was created, otherwise it will be those
         changed since the snapshot was created.
+
+        The transfer is performed with librbd by iterating the diff of the
+        source and writing the changed extents to the destination. As with
+        rbd import-diff, the destination is resized to match the source and, if
+        src_snap is provided, a snapshot of the same name is created on the
+        destination once the transfer has completed.
         """
         LOG.debug(_("performing differential transfer from '%(src)s' to "
                     "'%(dest)s'") %
                   {'src': src_name, 'dest': dest_name})
 
-        # NOTE(dosaboy): Need to be tolerant of clusters/clients that do
-        # not support these operations since at the time of writing they
-        # were very new.
-
-        src_ceph_args = self._ceph_args(src_user, src_conf, pool=src_pool)
-        dest_ceph_args = self._ceph_args(dest_user, dest_conf, pool=dest_pool)
-
-        cmd1 = ['rbd', 'export-diff'] + src_ceph_args
-        if from_snap is not None:
-            cmd1.extend(['--from-snap', from_snap])
-        if src_snap:
-            path = self._utf8("%s/%s@%s" % (src_pool, src_name, src_snap))
-        else:
-            path = self._utf8("%s/%s" % (src_pool, src_name))
-        cmd1.extend([path, '-'])
-
-        cmd2 = ['rbd', 'import-diff'] + dest_ceph_args
-        cmd2.extend(['-', self._utf8("%s/%s" % (dest_pool, dest_name))])
-
-        ret, stderr = self._piped_execute(cmd1, cmd2)
-        if ret:
-            msg = (_("rbd diff op failed - (ret=%(ret)s stderr=%(stderr)s)") %
-                   ({'ret': ret, 'stderr': stderr}))
+        try:
+            with self._open_rbd_image(src_name, src_pool, src_user, src_conf,
+                                      snapshot=src_snap,
+                                      read_only=True) as src_rbd:
+                # NOTE(dosaboy): Need to be tolerant of clusters/clients that
+                # do not support these operations since at the time of
+                # writing they were very new.
+                if not hasattr(src_rbd, 'diff_iterate'):
+                    msg = _("librbd does not support diff_iterate")
+                    raise exception.BackupRBDOperationFailed(msg)
+
+                with self._open_rbd_image(dest_name, dest_pool, dest_user,
+                                          dest_conf) as dest_rbd:
+                    if from_snap is not None:
+                        snaps = [snap['name'] for snap in
+                                 dest_rbd.list_snaps() or []]
+                        if from_snap not in snaps:
+                            msg = (_("start snapshot '%(snap)s' does not "
+                                     "exist in '%(dest)s'") %
+                                   {'snap': from_snap, 'dest': dest_name})
+                            raise exception.BackupRBDOperationFailed(msg)
+
+                    size = src_rbd.size()
+                    if dest_rbd.size() != size:
+                        dest_rbd.resize(size)
+
+                    extents = self._get_diff_extents(src_rbd, from_snap)
+                    self._transfer_extents(src_rbd, dest_rbd, extents,
+                                           backup_id=backup_id)
+
+                    if src_snap:
+                        dest_rbd.create_snap(src_snap)
+        except (self.rbd.Error, self.rados.Error) as exc:
+            msg = _("rbd diff op failed - %s") % (exc)
             LOG.info(msg)
             raise exception.BackupRBDOperationFailed(msg)
 
@@ -581,7 +725,8 @@ class CephBackupDriver(BackupDriver):
                                     dest_user=self._ceph_backup_user,
                                     dest_conf=self._ceph_backup_conf,
                                     src_snap=new_snap,
-                                    from_snap=from_snap)
+                                    from_snap=from_snap,
+                                    backup_id=backup_id)
 
             LOG.debug(_("differential backup transfer completed in %.4fs") %
                       (time.time() - before))
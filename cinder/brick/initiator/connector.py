@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import glob
 import os
 import socket
 import time
@@ -155,6 +156,15 @@ class InitiatorConnector(executor.Executor):
         """
         raise NotImplementedError()
 
+    def connect_volumes(self, connection_properties_list):
+        """Connect to several volumes.
+
+        Returns a list with the device_info of each volume, in the same
+        order as connection_properties_list.
+        """
+        return [self.connect_volume(connection_properties)
+                for connection_properties in connection_properties_list]
+
     def disconnect_volume(self, connection_properties, device_info):
         """Disconnect a volume from the local host.
 
@@ -192,37 +202,89 @@ class ISCSIConnector(InitiatorConnector):
         target_iqn - iSCSI Qualified Name
         target_lun - LUN id of the volume
         """
+        return self._connect_volumes([connection_properties])[0]
 
-        device_info = {'type': 'block'}
+    @synchronized('connect_volume')
+    def connect_volumes(self, connection_properties_list):
+        """Attach several volumes at once.
+
+        Each target is logged in to only once and only the requested LUNs
+        are rescanned, which makes attaching many LUNs from the same target
+        much faster than calling connect_volume for each of them.
+        """
+        return self._connect_volumes(connection_properties_list)
+
+    def _connect_volumes(self, connection_properties_list):
+        # Log in to every distinct target portal/iqn once, reusing any
+        # session which already exists.
+        sessions = self._get_iscsi_sessions()
+        targets = []
+        for connection_properties in connection_properties_list:
+            if self.use_multipath:
+                #multipath installed, discovering other targets if available
+                targets.extend(self._discover_iscsi_portals(
+                    connection_properties))
+            else:
+                targets.append(connection_properties)
+
+        logged_in = set()
+        for props in targets:
+            key = (props['target_portal'].split(",")[0], props['target_iqn'])
+            if key not in logged_in:
+                self._connect_to_iscsi_portal(props, sessions)
+                logged_in.add(key)
 
         if self.use_multipath:
-            #multipath installed, discovering other targets if available
-            target_portal = connection_properties['target_portal']
-            out = self._run_iscsiadm_bare(['-m',
-                                          'discovery',
-                                          '-t',
-                                          'sendtargets',
-                                          '-p',
-                                          target_portal],
-                                          check_exit_code=[0, 255])[0] \
-                or ""
-
-            for ip, iqn in self._get_target_portals_from_iscsiadm_output(out):
-                props = connection_properties.copy()
-                props['target_portal'] = ip
-                props['target_iqn'] = iqn
-                self._connect_to_iscsi_portal(props)
-
-            self._rescan_iscsi()
-        else:
-            self._connect_to_iscsi_portal(connection_properties)
+            # Only scan for the requested LUNs on every path rather than
+            # rescanning all sessions.
+            sessions = self._get_iscsi_sessions()
+            for props in targets:
+                self._rescan_iscsi_lun(props, sessions)
 
+        host_devices = [self._wait_for_iscsi_device(connection_properties)
+                        for connection_properties in
+                        connection_properties_list]
+
+        if self.use_multipath:
+            #we use the multipath device instead of the single path device
+            self._rescan_multipath()
+
+        device_infos = []
+        for host_device in host_devices:
+            if self.use_multipath:
+                multipath_device = self._get_multipath_device_name(
+                    host_device)
+                if multipath_device is not None:
+                    host_device = multipath_device
+            device_infos.append({'type': 'block', 'path': host_device})
+        return device_infos
+
+    def _discover_iscsi_portals(self, connection_properties):
+        target_portal = connection_properties['target_portal']
+        out = self._run_iscsiadm_bare(['-m',
+                                      'discovery',
+                                      '-t',
+                                      'sendtargets',
+                                      '-p',
+                                      target_portal],
+                                      check_exit_code=[0, 255])[0] \
+            or ""
+
+        targets = []
+        for ip, iqn in self._get_target_portals_from_iscsiadm_output(out):
+            props = connection_properties.copy()
+            props['target_portal'] = ip
+            props['target_iqn'] = iqn
+            targets.append(props)
+        return targets
+
+    def _wait_for_iscsi_device(self, connection_properties):
         host_device = self._get_device_path(connection_properties)
 
-        # The /dev/disk/by-path/... node is not always present immediately
-        # TODO(justinsb): This retry-with-delay is a pattern, move to utils?
+        # The /dev/disk/by-path/... node is not always present immediately,
+        # so wait for udev to create it and rescan the LUN if it does not.
         tries = 0
-        while not os.path.exists(host_device):
+        while not self._linuxscsi.wait_for_path(host_device):
             if tries >= self.device_scan_attempts:
                 raise exception.VolumeDeviceNotFound(device=host_device)
 
@@ -232,10 +294,10 @@ class ISCSIConnector(InitiatorConnector):
                       'tries': tries})
 
             # The rescan isn't documented as being necessary(?), but it helps
-            self._run_iscsiadm(connection_properties, ("--rescan",))
+            self._rescan_iscsi_lun(connection_properties)
 
             tries = tries + 1
-            if not os.path.exists(host_device):
+            if not self._linuxscsi.wait_for_path(host_device):
                 time.sleep(tries ** 2)
 
         if tries != 0:
@@ -243,15 +305,7 @@ class ISCSIConnector(InitiatorConnector):
                         "(after %(tries)s rescans)"),
                       {'host_device': host_device, 'tries': tries})
 
-        if self.use_multipath:
-            #we use the multipath device instead of the single path device
-            self._rescan_multipath()
-            multipath_device = self._get_multipath_device_name(host_device)
-            if multipath_device is not None:
-                host_device = multipath_device
-
-        device_info['path'] = host_device
-        return device_info
+        return host_device
 
     @synchronized('connect_volume')
     def disconnect_volume(self, connection_properties, device_info):
@@ -399,7 +453,64 @@ class ISCSIConnector(InitiatorConnector):
         # as they are used for other luns
         return
 
-    def _connect_to_iscsi_portal(self, connection_properties):
+    def _get_iscsi_sessions(self):
+        """Return the active iSCSI sessions as a list of dicts."""
+        out = self._run_iscsiadm_bare(["-m", "session"],
+                                      run_as_root=True,
+                                      check_exit_code=[0, 1, 21])[0] or ""
+
+        # Lines look like: tcp: [1] 10.0.2.15:3260,1 iqn.2010-10.org...
+        return [{'sid': p.split(" ")[1].strip("[]"),
+                 'portal': p.split(" ")[2],
+                 'iqn': p.split(" ")[3]}
+                for p in out.splitlines() if p.startswith("tcp:")]
+
+    def _find_iscsi_session(self, connection_properties, sessions):
+        stripped_portal = connection_properties['target_portal'].split(",")[0]
+        for session in sessions:
+            if (session['portal'].split(",")[0] == stripped_portal and
+                    session['iqn'] == connection_properties['target_iqn']):
+                return session
+        return None
+
+    def _get_iscsi_session_host(self, session_id):
+        """Return the number of the SCSI host backing an iSCSI session."""
+        hosts = glob.glob('/sys/class/iscsi_host/host*/device/session%s' %
+                          session_id)
+        if not hosts:
+            return None
+        return hosts[0].split('/')[4][len('host'):]
+
+    def _rescan_iscsi_lun(self, connection_properties, sessions=None):
+        """Rescan only the LUN described by connection_properties.
+
+        The LUN is scanned for through sysfs on the SCSI host of the target's
+        session, falling back to a rescan of the whole session if the host
+        cannot be found.
+        """
+        if sessions is None:
+            sessions = self._get_iscsi_sessions()
+        session = self._find_iscsi_session(connection_properties, sessions)
+        host = session and self._get_iscsi_session_host(session['sid'])
+        if host is None:
+            self._run_iscsiadm(connection_properties, ("--rescan",))
+            return
+
+        self._linuxscsi.scan_scsi_host(
+            host, lun=connection_properties.get('target_lun', 0))
+
+    def _connect_to_iscsi_portal(self, connection_properties, sessions=None):
+        #duplicate logins crash iscsiadm after load,
+        #so we check active sessions to see if the node is logged in.
+        if sessions is None:
+            sessions = self._get_iscsi_sessions()
+        if self._find_iscsi_session(connection_properties, sessions):
+            LOG.debug("Reusing existing iSCSI session to %(iqn)s at "
+                      "%(portal)s" %
+                      {'iqn': connection_properties['target_iqn'],
+                       'portal': connection_properties['target_portal']})
+            return
+
         # NOTE(vish): If we are on the same host as nova volume, the
         #             discovery makes the target so we don't need to
         #             run --op new. Therefore, we check to see if the
@@ -426,39 +537,22 @@ class ISCSIConnector(InitiatorConnector):
                                   "node.session.auth.password",
                                   connection_properties['auth_password'])
 
-        #duplicate logins crash iscsiadm after load,
-        #so we scan active sessions to see if the node is logged in.
-        out = self._run_iscsiadm_bare(["-m", "session"],
-                                      run_as_root=True,
-                                      check_exit_code=[0, 1, 21])[0] or ""
-
-        portals = [{'portal': p.split(" ")[2], 'iqn': p.split(" ")[3]}
-                   for p in out.splitlines() if p.startswith("tcp:")]
-
-        stripped_portal = connection_properties['target_portal'].split(",")[0]
-        if len(portals) == 0 or len([s for s in portals
-                                     if stripped_portal ==
-                                     s['portal'].split(",")[0]
-                                     and
-                                     s['iqn'] ==
-                                     connection_properties['target_iqn']]
-                                    ) == 0:
-            try:
-                self._run_iscsiadm(connection_properties,
-                                   ("--login",),
-                                   check_exit_code=[0, 255])
-            except putils.ProcessExecutionError as err:
-                #as this might be one of many paths,
-                #only set successful logins to startup automatically
-                if err.exit_code in [15]:
-                    self._iscsiadm_update(connection_properties,
-                                          "node.startup",
-                                          "automatic")
-                    return
-
-            self._iscsiadm_update(connection_properties,
-                                  "node.startup",
-                                  "automatic")
+        try:
+            self._run_iscsiadm(connection_properties,
+                               ("--login",),
+                               check_exit_code=[0, 255])
+        except putils.ProcessExecutionError as err:
+            #as this might be one of many paths,
+            #only set successful logins to startup automatically
+            if err.exit_code in [15]:
+                self._iscsiadm_update(connection_properties,
+                                      "node.startup",
+                                      "automatic")
+                return
+
+        self._iscsiadm_update(connection_properties,
+                              "node.startup",
+                              "automatic")
 
     def _disconnect_from_iscsi_portal(self, connection_properties):
         self._iscsiadm_update(connection_properties, "node.startup", "manual",
@@ -613,19 +707,20 @@ class FibreChannelConnector(InitiatorConnector):
         # The /dev/disk/by-path/... node is not always present immediately
         # We only need to find the first device.  Once we see the first device
         # multipath will have any others.
-        def _wait_for_device_discovery(host_devices):
-            tries = self.tries
-            for device in host_devices:
-                LOG.debug(_("Looking for Fibre Channel dev %(device)s"),
-                          {'device': device})
-                if os.path.exists(device):
-                    self.host_device = device
-                    # get the /dev/sdX device.  This is used
-                    # to find the multipath device.
-                    self.device_name = os.path.realpath(device)
-                    raise loopingcall.LoopingCallDone()
-
-            if self.tries >= self.device_scan_attempts:
+        lun = connection_properties.get('target_lun', 0)
+        tries = 0
+        while True:
+            by_path_devices = self._linuxscsi.get_by_path_devices(lun)
+            found = [device for device in host_devices
+                     if device in by_path_devices]
+            if found:
+                host_device = found[0]
+                # get the /dev/sdX device.  This is used
+                # to find the multipath device.
+                device_name = by_path_devices[host_device]
+                break
+
+            if tries >= self.device_scan_attempts:
                 msg = _("Fibre Channel volume device not found.")
                 LOG.error(msg)
                 raise exception.NoFibreChannelVolumeDeviceFound()
@@ -634,26 +729,22 @@ class FibreChannelConnector(InitiatorConnector):
                        "Will rescan & retry.  Try number: %(tries)s"),
                      {'tries': tries})
 
-            self._linuxfc.rescan_hosts(hbas)
-            self.tries = self.tries + 1
-
-        self.host_device = None
-        self.device_name = None
-        self.tries = 0
-        timer = loopingcall.FixedIntervalLoopingCall(
-            _wait_for_device_discovery, host_devices)
-        timer.start(interval=2).wait()
+            # Only scan for the LUN on the target ports and let udev tell us
+            # when the device nodes have been created.  Any target port may
+            # be the first to show the LUN, so wait on all of them.
+            self._linuxfc.rescan_hosts(hbas, wwns, lun)
+            tries = tries + 1
+            if not self._linuxscsi.wait_for_paths(host_devices):
+                time.sleep(tries ** 2)
 
-        tries = self.tries
-        if self.host_device is not None and self.device_name is not None:
-            LOG.debug(_("Found Fibre Channel volume %(name)s "
-                        "(after %(tries)s rescans)"),
-                      {'name': self.device_name, 'tries': tries})
+        LOG.debug(_("Found Fibre Channel volume %(name)s "
+                    "(after %(tries)s rescans)"),
+                  {'name': device_name, 'tries': tries})
 
         # see if the new drive is part of a multipath
         # device.  If so, we'll use the multipath device.
         if self.use_multipath:
-            mdev_info = self._linuxscsi.find_multipath_device(self.device_name)
+            mdev_info = self._linuxscsi.find_multipath_device(device_name)
             if mdev_info is not None:
                 LOG.debug(_("Multipath device discovered %(device)s")
                           % {'device': mdev_info['device']})
@@ -663,12 +754,12 @@ class FibreChannelConnector(InitiatorConnector):
             else:
                 # we didn't find a multipath device.
                 # so we assume the kernel only sees 1 device
-                device_path = self.host_device
-                dev_info = self._linuxscsi.get_device_info(self.device_name)
+                device_path = host_device
+                dev_info = self._linuxscsi.get_device_info(device_name)
                 devices = [dev_info]
         else:
-            device_path = self.host_device
-            dev_info = self._linuxscsi.get_device_info(self.device_name)
+            device_path = host_device
+            dev_info = self._linuxscsi.get_device_info(device_name)
             devices = [dev_info]
 
         device_info['path'] = device_path
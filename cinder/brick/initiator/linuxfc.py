@@ -15,6 +15,8 @@
 """Generic linux Fibre Channel utilities."""
 
 import errno
+import glob
+import os
 
 from cinder.brick.initiator import linuxscsi
 from cinder.openstack.common.gettextutils import _
@@ -30,10 +32,46 @@ class LinuxFibreChannel(linuxscsi.LinuxSCSI):
         super(LinuxFibreChannel, self).__init__(root_helper, execute,
                                                 *args, **kwargs)
 
-    def rescan_hosts(self, hbas):
+    def rescan_hosts(self, hbas, wwns=None, lun=None):
+        """Scan the SCSI hosts of the given HBAs for new devices.
+
+        If wwns are given, only the remote ports with those WWPNs are
+        scanned, and if lun is given only that LUN is scanned for.
+        """
+        lun = '-' if lun is None else lun
         for hba in hbas:
-            self.echo_scsi_command("/sys/class/scsi_host/%s/scan"
-                                   % hba['host_device'], "- - -")
+            host_device = hba['host_device']
+            targets = []
+            if wwns:
+                targets = self.get_fc_targets(host_device, wwns)
+            if not targets:
+                targets = [('-', '-')]
+            for channel, target in targets:
+                self.echo_scsi_command("/sys/class/scsi_host/%s/scan"
+                                       % host_device,
+                                       "%s %s %s" % (channel, target, lun))
+
+    def get_fc_targets(self, host_device, wwns):
+        """Get the SCSI channel and target id of remote FC ports.
+
+        Returns a (channel, target id) tuple for each remote port seen by
+        host_device whose WWPN is in wwns.
+        """
+        wwpns = ["0x%s" % wwn.lower() for wwn in wwns]
+        host = host_device.replace('host', '')
+        targets = []
+        for path in sorted(glob.glob("/sys/class/fc_transport/target%s:*"
+                                     % host)):
+            try:
+                with open(os.path.join(path, 'port_name')) as f:
+                    port_name = f.read().strip().lower()
+            except IOError:
+                continue
+            if port_name in wwpns:
+                address = os.path.basename(path)[len('target'):]
+                _host, channel, target = address.split(':')
+                targets.append((channel, target))
+        return targets
 
     def get_fc_hbas(self):
         """Get the Fibre Channel HBA information."""
@@ -25,6 +25,9 @@ from cinder.openstack.common import processutils as putils
 
 LOG = logging.getLogger(__name__)
 
+DEVICE_SETTLE_TIMEOUT = 5
+BY_PATH_DIR = '/dev/disk/by-path'
+
 
 class LinuxSCSI(executor.Executor):
     def __init__(self, root_helper, execute=putils.execute,
@@ -41,6 +44,73 @@ class LinuxSCSI(executor.Executor):
                       root_helper=self._root_helper)
         self._execute('tee', *args, **kwargs)
 
+    def scan_scsi_host(self, host, channel='-', target='-', lun='-'):
+        """Scan a SCSI host for new devices.
+
+        Scanning is limited to the given channel, target and lun. '-' acts as
+        a wildcard so by default the whole host is scanned.
+        """
+        path = "/sys/class/scsi_host/host%s/scan" % host
+        LOG.debug("Scan SCSI host %(host)s for %(channel)s %(target)s "
+                  "%(lun)s" % {'host': host, 'channel': channel,
+                               'target': target, 'lun': lun})
+        self.echo_scsi_command(path, "%s %s %s" % (channel, target, lun))
+
+    def wait_for_path(self, path, timeout=DEVICE_SETTLE_TIMEOUT):
+        """Wait for udev to create a device path.
+
+        Rather than polling for the path, wait for udev to finish processing
+        queued events, returning as soon as the path exists or timeout
+        seconds have passed. Returns True if the path exists.
+        """
+        return self.wait_for_paths([path], timeout)
+
+    def wait_for_paths(self, paths, timeout=DEVICE_SETTLE_TIMEOUT):
+        """Wait for udev to create any of the device paths.
+
+        Waits for udev to finish processing queued events, or at most
+        timeout seconds, and then checks all the paths.  udevadm can only
+        watch a single path, so with one path it returns as soon as that
+        path exists.  Returns True if any of the paths exists.
+        """
+        if any(os.path.exists(path) for path in paths):
+            return True
+
+        cmd = ['udevadm', 'settle', '--timeout=%d' % timeout]
+        if len(paths) == 1:
+            cmd.append('--exit-if-exists=%s' % paths[0])
+        try:
+            self._execute(*cmd, run_as_root=True,
+                          root_helper=self._root_helper)
+        except putils.ProcessExecutionError as exc:
+            LOG.debug("udevadm settle failed exit (%(code)s)" %
+                      {'code': exc.exit_code})
+
+        return any(os.path.exists(path) for path in paths)
+
+    def get_by_path_devices(self, lun=None):
+        """Index the entries of /dev/disk/by-path.
+
+        Returns a dict mapping each /dev/disk/by-path entry to the device it
+        points at (/dev/sdX), limited to the entries of lun if it is given.
+        Partition entries are left out.
+        """
+        try:
+            entries = os.listdir(BY_PATH_DIR)
+        except OSError:
+            return {}
+
+        suffix = "-lun-%s" % lun
+        devices = {}
+        for entry in entries:
+            if lun is not None and not entry.endswith(suffix):
+                continue
+            if "-part" in entry.rsplit("-lun-", 1)[-1]:
+                continue
+            path = os.path.join(BY_PATH_DIR, entry)
+            devices[path] = os.path.realpath(path)
+        return devices
+
     def get_name_from_path(self, path):
         """Translates /dev/disk/by-path/ entry to /dev/sdX."""
 
@@ -0,0 +1,322 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Kombu RPC backend with publisher reuse and batched publishing.
+
+This wraps cinder.openstack.common.rpc.impl_kombu and is enabled by setting
+rpc_backend=cinder.common.rpc_kombu.
+
+Pooled connections keep their channel when they are returned to the pool,
+unless consumers were declared on it, and topic, fanout and notify
+publishers are cached per channel rather than declared for every message.
+
+If amqp_publish_batch_size is above 0, casts, fanout casts and notifications
+are queued and published from a greenthread, up to that many messages on a
+single pooled connection.
+"""
+
+import collections
+import time
+
+import eventlet
+from eventlet import greenthread
+from eventlet import queue
+from eventlet import semaphore
+from oslo.config import cfg
+
+from cinder.common import rpc_latency
+from cinder.openstack.common.gettextutils import _
+from cinder.openstack.common import log as logging
+from cinder.openstack.common.rpc import amqp as rpc_amqp
+from cinder.openstack.common.rpc import common as rpc_common
+from cinder.openstack.common.rpc import impl_kombu
+
+
+LOG = logging.getLogger(__name__)
+
+rpc_kombu_opts = [
+    cfg.IntOpt('amqp_publish_batch_size',
+               default=0,
+               help='Publish casts and notifications from a background '
+                    'thread, sending up to this many queued messages on '
+                    'one connection. 0 publishes each message when it is '
+                    'sent. Only used by the cinder.common.rpc_kombu '
+                    'rpc_backend'),
+    cfg.IntOpt('amqp_publish_batch_retries',
+               default=3,
+               help='Number of times to retry publishing a failed batch of '
+                    'queued messages. If the messages still cannot be '
+                    'published, the error is logged and they are dropped'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(rpc_kombu_opts)
+
+# Publishers which may be kept and reused for other messages
+_CACHEABLE_PUBLISHERS = (impl_kombu.TopicPublisher,
+                         impl_kombu.FanoutPublisher,
+                         impl_kombu.NotifyPublisher)
+
+
+class Connection(impl_kombu.Connection):
+    """Kombu connection which reuses its channel and publishers."""
+
+    # Use a separate pool from impl_kombu.Connection
+    pool = None
+
+    # Set up by _publish() when batching is enabled
+    batch_publisher = None
+
+    # Maximum number of publishers kept per connection
+    max_cached_publishers = 128
+
+    def __init__(self, conf, server_params=None):
+        # reconnect() is called by the base class __init__
+        self.publishers = collections.OrderedDict()
+        super(Connection, self).__init__(conf, server_params=server_params)
+
+    def reconnect(self):
+        self.publishers.clear()
+        super(Connection, self).reconnect()
+
+    def reset(self):
+        """Reset a connection so it can be used again.
+
+        If nothing was bound to the channel, the channel and the publishers
+        declared on it are kept for the next caller.
+        """
+        if self.consumers:
+            self.publishers.clear()
+            super(Connection, self).reset()
+            return
+
+        self.cancel_consumer_thread()
+        self.wait_on_proxy_callbacks()
+
+    def publisher_send(self, cls, topic, msg, timeout=None, **kwargs):
+        """Send to a publisher based on the publisher class."""
+
+        def _error_callback(exc):
+            log_info = {'topic': topic, 'err_str': str(exc)}
+            LOG.exception(_("Failed to publish message to topic "
+                          "'%(topic)s': %(err_str)s") % log_info)
+
+        def _publish():
+            publisher = self._get_publisher(cls, topic, **kwargs)
+            publisher.send(msg, timeout)
+
+        self.ensure(_error_callback, _publish)
+
+    def _get_publisher(self, cls, topic, **kwargs):
+        """Get a publisher declared on the current channel.
+
+        Publishers are cached per (class, topic, options), which saves
+        declaring the exchange again for every message. Direct publishers
+        are used for a single reply so they are not cached.
+        """
+        if cls not in _CACHEABLE_PUBLISHERS:
+            return cls(self.conf, self.channel, topic, **kwargs)
+
+        key = (cls, topic, tuple(sorted(kwargs.items())))
+        publisher = self.publishers.pop(key, None)
+        if publisher is None:
+            publisher = cls(self.conf, self.channel, topic, **kwargs)
+            while len(self.publishers) >= self.max_cached_publishers:
+                self.publishers.popitem(last=False)
+        # (Re)insert as most recently used
+        self.publishers[key] = publisher
+        return publisher
+
+
+class BatchPublisher(object):
+    """Publishes fire-and-forget messages in batches.
+
+    Messages are queued and published from a greenthread, which sends the
+    queued messages (up to amqp_publish_batch_size) on a single pooled
+    connection. If publishing fails, the messages not yet sent are retried
+    up to amqp_publish_batch_retries times. If they still cannot be sent
+    the error is logged and they are dropped: the callers which queued
+    them have already returned.
+    """
+
+    def __init__(self, conf, connection_pool):
+        self.conf = conf
+        self.connection_pool = connection_pool
+        self.queue = queue.LightQueue()
+        self.thread = None
+        self.pending = []
+
+    def publish(self, method, topic, msg):
+        self.queue.put((method, topic, msg))
+        if self.thread is None:
+            self.thread = greenthread.spawn(self._run)
+
+    def _get_batch(self, block=True):
+        batch = []
+        try:
+            if block:
+                batch.append(self.queue.get())
+            while len(batch) < self.conf.amqp_publish_batch_size:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _send(self, batch):
+        """Publish a batch, retrying the messages that were not sent.
+
+        Messages are removed from batch as they are sent.
+        """
+        retries = self.conf.amqp_publish_batch_retries
+        interval = self.conf.rabbit_retry_interval
+        while True:
+            try:
+                with rpc_amqp.ConnectionContext(self.conf,
+                                                self.connection_pool) as conn:
+                    while batch:
+                        method, topic, msg = batch[0]
+                        getattr(conn, method)(topic, msg)
+                        batch.pop(0)
+                return
+            except Exception as exc:
+                if retries <= 0:
+                    topics = sorted(set(topic for _m, topic, _s in batch))
+                    LOG.exception(_('Failed to publish %(count)d queued '
+                                    'messages to %(topics)s, dropping '
+                                    'them') %
+                                  {'count': len(batch),
+                                   'topics': ', '.join(topics)})
+                    del batch[:]
+                    return
+
+                LOG.warning(_('Failed to publish %(count)d queued messages, '
+                              'retrying in %(interval)ss: %(exc)s') %
+                            {'count': len(batch), 'interval': interval,
+                             'exc': exc})
+                retries -= 1
+                eventlet.sleep(interval)
+
+    def _run(self):
+        while True:
+            self.pending = self._get_batch()
+            self._send(self.pending)
+
+    def flush(self):
+        """Publish all queued messages from the calling thread."""
+        batch = self._get_batch(block=False)
+        while batch:
+            self._send(batch)
+            batch = self._get_batch(block=False)
+
+    def stop(self):
+        """Stop the publishing thread and publish what it had not sent."""
+        if self.thread is not None:
+            self.thread.kill()
+            self.thread = None
+        if self.pending:
+            self._send(self.pending)
+        self.flush()
+
+
+_batch_publisher_create_sem = semaphore.Semaphore()
+
+
+def _publish(conf, method, topic, msg):
+    """Publish a message now, or queue it if batching is enabled."""
+    connection_pool = rpc_amqp.get_connection_pool(conf, Connection)
+    if conf.amqp_publish_batch_size <= 0:
+        with rpc_amqp.ConnectionContext(conf, connection_pool) as conn:
+            getattr(conn, method)(topic, msg)
+        return
+
+    with _batch_publisher_create_sem:
+        if Connection.batch_publisher is None:
+            Connection.batch_publisher = BatchPublisher(conf, connection_pool)
+    Connection.batch_publisher.publish(method, topic, msg)
+
+
+def create_connection(conf, new=True):
+    """Create a connection."""
+    return rpc_amqp.create_connection(
+        conf, new,
+        rpc_amqp.get_connection_pool(conf, Connection))
+
+
+def multicall(conf, context, topic, msg, timeout=None):
+    """Make a call that returns multiple times."""
+    return rpc_amqp.multicall(
+        conf, context, topic, msg, timeout,
+        rpc_amqp.get_connection_pool(conf, Connection))
+
+
+def call(conf, context, topic, msg, timeout=None):
+    """Sends a message on a topic and wait for a response."""
+    start = time.time()
+    try:
+        return rpc_amqp.call(
+            conf, context, topic, msg, timeout,
+            rpc_amqp.get_connection_pool(conf, Connection))
+    finally:
+        rpc_latency.record_latency('call.%s' % msg.get('method'),
+                                   time.time() - start)
+
+
+def cast(conf, context, topic, msg):
+    """Sends a message on a topic without waiting for a response."""
+    LOG.debug(_('Making asynchronous cast on %s...'), topic)
+    rpc_amqp._add_unique_id(msg)
+    rpc_amqp.pack_context(msg, context)
+    _publish(conf, 'topic_send', topic, rpc_common.serialize_msg(msg))
+
+
+def fanout_cast(conf, context, topic, msg):
+    """Sends a message on a fanout exchange without waiting for a response."""
+    LOG.debug(_('Making asynchronous fanout cast...'))
+    rpc_amqp._add_unique_id(msg)
+    rpc_amqp.pack_context(msg, context)
+    _publish(conf, 'fanout_send', topic, rpc_common.serialize_msg(msg))
+
+
+def cast_to_server(conf, context, server_params, topic, msg):
+    """Sends a message on a topic to a specific server."""
+    return rpc_amqp.cast_to_server(
+        conf, context, server_params, topic, msg,
+        rpc_amqp.get_connection_pool(conf, Connection))
+
+
+def fanout_cast_to_server(conf, context, server_params, topic, msg):
+    """Sends a message on a fanout exchange to a specific server."""
+    return rpc_amqp.fanout_cast_to_server(
+        conf, context, server_params, topic, msg,
+        rpc_amqp.get_connection_pool(conf, Connection))
+
+
+def notify(conf, context, topic, msg, envelope):
+    """Sends a notification event on a topic."""
+    LOG.debug(_('Sending %(event_type)s on %(topic)s'),
+              dict(event_type=msg.get('event_type'),
+                   topic=topic))
+    rpc_amqp._add_unique_id(msg)
+    rpc_amqp.pack_context(msg, context)
+    if envelope:
+        msg = rpc_common.serialize_msg(msg)
+    _publish(conf, 'notify_send', topic, msg)
+
+
+def cleanup():
+    if Connection.batch_publisher is not None:
+        Connection.batch_publisher.stop()
+        Connection.batch_publisher = None
+    rpc_amqp.cleanup(Connection.pool)
+    return impl_kombu.cleanup()
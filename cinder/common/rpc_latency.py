@@ -0,0 +1,136 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Latency histograms for RPC methods.
+
+Methods handled by this service are recorded by their name, calls made to
+other services as 'call.<method>'.  The histograms are logged every
+rpc_latency_report_interval seconds by the periodic tasks of the service.
+"""
+
+import bisect
+import collections
+import time
+
+from oslo.config import cfg
+
+from cinder.openstack.common.gettextutils import _
+from cinder.openstack.common import log as logging
+from cinder.openstack.common.rpc import dispatcher
+
+
+LOG = logging.getLogger(__name__)
+
+rpc_latency_opts = [
+    cfg.IntOpt('rpc_latency_report_interval',
+               default=600,
+               help='Interval in seconds between logging the RPC latency '
+                    'histograms of a service. 0 disables the report'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(rpc_latency_opts)
+
+
+class LatencyHistogram(object):
+    """Histogram of the latencies of an RPC method."""
+
+    # Upper bounds of the buckets, in seconds
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def to_dict(self):
+        buckets = zip(self.BUCKETS + (float('inf'),), self.counts)
+        return {'count': self.count,
+                'total': self.total,
+                'max': self.max,
+                'buckets': buckets}
+
+
+_LATENCIES = collections.defaultdict(LatencyHistogram)
+
+# Time of the last report, see report_latency_histograms()
+_last_report = None
+
+
+def record_latency(name, seconds):
+    """Record the latency of an RPC method."""
+    _LATENCIES[name].record(seconds)
+
+
+def get_latency_histograms():
+    """Return the recorded RPC latency histograms, by method."""
+    return dict((name, histogram.to_dict())
+                for name, histogram in _LATENCIES.items())
+
+
+def reset_latency_histograms():
+    """Discard all recorded latencies."""
+    global _last_report
+    _LATENCIES.clear()
+    _last_report = None
+
+
+def report_latency_histograms():
+    """Log the latency histograms if rpc_latency_report_interval passed.
+
+    The first call only starts the interval.  Returns True if the
+    histograms were logged.
+    """
+    global _last_report
+    interval = CONF.rpc_latency_report_interval
+    now = time.time()
+    if interval <= 0:
+        return False
+    if _last_report is None:
+        _last_report = now
+        return False
+    if now - _last_report < interval:
+        return False
+
+    _last_report = now
+    for name, stats in sorted(get_latency_histograms().items()):
+        buckets = ', '.join('<=%ss: %d' % (bound, count)
+                            for bound, count in stats['buckets'] if count)
+        LOG.info(_("RPC latency of %(name)s: %(count)d calls, mean "
+                   "%(mean).3fs, max %(max).3fs (%(buckets)s)") %
+                 {'name': name,
+                  'count': stats['count'],
+                  'mean': stats['total'] / stats['count'],
+                  'max': stats['max'],
+                  'buckets': buckets})
+    return True
+
+
+class RpcDispatcher(dispatcher.RpcDispatcher):
+    """RpcDispatcher which records the latency of each dispatched method."""
+
+    def dispatch(self, ctxt, version, method, namespace, **kwargs):
+        start = time.time()
+        try:
+            return super(RpcDispatcher, self).dispatch(ctxt, version, method,
+                                                       namespace, **kwargs)
+        finally:
+            record_latency(method, time.time() - start)
@@ -290,12 +290,16 @@ def snapshot_data_get_for_project(context, project_id, volume_type_id=None):
                                               volume_type_id)
 
 
-def snapshot_get_active_by_window(context, begin, end=None, project_id=None):
+def snapshot_get_active_by_window(context, begin, end=None, project_id=None,
+                                  marker=None, limit=None):
     """Get all the snapshots inside the window.
 
     Specifying a project_id will filter for a certain project.
+    The snapshots are ordered by id; marker and limit return the page of
+    snapshots with ids after marker.
     """
-    return IMPL.snapshot_get_active_by_window(context, begin, end, project_id)
+    return IMPL.snapshot_get_active_by_window(context, begin, end, project_id,
+                                              marker=marker, limit=limit)
 
 
 ####################
@@ -409,12 +413,16 @@ def volume_type_destroy(context, id):
     return IMPL.volume_type_destroy(context, id)
 
 
-def volume_get_active_by_window(context, begin, end=None, project_id=None):
+def volume_get_active_by_window(context, begin, end=None, project_id=None,
+                                marker=None, limit=None):
     """Get all the volumes inside the window.
 
     Specifying a project_id will filter for a certain project.
+    The volumes are ordered by id; marker and limit return the page of
+    volumes with ids after marker.
     """
-    return IMPL.volume_get_active_by_window(context, begin, end, project_id)
+    return IMPL.volume_get_active_by_window(context, begin, end, project_id,
+                                            marker=marker, limit=limit)
 
 
 ####################
@@ -547,6 +555,11 @@ def volume_glance_metadata_get_all(context):
     return IMPL.volume_glance_metadata_get_all(context)
 
 
+def volume_glance_metadata_list_get(context, volume_id_list):
+    """Return the glance metadata for a list of volumes."""
+    return IMPL.volume_glance_metadata_list_get(context, volume_id_list)
+
+
 def volume_glance_metadata_get(context, volume_id):
     """Return the glance metadata for a volume."""
     return IMPL.volume_glance_metadata_get(context, volume_id)
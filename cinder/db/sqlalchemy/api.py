@@ -1534,7 +1534,8 @@ def snapshot_data_get_for_project(context, project_id, volume_type_id=None):
 
 
 @require_context
-def snapshot_get_active_by_window(context, begin, end=None, project_id=None):
+def snapshot_get_active_by_window(context, begin, end=None, project_id=None,
+                                  marker=None, limit=None):
     """Return snapshots that were active during window."""
 
     query = model_query(context, models.Snapshot, read_deleted="yes")
@@ -1545,8 +1546,10 @@ def snapshot_get_active_by_window(context, begin, end=None, project_id=None):
         query = query.filter(models.Snapshot.created_at < end)
     if project_id:
         query = query.filter_by(project_id=project_id)
+    if marker:
+        query = query.filter(models.Snapshot.id > marker)
 
-    return query.all()
+    return query.order_by(models.Snapshot.id).limit(limit).all()
 
 
 @require_context
@@ -1858,7 +1861,9 @@ def volume_type_destroy(context, id):
 def volume_get_active_by_window(context,
                                 begin,
                                 end=None,
-                                project_id=None):
+                                project_id=None,
+                                marker=None,
+                                limit=None):
     """Return volumes that were active during window."""
     query = model_query(context, models.Volume, read_deleted="yes")
     query = query.filter(or_(models.Volume.deleted_at == None,
@@ -1867,8 +1872,10 @@ def volume_get_active_by_window(context,
         query = query.filter(models.Volume.created_at < end)
     if project_id:
         query = query.filter_by(project_id=project_id)
+    if marker:
+        query = query.filter(models.Volume.id > marker)
 
-    return query.all()
+    return query.order_by(models.Volume.id).limit(limit).all()
 
 
 ####################
@@ -2311,6 +2318,22 @@ def volume_glance_metadata_get_all(context):
     return _volume_glance_metadata_get_all(context)
 
 
+@require_context
+def volume_glance_metadata_list_get(context, volume_id_list):
+    """Return the Glance metadata for a list of volumes in one query."""
+    if not volume_id_list:
+        return []
+
+    query = model_query(context, models.VolumeGlanceMetadata,
+                        read_deleted="no").\
+        filter(models.VolumeGlanceMetadata.volume_id.in_(volume_id_list))
+    if is_user_context(context):
+        query = query.join('volume').\
+            filter(models.Volume.project_id == context.project_id)
+
+    return query.all()
+
+
 @require_context
 @require_volume_exists
 def _volume_glance_metadata_get(context, volume_id, session=None):
@@ -19,14 +19,20 @@
 
 from __future__ import absolute_import
 
+import collections
 import copy
+import hashlib
+import httplib
 import itertools
 import random
 import shutil
+import socket
 import sys
 import time
+import urllib
 import urlparse
 
+from eventlet import greenthread
 import glanceclient.exc
 from oslo.config import cfg
 
@@ -34,6 +40,7 @@ from cinder import exception
 from cinder.openstack.common import jsonutils
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import timeutils
+from cinder import units
 
 glance_opts = [
     cfg.ListOpt('allowed_direct_url_schemes',
@@ -41,12 +48,25 @@ glance_opts = [
                 help='A list of url schemes that can be downloaded directly '
                      'via the direct_url.  Currently supported schemes: '
                      '[file].'),
+    cfg.IntOpt('glance_download_parallelism',
+               default=1,
+               help='Number of byte ranges of an image downloaded from '
+                    'glance concurrently. Values above 1 need glance API '
+                    'servers that honour HTTP Range requests'),
+    cfg.IntOpt('glance_download_range_size',
+               default=64,
+               help='Size in MB of the byte ranges of an image downloaded '
+                    'concurrently'),
 ]
 CONF = cfg.CONF
 CONF.register_opts(glance_opts)
 
 LOG = logging.getLogger(__name__)
 
+# Errors while reading image data after which the download is resumed
+_RESUMABLE_ERRORS = (socket.error, httplib.HTTPException,
+                     glanceclient.exc.CommunicationError)
+
 
 def _parse_image_ref(image_href):
     """Parse an image href into composite parts.
@@ -145,6 +165,45 @@ class GlanceClientWrapper(object):
         if version in kwargs:
             version = kwargs['version']
 
+        return self._call(context, method, version,
+                          lambda client: getattr(client.images, method)(
+                              *args, **kwargs))
+
+    def open_range(self, context, image_id, offset, length=None):
+        """Request image data from offset on.
+
+        Asks for up to length bytes, or for the rest of the image, and
+        returns the response and an iterator over its body.  API servers
+        which ignore the Range header answer 200 with the whole image.
+        """
+        version = self.version or CONF.glance_api_version
+        if version == 2:
+            url = '/v2/images/%s/file' % image_id
+        else:
+            url = '/v1/images/%s' % urllib.quote(str(image_id))
+        end = '' if length is None else str(offset + length - 1)
+        headers = {'Range': 'bytes=%d-%s' % (offset, end)}
+
+        return self._call(context, 'data', version,
+                          lambda client: client.http_client.raw_request(
+                              'GET', url, headers=headers))
+
+    def read_range(self, context, image_id, offset, length=None):
+        """Return an iterator over the image data from offset on.
+
+        Reads up to length bytes, or to the end of the image.  API servers
+        which ignore the Range header send the whole image, the bytes
+        before offset are skipped then.
+        """
+        resp, body = self.open_range(context, image_id, offset, length)
+        if resp.status == 206:
+            return body
+        if offset:
+            LOG.warn(_("Glance server '%s' ignored a range request for "
+                       "image data.") % self.netloc)
+        return _slice_chunks(body, offset, length)
+
+    def _call(self, context, method, version, func):
         retry_excs = (glanceclient.exc.ServiceUnavailable,
                       glanceclient.exc.InvalidEndpoint,
                       glanceclient.exc.CommunicationError)
@@ -154,7 +213,7 @@ class GlanceClientWrapper(object):
             client = self.client or self._create_onetime_client(context,
                                                                 version)
             try:
-                return getattr(client.images, method)(*args, **kwargs)
+                return func(client)
             except retry_excs as e:
                 netloc = self.netloc
                 extra = "retrying"
@@ -263,16 +322,97 @@ class GlanceImageService(object):
                     shutil.copyfileobj(f, data)
                 return
 
+        if not data:
+            try:
+                return self._client.call(context, 'data', image_id)
+            except Exception:
+                _reraise_translated_image_exception(image_id)
+
         try:
-            image_chunks = self._client.call(context, 'data', image_id)
+            # The checksum and size come with the data, so the image is
+            # not looked up separately.  With parallel downloads the first
+            # request asks for the first range only.
+            range_size = None
+            if CONF.glance_download_parallelism > 1:
+                range_size = CONF.glance_download_range_size * units.MiB
+            resp, chunks = self._client.open_range(context, image_id, 0,
+                                                   range_size)
+            writer = _ImageWriter(data, _response_checksum(resp))
+            size = _response_size(resp)
+            if (range_size and resp.status == 206 and size and
+                    size > range_size):
+                self._download_ranges(context, image_id, size, range_size,
+                                      writer, chunks)
+            else:
+                self._download_data(context, image_id, writer.write,
+                                    chunks=chunks)
         except Exception:
             _reraise_translated_image_exception(image_id)
+        writer.verify(image_id)
 
-        if not data:
-            return image_chunks
-        else:
-            for chunk in image_chunks:
-                data.write(chunk)
+    def _download_data(self, context, image_id, write, offset=0,
+                       length=None, chunks=None):
+        """Pass image data to write, resuming after read errors.
+
+        chunks is the body of a request already made for the data.  An
+        interrupted download is resumed from the last byte received up to
+        CONF.glance_num_retries times.
+        """
+        received = 0
+        num_attempts = 1 + CONF.glance_num_retries
+        for attempt in xrange(1, num_attempts + 1):
+            try:
+                if chunks is None:
+                    remaining = None if length is None else length - received
+                    chunks = self._client.read_range(context, image_id,
+                                                     offset + received,
+                                                     remaining)
+                for chunk in chunks:
+                    write(chunk)
+                    received += len(chunk)
+                if length is not None and received < length:
+                    raise httplib.IncompleteRead('', length - received)
+                return received
+            except _RESUMABLE_ERRORS as e:
+                if attempt == num_attempts:
+                    raise exception.GlanceConnectionFailed(reason=str(e))
+                LOG.warn(_("Download of image %(image_id)s interrupted at "
+                           "byte %(offset)d, resuming: %(error)s") %
+                         {'image_id': image_id,
+                          'offset': offset + received,
+                          'error': e})
+                chunks = None
+
+    def _download_ranges(self, context, image_id, size, range_size, writer,
+                         first_chunks):
+        """Download byte ranges of the image concurrently.
+
+        first_chunks is the body of the request for the first range.  Up
+        to CONF.glance_download_parallelism more ranges are fetched while
+        it is read, and they are written in order as they complete.
+        """
+        def _fetch(offset):
+            chunks = []
+            self._download_data(context, image_id, chunks.append, offset,
+                                min(range_size, size - offset))
+            return chunks
+
+        offsets = iter(xrange(range_size, size, range_size))
+        pending = collections.deque(
+            greenthread.spawn(_fetch, offset) for offset in
+            itertools.islice(offsets, CONF.glance_download_parallelism))
+        try:
+            self._download_data(context, image_id, writer.write, 0,
+                                range_size, first_chunks)
+            while pending:
+                chunks = pending.popleft().wait()
+                for offset in itertools.islice(offsets, 1):
+                    pending.append(greenthread.spawn(_fetch, offset))
+                for chunk in chunks:
+                    writer.write(chunk)
+        finally:
+            for thread in pending:
+                thread.kill()
 
     def create(self, context, image_meta, data=None):
         """Store the image data and return the new image object."""
@@ -368,6 +508,59 @@ class GlanceImageService(object):
         return str(user_id) == str(context.user_id)
 
 
+class _ImageWriter(object):
+    """Writes image data in order, computing its checksum as it goes."""
+
+    def __init__(self, data, checksum=None):
+        self.data = data
+        self.checksum = checksum
+        self.md5 = hashlib.md5()
+
+    def write(self, chunk):
+        self.data.write(chunk)
+        self.md5.update(chunk)
+
+    def verify(self, image_id):
+        if self.checksum and self.md5.hexdigest() != self.checksum:
+            reason = (_("checksum of the downloaded data %(actual)s does "
+                        "not match %(expected)s") %
+                      {'actual': self.md5.hexdigest(),
+                       'expected': self.checksum})
+            raise exception.ImageUnacceptable(image_id=image_id,
+                                              reason=reason)
+
+
+def _response_checksum(resp):
+    """Return the image checksum sent with image data, if any."""
+    return (resp.getheader('x-image-meta-checksum', None) or
+            resp.getheader('content-md5', None))
+
+
+def _response_size(resp):
+    """Return the image size from an image data response, or None."""
+    content_range = resp.getheader('content-range', None)
+    if resp.status == 206 and content_range:
+        total = content_range.rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+    length = resp.getheader('content-length', None)
+    return int(length) if length else None
+
+
+def _slice_chunks(chunks, offset, length=None):
+    """Yield the length bytes from offset on of an iterator of chunks."""
+    end = None if length is None else offset + length
+    position = 0
+    for chunk in chunks:
+        start = position
+        position += len(chunk)
+        if position <= offset:
+            continue
+        if end is not None and start >= end:
+            break
+        yield chunk[max(offset - start, 0):
+                    None if end is None else end - start]
+
+
 def _convert_timestamps_to_datetimes(image_meta):
     """Returns image with timestamp fields converted to datetime objects."""
     for attr in ['created_at', 'updated_at', 'deleted_at']:
@@ -52,12 +52,15 @@ This module provides Manager, a base class for managers.
 """
 
 
+import copy
+
 from oslo.config import cfg
 
+from cinder.common import rpc_latency
 from cinder.db import base
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import periodic_task
-from cinder.openstack.common.rpc import dispatcher as rpc_dispatcher
+from cinder.openstack.common import uuidutils
 from cinder.scheduler import rpcapi as scheduler_rpcapi
 from cinder import version
 
@@ -82,12 +85,17 @@ class Manager(base.Base, periodic_task.PeriodicTasks):
         If a manager would like to set an rpc API version, or support more than
         one class as the target of rpc messages, override this method.
         '''
-        return rpc_dispatcher.RpcDispatcher([self])
+        return rpc_latency.RpcDispatcher([self])
 
     def periodic_tasks(self, context, raise_on_error=False):
         """Tasks to be run at a periodic interval."""
         return self.run_periodic_tasks(context, raise_on_error=raise_on_error)
 
+    @periodic_task.periodic_task
+    def _report_rpc_latencies(self, context):
+        """Log the RPC latency histograms of this service."""
+        rpc_latency.report_latency_histograms()
+
     def init_host(self):
         """Handle initialization if this is a standalone service.
 
@@ -114,25 +122,66 @@ class SchedulerDependentManager(Manager):
     manager.Manager directly. Updates are only sent after
     update_service_capabilities is called with non-None values.
 
+    Capabilities are versioned: the first update is a full snapshot, after
+    which only the keys that changed (or a heartbeat if nothing changed) are
+    sent, until a full snapshot is asked for again with
+    reset_published_capabilities.
+
     """
 
     def __init__(self, host=None, db_driver=None, service_name='undefined'):
         self.last_capabilities = None
         self.service_name = service_name
         self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
+        # Identifies this incarnation of the service, so schedulers notice
+        # a restart even though versions start over.
+        self._capabilities_generation = uuidutils.generate_uuid()
+        self._capabilities_version = 0
+        self._published_capabilities = None
         super(SchedulerDependentManager, self).__init__(host, db_driver)
 
     def update_service_capabilities(self, capabilities):
         """Remember these capabilities to send on next periodic update."""
         self.last_capabilities = capabilities
 
+    def reset_published_capabilities(self):
+        """Send a full snapshot of the capabilities on the next update."""
+        self._published_capabilities = None
+
     @periodic_task.periodic_task
     def _publish_service_capabilities(self, context):
         """Pass data back to the scheduler at a periodic interval."""
-        if self.last_capabilities:
+        if not self.last_capabilities:
+            return
+
+        published = self._published_capabilities
+        if published is None:
             LOG.debug(_('Notifying Schedulers of capabilities ...'))
-            self.scheduler_rpcapi.update_service_capabilities(
-                context,
-                self.service_name,
-                self.host,
-                self.last_capabilities)
+            self._capabilities_version += 1
+            capabilities = self.last_capabilities
+            base_version = None
+            removed = None
+        else:
+            capabilities = dict((key, value) for key, value
+                                in self.last_capabilities.iteritems()
+                                if key not in published or
+                                published[key] != value)
+            removed = [key for key in published
+                       if key not in self.last_capabilities]
+            base_version = self._capabilities_version
+            if capabilities or removed:
+                LOG.debug(_('Notifying Schedulers of capability changes '
+                            '...'))
+                self._capabilities_version += 1
+
+        self.scheduler_rpcapi.update_service_capabilities(
+            context,
+            self.service_name,
+            self.host,
+            capabilities,
+            generation=self._capabilities_generation,
+            capabilities_version=self._capabilities_version,
+            base_version=base_version,
+            removed=removed)
+        # Keep a copy so changes made in place by the driver are noticed
+        self._published_capabilities = copy.deepcopy(self.last_capabilities)
@@ -15,11 +15,15 @@
 
 """Policy Engine For Cinder"""
 
+import re
+import time
+import weakref
 
 from oslo.config import cfg
 
 from cinder import exception
 from cinder.openstack.common.gettextutils import _
+from cinder.openstack.common import log as logging
 from cinder.openstack.common import policy
 from cinder import utils
 
@@ -30,20 +34,38 @@ policy_opts = [
                help=_('JSON file representing policy')),
     cfg.StrOpt('policy_default_rule',
                default='default',
-               help=_('Rule checked when requested rule is not found')), ]
+               help=_('Rule checked when requested rule is not found')),
+    cfg.IntOpt('policy_file_check_interval',
+               default=5,
+               help=_('Seconds between checks of the policy file for '
+                      'changes, 0 checks it on every policy enforcement')), ]
 
 CONF = cfg.CONF
 CONF.register_opts(policy_opts)
 
+LOG = logging.getLogger(__name__)
+
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+_COMPILED_RULES = None
+# Per request (context) cache of policy decisions.
+_DECISIONS = weakref.WeakKeyDictionary()
+
+# Credentials whose values are part of the decision cache key.
+_CACHEABLE_CREDENTIALS = ('roles', 'project_id', 'user_id', 'tenant', 'user',
+                          'is_admin')
+_TARGET_KEY_RE = re.compile(r'%\(([^)]+)\)')
 
 
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _COMPILED_RULES
+    global _DECISIONS
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _COMPILED_RULES = None
+    _DECISIONS = weakref.WeakKeyDictionary()
     policy.reset()
 
 
@@ -52,8 +74,13 @@ def init():
     global _POLICY_CACHE
     if not _POLICY_PATH:
         _POLICY_PATH = utils.find_config(CONF.policy_file)
+    now = time.time()
+    interval = CONF.policy_file_check_interval
+    if _POLICY_CACHE and now - _POLICY_CACHE.get('checked', 0) < interval:
+        return
     utils.read_cached_file(_POLICY_PATH, _POLICY_CACHE,
                            reload_func=_set_brain)
+    _POLICY_CACHE['checked'] = now
 
 
 def _set_brain(data):
@@ -61,6 +88,167 @@ def _set_brain(data):
     policy.set_brain(policy.Brain.load_json(data, default_rule))
 
 
+class CompiledRules(object):
+    """The rules of a policy brain compiled into callables.
+
+    Every rule is turned into a function of (target, credentials) once,
+    instead of the brain parsing and dispatching on each match string for
+    every check. Rule kinds other than rule, role and generic matches (for
+    example http) are delegated to the brain.
+    """
+
+    def __init__(self, brain):
+        self.brain = brain
+        self._checks = {}
+        self._deps = {}
+        for name, match_list in brain.rules.items():
+            self._checks[name] = self._compile_match_list(match_list)
+
+    def check(self, action, target, credentials):
+        return self._check_rule(action, target, credentials)
+
+    def _check_rule(self, name, target, credentials):
+        check = self._checks.get(name)
+        if check is None:
+            default_rule = self.brain.default_rule
+            if not default_rule or name == default_rule:
+                return False
+            check = self._checks.get(default_rule)
+            if check is None:
+                return False
+        return check(target, credentials)
+
+    def _compile_match_list(self, match_list):
+        if not match_list:
+            return lambda target, credentials: True
+
+        or_checks = []
+        for and_list in match_list:
+            if isinstance(and_list, basestring):
+                and_list = (and_list,)
+            or_checks.append([self._compile_match(match)
+                              for match in and_list])
+
+        def check(target, credentials):
+            for and_checks in or_checks:
+                for and_check in and_checks:
+                    if not and_check(target, credentials):
+                        break
+                else:
+                    return True
+            return False
+        return check
+
+    def _compile_match(self, match):
+        try:
+            match_kind, match_value = match.split(':', 1)
+        except ValueError:
+            LOG.error(_("Failed to understand rule %r") % match)
+            # If the rule is invalid, fail closed
+            return lambda target, credentials: False
+
+        handler = policy.Brain._checks.get(match_kind)
+        if match_kind == 'rule' and handler is policy._check_rule:
+            return lambda target, credentials: self._check_rule(
+                match_value, target, credentials)
+
+        if match_kind == 'role' and handler is policy._check_role:
+            role = match_value.lower()
+            return lambda target, credentials: role in [
+                r.lower() for r in credentials['roles']]
+
+        if (handler is None and
+                policy.Brain._checks.get(None) is policy._check_generic):
+            if '%' not in match_value:
+                value = unicode(match_value)
+                return lambda target, credentials: (
+                    match_kind in credentials and
+                    value == unicode(credentials[match_kind]))
+            return lambda target, credentials: (
+                match_kind in credentials and
+                match_value % target == unicode(credentials[match_kind]))
+
+        return lambda target, credentials: self.brain._check(
+            match, target, credentials)
+
+    def get_dependencies(self, action):
+        """Return the target keys and credentials an action depends on.
+
+        Returns a tuple of (target keys, credential keys), or None if the
+        decision may depend on anything, e.g. because a check is
+        delegated to the brain.
+        """
+        if action not in self._deps:
+            self._deps[action] = self._find_dependencies(action, set())
+        return self._deps[action]
+
+    def _find_dependencies(self, name, seen):
+        if name in seen:
+            return (set(), set())
+        seen.add(name)
+
+        if name not in self.brain.rules:
+            default_rule = self.brain.default_rule
+            if (not default_rule or name == default_rule or
+                    default_rule not in self.brain.rules):
+                return (set(), set())
+            name = default_rule
+
+        target_keys = set()
+        credential_keys = set()
+        for and_list in self.brain.rules[name] or ():
+            if isinstance(and_list, basestring):
+                and_list = (and_list,)
+            for match in and_list:
+                match_kind, _sep, match_value = match.partition(':')
+                if match_kind == 'rule':
+                    deps = self._find_dependencies(match_value, seen)
+                    if deps is None:
+                        return None
+                    target_keys.update(deps[0])
+                    credential_keys.update(deps[1])
+                elif match_kind == 'role':
+                    credential_keys.add('roles')
+                elif match_kind in policy.Brain._checks:
+                    return None
+                else:
+                    target_keys.update(_TARGET_KEY_RE.findall(match_value))
+                    credential_keys.add(match_kind)
+        return (target_keys, credential_keys)
+
+
+def _get_compiled_rules():
+    """Return the rules of the current brain compiled, if possible."""
+    global _COMPILED_RULES
+    brain = policy._BRAIN
+    if brain is None:
+        brain = policy.Brain()
+        policy.set_brain(brain)
+    if brain.__class__ is not policy.Brain:
+        # Brains overriding checks through inheritance can't be compiled
+        return None
+    if _COMPILED_RULES is None or _COMPILED_RULES.brain is not brain:
+        _COMPILED_RULES = CompiledRules(brain)
+    return _COMPILED_RULES
+
+
+def _get_decision_key(rules, context, action, target):
+    deps = rules.get_dependencies(action)
+    if deps is None:
+        return None
+    target_keys, credential_keys = deps
+    if not credential_keys.issubset(_CACHEABLE_CREDENTIALS):
+        return None
+    key = (action, tuple(context.roles), context.project_id,
+           context.user_id, context.is_admin,
+           tuple((k, target.get(k)) for k in sorted(target_keys)))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
 def enforce_action(context, action):
     """Checks that the action can be done by the given context.
 
@@ -94,11 +282,35 @@ def enforce(context, action, target):
     """
     init()
 
-    match_list = ('rule:%s' % action,)
-    credentials = context.to_dict()
+    rules = _get_compiled_rules()
+    if rules is None:
+        match_list = ('rule:%s' % action,)
+        credentials = context.to_dict()
+        policy.enforce(match_list, target, credentials,
+                       exception.PolicyNotAuthorized, action=action)
+        return
+
+    key = _get_decision_key(rules, context, action, target)
+    decisions = None
+    if key is not None:
+        try:
+            decisions = _DECISIONS.get(context)
+            if decisions is None or decisions[0] is not rules:
+                decisions = (rules, {})
+                _DECISIONS[context] = decisions
+        except TypeError:
+            # context can't be weakly referenced
+            decisions = None
+
+    if decisions is not None and key in decisions[1]:
+        allowed = decisions[1][key]
+    else:
+        allowed = rules.check(action, target, context.to_dict())
+        if decisions is not None:
+            decisions[1][key] = allowed
 
-    policy.enforce(match_list, target, credentials,
-                   exception.PolicyNotAuthorized, action=action)
+    if not allowed:
+        raise exception.PolicyNotAuthorized(action=action)
 
 
 def check_is_admin(roles):
@@ -116,4 +328,7 @@ def check_is_admin(roles):
     target = {'project_id': ''}
     credentials = {'roles': roles}
 
-    return policy.enforce(match_list, target, credentials)
+    rules = _get_compiled_rules()
+    if rules is None:
+        return policy.enforce(match_list, target, credentials)
+    return rules.check(action, target, credentials)
@@ -58,11 +58,16 @@ class Scheduler(object):
             CONF.scheduler_host_manager)
         self.volume_rpcapi = volume_rpcapi.VolumeAPI()
 
-    def update_service_capabilities(self, service_name, host, capabilities):
-        """Process a capability update from a service node."""
-        self.host_manager.update_service_capabilities(service_name,
-                                                      host,
-                                                      capabilities)
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    **kwargs):
+        """Process a capability update from a service node.
+
+        Returns False if a delta could not be applied.
+        """
+        return self.host_manager.update_service_capabilities(service_name,
+                                                             host,
+                                                             capabilities,
+                                                             **kwargs)
 
     def host_passes_filters(self, context, volume_id, host, filter_properties):
         """Check if the specified host passes the filters."""
@@ -164,6 +164,7 @@ class HostManager(object):
 
     def __init__(self):
         self.service_states = {}  # { <host>: {<service>: {cap k : v}}}
+        self.service_versions = {}  # { <host>: (generation, version)}
         self.host_state_map = {}
         self.filter_handler = filters.HostFilterHandler('cinder.scheduler.'
                                                         'filters')
@@ -258,22 +259,55 @@ class HostManager(object):
                                                        hosts,
                                                        weight_properties)
 
-    def update_service_capabilities(self, service_name, host, capabilities):
-        """Update the per-service capabilities based on this notification."""
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    generation=None, capabilities_version=None,
+                                    base_version=None, removed=None):
+        """Update the per-service capabilities based on this notification.
+
+        The update is a full snapshot of the capabilities unless
+        base_version is set, in which case it is a delta holding the changed
+        capabilities and the names of the removed ones, to be applied to
+        base_version of the capabilities.
+
+        Returns False if the delta can't be applied because the known
+        capabilities of the host are of another version, so that a full
+        snapshot should be requested.
+        """
         if service_name != 'volume':
             LOG.debug(_('Ignoring %(service_name)s service update '
                         'from %(host)s'),
                       {'service_name': service_name, 'host': host})
             return
 
-        LOG.debug(_("Received %(service_name)s service update from "
-                    "%(host)s.") %
-                  {'service_name': service_name, 'host': host})
+        if base_version is not None:
+            current = self.service_states.get(host)
+            if (current is None or
+                    self.service_versions.get(host) !=
+                    (generation, base_version)):
+                LOG.debug(_("Can't apply capabilities delta from %(host)s, "
+                            "version %(version)s is unknown.") %
+                          {'host': host, 'version': base_version})
+                return False
+
+            LOG.debug(_("Received %(service_name)s service update delta "
+                        "from %(host)s.") %
+                      {'service_name': service_name, 'host': host})
+            capab_copy = dict(current)
+            capab_copy.update(capabilities)
+            for key in removed or []:
+                capab_copy.pop(key, None)
+        else:
+            LOG.debug(_("Received %(service_name)s service update from "
+                        "%(host)s.") %
+                      {'service_name': service_name, 'host': host})
+
+            # Copy the capabilities, so we don't modify the original dict
+            capab_copy = dict(capabilities)
 
-        # Copy the capabilities, so we don't modify the original dict
-        capab_copy = dict(capabilities)
         capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
         self.service_states[host] = capab_copy
+        self.service_versions[host] = (generation, capabilities_version)
+        return True
 
     def get_all_host_states(self, context):
         """Returns a dict of all the hosts the HostManager
@@ -50,7 +50,7 @@ LOG = logging.getLogger(__name__)
 class SchedulerManager(manager.Manager):
     """Chooses a host to create volumes."""
 
-    RPC_API_VERSION = '1.4'
+    RPC_API_VERSION = '1.5'
 
     def __init__(self, scheduler_driver=None, service_name=None,
                  *args, **kwargs):
@@ -74,13 +74,24 @@ class SchedulerManager(manager.Manager):
         self.request_service_capabilities(ctxt)
 
     def update_service_capabilities(self, context, service_name=None,
-                                    host=None, capabilities=None, **kwargs):
-        """Process a capability update from a service node."""
+                                    host=None, capabilities=None,
+                                    generation=None, capabilities_version=None,
+                                    base_version=None, removed=None,
+                                    **kwargs):
+        """Process a capability update from a service node.
+
+        If the update is a delta which can't be applied to the capabilities
+        known for the host, a full snapshot is requested from it.
+        """
         if capabilities is None:
             capabilities = {}
-        self.driver.update_service_capabilities(service_name,
-                                                host,
-                                                capabilities)
+        applied = self.driver.update_service_capabilities(
+            service_name, host, capabilities, generation=generation,
+            capabilities_version=capabilities_version,
+            base_version=base_version, removed=removed)
+        if applied is False:
+            volume_rpcapi.VolumeAPI().publish_service_capabilities(
+                context, host=host)
 
     def create_volume(self, context, topic, volume_id, snapshot_id=None,
                       image_id=None, request_spec=None,
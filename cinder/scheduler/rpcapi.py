@@ -36,6 +36,9 @@ class SchedulerAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
               to create_volume()
         1.3 - Add migrate_volume_to_host() method
         1.4 - Add retype method
+        1.5 - Add generation, capabilities_version, base_version and
+              removed to update_service_capabilities() to publish
+              capability deltas
     '''
 
     RPC_API_VERSION = '1.0'
@@ -86,7 +89,14 @@ class SchedulerAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
 
     def update_service_capabilities(self, ctxt,
                                     service_name, host,
-                                    capabilities):
+                                    capabilities, generation=None,
+                                    capabilities_version=None,
+                                    base_version=None, removed=None):
         self.fanout_cast(ctxt, self.make_msg('update_service_capabilities',
                          service_name=service_name, host=host,
-                         capabilities=capabilities))
+                         capabilities=capabilities,
+                         generation=generation,
+                         capabilities_version=capabilities_version,
+                         base_version=base_version,
+                         removed=removed),
+                         version='1.5')
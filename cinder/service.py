@@ -33,6 +33,7 @@ from cinder.openstack.common import loopingcall
 from cinder.openstack.common import rpc
 from cinder.openstack.common import service
 from cinder import version
+from cinder.volume import notifier
 from cinder import wsgi
 
 
@@ -228,6 +229,7 @@ class Service(service.Service):
             except Exception:
                 pass
         self.timers = []
+        notifier.reset()
 
         super(Service, self).stop()
 
@@ -106,6 +106,23 @@ class VolumeImageMetadataTest(test.TestCase):
         self.assertEqual(self._get_image_metadata_list(res.body)[0],
                          fake_image_metadata)
 
+    def test_list_detail_volumes_bulk_lookup(self):
+        calls = []
+
+        def fake_get_metadata(self, context, volume_ids=None):
+            calls.append(volume_ids)
+            return fake_get_volumes_image_metadata()
+
+        self.stubs.Set(volume.API, 'get_volumes_image_metadata',
+                       fake_get_metadata)
+        self.stubs.Set(volume.API, 'get_volume_image_metadata', None)
+        res = self._make_request('/v2/fake/volumes/detail')
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual(self._get_image_metadata_list(res.body)[0],
+                         fake_image_metadata)
+        # Only the listed volumes are looked up, in a single call
+        self.assertEqual([['fake']], calls)
+
 
 class ImageMetadataXMLDeserializer(common.MetadataXMLDeserializer):
     metadata_node_name = "volume_image_metadata"
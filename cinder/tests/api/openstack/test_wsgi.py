@@ -10,11 +10,14 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 import inspect
+
 import webob
 
 from cinder.api.openstack import wsgi
 from cinder import exception
+from cinder.openstack.common import jsonutils
 from cinder import test
 from cinder.tests.api import fakes
 
@@ -184,6 +187,14 @@ class JSONDictSerializerTest(test.TestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(result, expected_json)
 
+    def test_json_datetime(self):
+        input_dict = dict(volume=dict(
+            created_at=datetime.datetime(2014, 1, 2, 3, 4, 5),
+            size=1))
+        serializer = wsgi.JSONDictSerializer()
+        result = serializer.serialize(input_dict)
+        self.assertEqual(jsonutils.dumps(input_dict), result)
+
 
 class TextDeserializerTest(test.TestCase):
     def test_dispatch_default(self):
@@ -794,6 +805,37 @@ class ResourceTest(test.TestCase):
         self.assertEqual(called, [2])
         self.assertEqual(response, 'foo')
 
+    def test_post_process_extensions_batch(self):
+        class Controller(wsgi.Controller):
+            @wsgi.extends(batch='volumes')
+            def detail(self, req, resp_obj, items):
+                called.append([item['id'] for item in items])
+
+            @wsgi.extends(batch='volume')
+            def show(self, req, resp_obj, items, id):
+                called.append([item['id'] for item in items])
+
+        controller = Controller()
+        resource = wsgi.Resource(None)
+
+        called = []
+
+        resp_obj = wsgi.ResponseObject({'volumes': [{'id': 1}, {'id': 2}],
+                                        'volumes_links': []})
+        response = resource.post_process_extensions([controller.detail],
+                                                    resp_obj, None, {})
+        self.assertIsNone(response)
+
+        resp_obj = wsgi.ResponseObject({'volume': {'id': 3}})
+        resource.post_process_extensions([controller.show], resp_obj,
+                                         None, {'id': 3})
+
+        # Not called without any resources
+        resp_obj = wsgi.ResponseObject({'volumes': []})
+        resource.post_process_extensions([controller.detail], resp_obj,
+                                         None, {})
+        self.assertEqual([[1, 2], [3]], called)
+
 
 class ResponseObjectTest(test.TestCase):
     def test_default_code(self):
@@ -654,6 +654,28 @@ class TemplateTest(test.TestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(result, expected_xml)
 
+    def test_serialize_reuses_plan(self):
+        root = xmlutil.TemplateElement('test', selector='test')
+        value = xmlutil.SubTemplateElement(root, 'value', selector='value')
+        value.text = xmlutil.Selector()
+        master = xmlutil.MasterTemplate(root, 1)
+        copy = master.copy()
+        obj = {'test': {'value': 'foo', 'other': 'bar'}}
+
+        self.assertIn('<value>foo</value>', master.serialize(obj))
+        self.assertEqual(1, len(master._plans))
+        plan = master._plans.values()[0]
+
+        # Copies share the plans compiled for the master
+        self.assertIn('<value>foo</value>', copy.serialize(obj))
+        self.assertEqual([plan], copy._plans.values())
+
+        # Changing the element tree compiles a new plan
+        other = xmlutil.SubTemplateElement(root, 'other', selector='other')
+        other.text = xmlutil.Selector()
+        self.assertIn('<other>bar</other>', copy.serialize(obj))
+        self.assertNotEqual([plan], master._plans.values())
+
 
 class MasterTemplateBuilder(xmlutil.TemplateBuilder):
     def construct(self):
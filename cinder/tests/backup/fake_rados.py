@@ -51,6 +51,12 @@ class mock_rados(object):
         def open_ioctx(self, *args, **kwargs):
             return mock_rados.ioctx()
 
+        def get_fsid(self, *args, **kwargs):
+            pass
+
+        def get_cluster_stats(self, *args, **kwargs):
+            pass
+
         def shutdown(self, *args, **kwargs):
             pass
 
@@ -61,6 +67,9 @@ class mock_rados(object):
 
 class mock_rbd(object):
 
+    class Error(Exception):
+        pass
+
     class ImageBusy(Exception):
         def __init__(self, *args, **kwargs):
             pass
@@ -110,6 +119,9 @@ class mock_rbd(object):
         def size(self):
             raise NotImplementedError()
 
+        def diff_iterate(self, *args, **kwargs):
+            raise NotImplementedError()
+
     class RBD(object):
 
         def __init__(self, *args, **kwargs):
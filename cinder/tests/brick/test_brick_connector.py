@@ -173,9 +173,9 @@ class ISCSIConnectorTestCase(ConnectorTestCase):
         self.assertEqual(device['path'], dev_str)
 
         self.connector.disconnect_volume(connection_info['data'], device)
-        expected_commands = [('iscsiadm -m node -T %s -p %s' %
+        expected_commands = [('iscsiadm -m session'),
+                             ('iscsiadm -m node -T %s -p %s' %
                               (iqn, location)),
-                             ('iscsiadm -m session'),
                              ('iscsiadm -m node -T %s -p %s --login' %
                               (iqn, location)),
                              ('iscsiadm -m node -T %s -p %s --op update'
@@ -212,10 +212,10 @@ class ISCSIConnectorTestCase(ConnectorTestCase):
                        lambda x: [[location, iqn]])
         self.stubs.Set(self.connector_with_multipath,
                        '_connect_to_iscsi_portal',
-                       lambda x: None)
+                       lambda *args: None)
         self.stubs.Set(self.connector_with_multipath,
-                       '_rescan_iscsi',
-                       lambda: None)
+                       '_rescan_iscsi_lun',
+                       lambda *args: None)
         self.stubs.Set(self.connector_with_multipath,
                        '_rescan_multipath',
                        lambda: None)
@@ -241,6 +241,69 @@ class ISCSIConnectorTestCase(ConnectorTestCase):
                           self.connector.connect_volume,
                           connection_info['data'])
 
+    def test_connect_volume_with_existing_session(self):
+        location = '10.0.2.15:3260'
+        name = 'volume-00000001'
+        iqn = 'iqn.2010-10.org.openstack:%s' % name
+        vol = {'id': 1, 'name': name}
+        connection_info = self.iscsi_connection(vol, location, iqn)
+        session = 'tcp: [3] %s,1 %s\n' % (location, iqn)
+        self.stubs.Set(self.connector, '_run_iscsiadm_bare',
+                       lambda *args, **kwargs: (session, None))
+        self.stubs.Set(self.connector, '_run_iscsiadm',
+                       lambda *args, **kwargs: self.fail('login attempted'))
+        device = self.connector.connect_volume(connection_info['data'])
+        dev_str = '/dev/disk/by-path/ip-%s-iscsi-%s-lun-1' % (location, iqn)
+        self.assertEqual(device['path'], dev_str)
+
+    def test_connect_volumes(self):
+        location = '10.0.2.15:3260'
+        iqn = 'iqn.2010-10.org.openstack:target'
+        vol = {'id': 1, 'name': 'volume-00000001'}
+        props1 = self.iscsi_connection(vol, location, iqn)['data']
+        props2 = dict(props1, target_lun=2)
+        logins = []
+        self.stubs.Set(self.connector, '_connect_to_iscsi_portal',
+                       lambda props, sessions: logins.append(props))
+        devices = self.connector.connect_volumes([props1, props2])
+        self.assertEqual([props1], logins)
+        dev_str = '/dev/disk/by-path/ip-%s-iscsi-%s-lun-%%s' % (location, iqn)
+        self.assertEqual([{'type': 'block', 'path': dev_str % 1},
+                          {'type': 'block', 'path': dev_str % 2}], devices)
+
+    def test_get_iscsi_sessions(self):
+        out = ('tcp: [1] 10.0.2.15:3260,1 iqn.2010-10.org.openstack:vol1\n'
+               'tcp: [12] 10.0.2.16:3260,1 iqn.2010-10.org.openstack:vol2\n')
+        self.stubs.Set(self.connector, '_run_iscsiadm_bare',
+                       lambda *args, **kwargs: (out, None))
+        sessions = self.connector._get_iscsi_sessions()
+        self.assertEqual([{'sid': '1', 'portal': '10.0.2.15:3260,1',
+                           'iqn': 'iqn.2010-10.org.openstack:vol1'},
+                          {'sid': '12', 'portal': '10.0.2.16:3260,1',
+                           'iqn': 'iqn.2010-10.org.openstack:vol2'}],
+                         sessions)
+
+    def test_rescan_iscsi_lun(self):
+        props = {'target_portal': '10.0.2.15:3260',
+                 'target_iqn': 'iqn.2010-10.org.openstack:vol1',
+                 'target_lun': 3}
+        sessions = [{'sid': '5', 'portal': '10.0.2.15:3260,1',
+                     'iqn': 'iqn.2010-10.org.openstack:vol1'}]
+        self.stubs.Set(connector.glob, 'glob',
+                       lambda x: ['/sys/class/iscsi_host/host7/device/'
+                                  'session5'])
+        self.connector._rescan_iscsi_lun(props, sessions)
+        self.assertEqual(['tee -a /sys/class/scsi_host/host7/scan'],
+                         self.cmds)
+
+    def test_rescan_iscsi_lun_without_host(self):
+        props = {'target_portal': '10.0.2.15:3260',
+                 'target_iqn': 'iqn.2010-10.org.openstack:vol1',
+                 'target_lun': 3}
+        self.connector._rescan_iscsi_lun(props, [])
+        self.assertEqual(['iscsiadm -m node -T iqn.2010-10.org.openstack:vol1'
+                          ' -p 10.0.2.15:3260 --rescan'], self.cmds)
+
     def test_get_target_portals_from_iscsiadm_output(self):
         connector = self.connector
         test_output = '''10.15.84.19:3260 iqn.1992-08.com.netapp:sn.33615311
@@ -395,6 +458,10 @@ class FibreChannelConnectorTestCase(ConnectorTestCase):
                        self.fake_get_fc_hbas_info)
         self.stubs.Set(os.path, 'exists', lambda x: True)
         self.stubs.Set(os.path, 'realpath', lambda x: '/dev/sdb')
+        by_path = '/dev/disk/by-path/pci-0000:05:00.2-fc-0x%s-lun-1'
+        self.stubs.Set(self.connector._linuxscsi, 'get_by_path_devices',
+                       lambda lun: {by_path % '1234567890123456': '/dev/sdb',
+                                    by_path % '1234567890123457': '/dev/sdc'})
 
         multipath_devname = '/dev/md-1'
         devices = {"device": multipath_devname,
@@ -442,6 +509,59 @@ class FibreChannelConnectorTestCase(ConnectorTestCase):
                           self.connector.connect_volume,
                           connection_info['data'])
 
+    def test_connect_volume_rescans_target_lun(self):
+        self.stubs.Set(self.connector._linuxfc, "get_fc_hbas_info",
+                       self.fake_get_fc_hbas_info)
+        dev_str = '/dev/disk/by-path/pci-0000:05:00.2-fc-0x%s-lun-1'
+        scans = []
+        waits = []
+
+        def fake_rescan_hosts(hbas, wwns, lun):
+            scans.append((wwns, lun))
+
+        def fake_wait_for_paths(paths):
+            waits.append(paths)
+            return True
+
+        def fake_sleep(secs):
+            self.fail('slept although a path showed up')
+
+        self.stubs.Set(self.connector._linuxscsi, 'wait_for_paths',
+                       fake_wait_for_paths)
+        self.stubs.Set(time, 'sleep', fake_sleep)
+        indexes = [{}, {dev_str % '1234567890123456': '/dev/sdb'}]
+        self.stubs.Set(self.connector._linuxscsi, 'get_by_path_devices',
+                       lambda lun: indexes.pop(0))
+        self.stubs.Set(self.connector._linuxfc, 'rescan_hosts',
+                       fake_rescan_hosts)
+        self.stubs.Set(self.connector._linuxscsi, 'get_device_info',
+                       lambda x: {'device': x})
+        vol = {'id': 1, 'name': 'volume-00000001'}
+        connection_info = self.fibrechan_connection(vol, '10.0.2.15:3260',
+                                                    '1234567890123456')
+        dev_info = self.connector.connect_volume(connection_info['data'])
+        self.assertEqual(dev_str % '1234567890123456', dev_info['path'])
+        self.assertEqual([{'device': '/dev/sdb'}], dev_info['devices'])
+        self.assertEqual([(['1234567890123456'], 1)], scans)
+        self.assertEqual([[dev_str % '1234567890123456']], waits)
+
+    def test_connect_volume_device_not_found(self):
+        self.stubs.Set(self.connector._linuxfc, "get_fc_hbas_info",
+                       self.fake_get_fc_hbas_info)
+        self.stubs.Set(self.connector._linuxscsi, 'get_by_path_devices',
+                       lambda lun: {})
+        self.stubs.Set(self.connector._linuxscsi, 'wait_for_paths',
+                       lambda paths: False)
+        self.stubs.Set(time, 'sleep', lambda x: None)
+        vol = {'id': 1, 'name': 'volume-00000001'}
+        connection_info = self.fibrechan_connection(vol, '10.0.2.15:3260',
+                                                    '1234567890123456')
+        self.assertRaises(exception.NoFibreChannelVolumeDeviceFound,
+                          self.connector.connect_volume,
+                          connection_info['data'])
+        self.assertEqual(['tee -a /sys/class/scsi_host/host1/scan'] *
+                         self.connector.device_scan_attempts, self.cmds)
+
 
 class FakeFixedIntervalLoopingCall(object):
     def __init__(self, f=None, *args, **kw):
@@ -12,8 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import __builtin__
+import contextlib
 import os.path
 import string
+import StringIO
 
 from cinder.brick.initiator import linuxfc
 from cinder.openstack.common import log as logging
@@ -42,6 +45,30 @@ class LinuxFCTestCase(test.TestCase):
                              'tee -a /sys/class/scsi_host/bar/scan']
         self.assertEqual(expected_commands, self.cmds)
 
+    def test_rescan_hosts_targeted(self):
+        hbas = [{'host_device': 'host3'}]
+        self.stubs.Set(self.lfc, 'get_fc_targets',
+                       lambda host, wwns: [('0', '2')])
+        self.lfc.rescan_hosts(hbas, ['1234567890123456'], 4)
+        expected_commands = ['tee -a /sys/class/scsi_host/host3/scan']
+        self.assertEqual(expected_commands, self.cmds)
+
+    def test_get_fc_targets(self):
+        self.stubs.Set(linuxfc.glob, 'glob',
+                       lambda x: ['/sys/class/fc_transport/target3:0:1',
+                                  '/sys/class/fc_transport/target3:0:2'])
+        port_names = {'/sys/class/fc_transport/target3:0:1/port_name':
+                      '0x1234567890123457\n',
+                      '/sys/class/fc_transport/target3:0:2/port_name':
+                      '0x1234567890123456\n'}
+        self.mox.StubOutWithMock(__builtin__, 'open')
+        for path in sorted(port_names):
+            __builtin__.open(path).AndReturn(
+                contextlib.closing(StringIO.StringIO(port_names[path])))
+        self.mox.ReplayAll()
+        targets = self.lfc.get_fc_targets('host3', ['1234567890123456'])
+        self.assertEqual([('0', '2')], targets)
+
     def test_get_fc_hbas_fail(self):
         def fake_exec1(a, b, c, d, run_as_root=True, root_helper='sudo'):
             raise OSError
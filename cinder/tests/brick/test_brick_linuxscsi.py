@@ -38,6 +38,46 @@ class LinuxSCSITestCase(test.TestCase):
         expected_commands = ['tee -a /some/path']
         self.assertEqual(expected_commands, self.cmds)
 
+    def test_scan_scsi_host(self):
+        self.linuxscsi.scan_scsi_host(4, lun=2)
+        expected_commands = ['tee -a /sys/class/scsi_host/host4/scan']
+        self.assertEqual(expected_commands, self.cmds)
+
+    def test_wait_for_path(self):
+        self.stubs.Set(os.path, 'exists', lambda x: True)
+        self.assertTrue(self.linuxscsi.wait_for_path('/dev/disk/by-path/x'))
+        self.assertEqual([], self.cmds)
+
+        self.stubs.Set(os.path, 'exists', lambda x: False)
+        self.assertFalse(self.linuxscsi.wait_for_path('/dev/disk/by-path/x',
+                                                      timeout=3))
+        expected_commands = ['udevadm settle --timeout=3 '
+                             '--exit-if-exists=/dev/disk/by-path/x']
+        self.assertEqual(expected_commands, self.cmds)
+
+    def test_wait_for_paths(self):
+        paths = ['/dev/disk/by-path/x', '/dev/disk/by-path/y']
+        exists = {'/dev/disk/by-path/y': [False, True]}
+        self.stubs.Set(os.path, 'exists',
+                       lambda x: x in exists and exists[x].pop(0))
+        self.assertTrue(self.linuxscsi.wait_for_paths(paths, timeout=3))
+        # udev is not told to exit on the first path only
+        self.assertEqual(['udevadm settle --timeout=3'], self.cmds)
+
+    def test_get_by_path_devices(self):
+        entries = ['pci-0000:05:00.2-fc-0x1234567890123456-lun-1',
+                   'pci-0000:05:00.2-fc-0x1234567890123456-lun-1-part1',
+                   'pci-0000:05:00.2-fc-0x1234567890123456-lun-11',
+                   'ip-10.0.2.15:3260-iscsi-iqn.2010-10.org.openstack:'
+                   'volume-00000001-lun-2']
+        self.stubs.Set(os, 'listdir', lambda x: entries)
+        self.stubs.Set(os.path, 'realpath', lambda x: x.replace('by-path',
+                                                                'real'))
+        devices = self.linuxscsi.get_by_path_devices(1)
+        self.assertEqual({'/dev/disk/by-path/%s' % entries[0]:
+                          '/dev/disk/real/%s' % entries[0]}, devices)
+        self.assertEqual(3, len(self.linuxscsi.get_by_path_devices()))
+
     def test_get_name_from_path(self):
         device_name = "/dev/sdc"
         self.stubs.Set(os.path, 'realpath', lambda x: device_name)
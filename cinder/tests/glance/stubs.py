@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import urllib
+
 import glanceclient.exc
 
 
@@ -29,6 +31,7 @@ class StubGlanceClient(object):
         self.images = lambda: None
         for fn in ('list', 'get', 'data', 'create', 'update', 'delete'):
             setattr(self.images, fn, getattr(self, fn))
+        self.http_client = self
 
     #TODO(bcwaldon): implement filters
     def list(self, filters=None, marker=None, limit=30):
@@ -54,6 +57,10 @@ class StubGlanceClient(object):
         self.get(image_id)
         return []
 
+    def raw_request(self, method, url, headers=None):
+        image_id = urllib.unquote(url.split('/')[3])
+        return FakeResponse(200), self.data(image_id)
+
     def create(self, **metadata):
         metadata['created_at'] = NOW_GLANCE_FORMAT
         metadata['updated_at'] = NOW_GLANCE_FORMAT
@@ -86,6 +93,15 @@ class StubGlanceClient(object):
         raise glanceclient.exc.NotFound(image_id)
 
 
+class FakeResponse(object):
+    def __init__(self, status, headers=None):
+        self.status = status
+        self.headers = headers or {}
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+
 class FakeImage(object):
     def __init__(self, metadata):
         IMAGE_ATTRIBUTES = ['size', 'disk_format', 'owner',
@@ -15,6 +15,9 @@
 
 
 import datetime
+import hashlib
+import re
+import socket
 
 import glanceclient.exc
 import glanceclient.v2.client
@@ -26,6 +29,7 @@ from cinder import exception
 from cinder.image import glance
 from cinder import test
 from cinder.tests.glance import stubs as glance_stubs
+from cinder import units
 
 
 CONF = cfg.CONF
@@ -38,6 +42,59 @@ class NullWriter(object):
         pass
 
 
+class BufferWriter(object):
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+
+class RangeGlanceStubClient(glance_stubs.StubGlanceClient):
+    """A client serving image data, which can fail part way through."""
+
+    def __init__(self, image_data, checksum=None, honour_range=True,
+                 fail_after=None):
+        super(RangeGlanceStubClient, self).__init__()
+        self.image = self.create(
+            name='image', size=len(image_data),
+            checksum=checksum or hashlib.md5(image_data).hexdigest())
+        self.image_data = image_data
+        self.honour_range = honour_range
+        self.fail_after = fail_after
+        self.ranges = []
+
+    def _chunks(self, data):
+        for i in xrange(0, len(data), 1000):
+            if self.fail_after is not None and i >= self.fail_after:
+                self.fail_after = None
+                raise socket.error('connection reset')
+            yield data[i:i + 1000]
+
+    def data(self, image_id):
+        self.get(image_id)
+        return self._chunks(self.image_data)
+
+    def raw_request(self, method, url, headers=None):
+        start, end = re.match(r'bytes=(\d+)-(\d*)',
+                              headers['Range']).groups()
+        self.ranges.append((int(start), end and int(end)))
+        size = len(self.image_data)
+        headers = {'x-image-meta-checksum': self.image.checksum}
+        if not self.honour_range:
+            headers['content-length'] = str(size)
+            return (glance_stubs.FakeResponse(200, headers),
+                    self._chunks(self.image_data))
+        end = int(end) + 1 if end else size
+        headers['content-range'] = 'bytes %s-%d/%d' % (start, end - 1, size)
+        return (glance_stubs.FakeResponse(206, headers),
+                self._chunks(self.image_data[int(start):end]))
+
+
 class TestGlanceSerializer(test.TestCase):
     def test_serialize(self):
         metadata = {'name': 'image1',
@@ -520,6 +577,69 @@ class TestGlanceImageService(test.TestCase):
         self.assertRaises(exception.ImageNotFound, service.download,
                           self.context, image_id, writer)
 
+    def test_download_resumes(self):
+        image_data = 'x' * 2500 + 'y' * 2500
+        client = RangeGlanceStubClient(image_data, fail_after=3000)
+        service = self._create_image_service(client)
+        writer = BufferWriter()
+        self.flags(glance_num_retries=1)
+        service.download(self.context, client.image.id, writer)
+        self.assertEqual(image_data, writer.getvalue())
+        self.assertEqual([(0, ''), (3000, '')], client.ranges)
+
+    def test_download_does_not_get_image(self):
+        def _fake_get(image_id):
+            self.fail('image looked up for download')
+
+        image_data = 'x' * 5000
+        client = RangeGlanceStubClient(image_data)
+        client.images.get = _fake_get
+        service = self._create_image_service(client)
+        writer = BufferWriter()
+        service.download(self.context, client.image.id, writer)
+        self.assertEqual(image_data, writer.getvalue())
+
+    def test_download_resumes_without_range_support(self):
+        image_data = 'x' * 2500 + 'y' * 2500
+        client = RangeGlanceStubClient(image_data, honour_range=False,
+                                       fail_after=2000)
+        service = self._create_image_service(client)
+        writer = BufferWriter()
+        self.flags(glance_num_retries=1)
+        service.download(self.context, client.image.id, writer)
+        self.assertEqual(image_data, writer.getvalue())
+
+    def test_download_gives_up_after_retries(self):
+        client = RangeGlanceStubClient('x' * 5000, fail_after=3000)
+        service = self._create_image_service(client)
+        self.flags(glance_num_retries=0)
+        self.assertRaises(exception.GlanceConnectionFailed,
+                          service.download, self.context, client.image.id,
+                          NullWriter())
+
+    def test_download_bad_checksum(self):
+        client = RangeGlanceStubClient('x' * 5000, checksum='bad')
+        service = self._create_image_service(client)
+        self.assertRaises(exception.ImageUnacceptable, service.download,
+                          self.context, client.image.id, NullWriter())
+
+    def test_download_ranges(self):
+        image_data = ''.join(chr(i % 256) for i in xrange(5 * units.MiB / 2))
+        client = RangeGlanceStubClient(image_data, fail_after=500000)
+        service = self._create_image_service(client)
+        writer = BufferWriter()
+        self.flags(glance_download_parallelism=2,
+                   glance_download_range_size=1,
+                   glance_num_retries=1)
+        service.download(self.context, client.image.id, writer)
+        self.assertEqual(image_data, writer.getvalue())
+        # The first range is resumed where it failed
+        self.assertEqual([(0, units.MiB - 1),
+                          (500000, units.MiB - 1),
+                          (units.MiB, 2 * units.MiB - 1),
+                          (2 * units.MiB, len(image_data) - 1)],
+                         sorted(client.ranges))
+
     def test_glance_client_image_id(self):
         fixture = self._make_fixture(name='test image')
         image_id = self.service.create(self.context, fixture)['id']
@@ -653,6 +773,12 @@ class TestGlanceImageServiceClient(test.TestCase):
                                               False)
         self.assertIsInstance(client, MyGlanceStubClient)
 
+    def test_slice_chunks(self):
+        chunks = ['abc', 'def', 'ghi']
+        self.assertEqual('cdefg',
+                         ''.join(glance._slice_chunks(chunks, 2, 5)))
+        self.assertEqual('efghi', ''.join(glance._slice_chunks(chunks, 4)))
+
     def tearDown(self):
         self.stubs.UnsetAll()
         super(TestGlanceImageServiceClient, self).tearDown()
@@ -117,6 +117,44 @@ class HostManagerTestCase(test.TestCase):
                     'host3': host3_volume_capabs}
         self.assertDictMatch(service_states, expected)
 
+    @mock.patch('cinder.openstack.common.timeutils.utcnow')
+    def test_update_service_capabilities_delta(self, _mock_utcnow):
+        _mock_utcnow.side_effect = [31337, 31338, 31339]
+        service_states = self.host_manager.service_states
+
+        self.assertTrue(self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=4321, QoS_support=True),
+            generation='gen1', capabilities_version=1))
+        self.assertTrue(self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=1234),
+            generation='gen1', capabilities_version=2, base_version=1,
+            removed=['QoS_support']))
+        self.assertEqual(dict(free_capacity_gb=1234, timestamp=31338),
+                         service_states['host1'])
+
+        # A heartbeat only refreshes the timestamp
+        self.assertTrue(self.host_manager.update_service_capabilities(
+            'volume', 'host1', {}, generation='gen1', capabilities_version=2,
+            base_version=2))
+        self.assertEqual(dict(free_capacity_gb=1234, timestamp=31339),
+                         service_states['host1'])
+
+    def test_update_service_capabilities_unknown_delta(self):
+        self.assertFalse(self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=1234),
+            generation='gen1', capabilities_version=2, base_version=1))
+
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=4321),
+            generation='gen1', capabilities_version=1)
+        # The service restarted
+        self.assertFalse(self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=1234),
+            generation='gen2', capabilities_version=2, base_version=1))
+        self.assertEqual(4321,
+                         self.host_manager.service_states['host1']
+                         ['free_capacity_gb'])
+
     @mock.patch('cinder.db.service_get_all_by_topic')
     @mock.patch('cinder.utils.service_is_up')
     def test_get_all_host_states(self, _mock_service_is_up,
@@ -71,7 +71,12 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  _mock_method=_mock_rpc_method,
                                  service_name='fake_name',
                                  host='fake_host',
-                                 capabilities='fake_capabilities')
+                                 capabilities='fake_capabilities',
+                                 generation='fake_generation',
+                                 capabilities_version=2,
+                                 base_version=1,
+                                 removed=['fake_capability'],
+                                 version='1.5')
 
     @mock.patch('cinder.openstack.common.rpc.cast')
     def test_create_volume(self, _mock_rpc_method):
@@ -66,7 +66,9 @@ class SchedulerManagerTestCase(test.TestCase):
         self.manager.update_service_capabilities(self.context,
                                                  service_name=service,
                                                  host=host)
-        _mock_update_cap.assert_called_once_with(service, host, {})
+        _mock_update_cap.assert_called_once_with(
+            service, host, {}, generation=None, capabilities_version=None,
+            base_version=None, removed=None)
 
     @mock.patch('cinder.scheduler.driver.Scheduler.'
                 'update_service_capabilities')
@@ -80,7 +82,26 @@ class SchedulerManagerTestCase(test.TestCase):
                                                  service_name=service,
                                                  host=host,
                                                  capabilities=capabilities)
-        _mock_update_cap.assert_called_once_with(service, host, capabilities)
+        _mock_update_cap.assert_called_once_with(
+            service, host, capabilities, generation=None,
+            capabilities_version=None, base_version=None, removed=None)
+
+    @mock.patch('cinder.volume.rpcapi.VolumeAPI.'
+                'publish_service_capabilities')
+    @mock.patch('cinder.scheduler.driver.Scheduler.'
+                'update_service_capabilities')
+    def test_update_service_capabilities_unknown_delta(self, _mock_update_cap,
+                                                       _mock_publish):
+        # A delta which can't be applied makes the host send a snapshot
+        _mock_update_cap.return_value = False
+        self.manager.update_service_capabilities(self.context,
+                                                 service_name='volume',
+                                                 host='fake_host',
+                                                 capabilities={'a': 1},
+                                                 generation='gen',
+                                                 capabilities_version=3,
+                                                 base_version=2)
+        _mock_publish.assert_called_once_with(self.context, host='fake_host')
 
     @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volume')
     @mock.patch('cinder.db.volume_update')
@@ -14,7 +14,7 @@
 #    under the License.
 """ Tests for Ceph backup service."""
 
-import fcntl
+import contextlib
 import hashlib
 import os
 import subprocess
@@ -62,31 +62,6 @@ class BackupCephTestCase(test.TestCase):
                                               'user_foo', 'conf_foo')
         return rbddriver.RBDImageIOWrapper(rbd_meta)
 
-    def _setup_mock_popen(self, inst, retval=None, p1hook=None, p2hook=None):
-        class stdout(object):
-            def close(self):
-                inst.called.append('stdout_close')
-
-        class FakePopen(object):
-
-            PASS = 0
-
-            def __init__(self, cmd, *args, **kwargs):
-                inst.called.append('popen_init')
-                self.stdout = stdout()
-                self.returncode = 0
-                self.__class__.PASS += 1
-                if self.__class__.PASS == 1 and p1hook:
-                    p1hook()
-                elif self.__class__.PASS == 2 and p2hook:
-                    p2hook()
-
-            def communicate(self):
-                inst.called.append('communicate')
-                return retval
-
-        self.stubs.Set(subprocess, 'Popen', FakePopen)
-
     def setUp(self):
         super(BackupCephTestCase, self).setUp()
         self.ctxt = context.get_admin_context()
@@ -97,6 +72,7 @@ class BackupCephTestCase(test.TestCase):
         # Setup librbd stubs
         self.stubs.Set(ceph, 'rados', mock_rados)
         self.stubs.Set(ceph, 'rbd', mock_rbd)
+        self.stubs.Set(rbddriver, '_rados_pool', None)
 
         self._create_backup_db_entry(self.backup_id, self.volume_id, 1)
 
@@ -116,9 +92,7 @@ class BackupCephTestCase(test.TestCase):
         self.volume_file.seek(0)
 
         # Always trigger an exception if a command is executed since it should
-        # always be dealt with gracefully. At time of writing on rbd
-        # export/import-diff is executed and if they fail we expect to find
-        # alternative means of backing up.
+        # always be dealt with gracefully.
         fake_exec = self.fake_execute_w_exception
         self.service = ceph.CephBackupDriver(self.ctxt, execute=fake_exec)
 
@@ -360,36 +334,40 @@ class BackupCephTestCase(test.TestCase):
 
         self.stubs.Set(self.service, '_try_delete_base_image',
                        lambda *args, **kwargs: None)
-
-        self.stubs.Set(fcntl, 'fcntl', lambda *args, **kwargs: 0)
+        self.service.diff_chunk_size = self.chunk_size
 
         with tempfile.NamedTemporaryFile() as test_file:
             checksum = hashlib.sha256()
 
-            def write_data():
-                self.volume_file.seek(0)
-                data = self.volume_file.read(self.length)
+            def diff_iterate(inst, offset, length, from_snap, iter_cb):
+                self.called.append('diff_iterate')
+                iter_cb(offset, length, True)
+
+            def read_data(inst, offset, length):
+                self.called.append('read')
+                self.volume_file.seek(offset)
+                return self.volume_file.read(length)
+
+            def write_data(inst, data, offset):
                 self.called.append('write')
                 checksum.update(data)
+                test_file.seek(offset)
                 test_file.write(data)
 
-            def read_data():
-                self.called.append('read')
-                return self.volume_file.read(self.length)
+            def create_snap(inst, name):
+                self.called.append('create_snap')
 
             def rbd_list(inst, ioctx):
                 self.called.append('list')
                 return [backup_name]
 
-            self._setup_mock_popen(self, ['out', 'err'],
-                                   p1hook=read_data,
-                                   p2hook=write_data)
-
+            self.stubs.Set(self.service.rbd.Image, 'diff_iterate',
+                           diff_iterate)
+            self.stubs.Set(self.service.rbd.Image, 'read', read_data)
+            self.stubs.Set(self.service.rbd.Image, 'write', write_data)
+            self.stubs.Set(self.service.rbd.Image, 'create_snap', create_snap)
             self.stubs.Set(self.service.rbd.RBD, 'list', rbd_list)
 
-            self.stubs.Set(self.service, '_discard_bytes',
-                           lambda *args: None)
-
             meta = rbddriver.RBDImageMetadata(self.service.rbd.Image(),
                                               'pool_foo', 'user_foo',
                                               'conf_foo')
@@ -397,13 +375,162 @@ class BackupCephTestCase(test.TestCase):
 
             self.service.backup(backup, rbd_io)
 
-            self.assertEqual(self.called, ['list', 'popen_init', 'read',
-                                           'popen_init', 'write',
-                                           'stdout_close', 'communicate'])
+            self.assertEqual(self.called,
+                             ['list', 'create_snap', 'diff_iterate'] +
+                             ['read', 'write'] * self.num_chunks +
+                             ['create_snap'])
 
             # Ensure the files are equal
             self.assertEqual(checksum.digest(), self.checksum.digest())
 
+            backup = db.backup_get(self.ctxt, self.backup_id)
+            self.assertEqual(backup['object_count'], 1)
+
+    def test_rbd_diff_transfer_not_supported(self):
+        def open_rbd_image(*args, **kwargs):
+            yield object()
+
+        self.stubs.Set(self.service, '_open_rbd_image',
+                       contextlib.contextmanager(open_rbd_image))
+        self.assertRaises(exception.BackupRBDOperationFailed,
+                          self.service._rbd_diff_transfer,
+                          'src', 'src_pool', 'dest', 'dest_pool',
+                          'src_user', 'src_conf', 'dest_user', 'dest_conf')
+
+    def test_rbd_diff_transfer_missing_from_snap(self):
+        def list_snaps(inst):
+            return [{'name': 'snap1'}]
+
+        self.stubs.Set(self.service.rbd.Image, 'list_snaps', list_snaps)
+        self.assertRaises(exception.BackupRBDOperationFailed,
+                          self.service._rbd_diff_transfer,
+                          'src', 'src_pool', 'dest', 'dest_pool',
+                          'src_user', 'src_conf', 'dest_user', 'dest_conf',
+                          src_snap='snap3', from_snap='snap2')
+
+    def test_transfer_extents_discard(self):
+        def discard(inst, offset, length):
+            self.called.append(('discard', offset, length))
+
+        self.stubs.Set(self.service.rbd.Image, 'discard', discard)
+        image = self.service.rbd.Image()
+        self.service._transfer_extents(image, image, [(0, 1024, False)])
+        self.assertEqual(self.called, [('discard', 0, 1024)])
+
+    def test_transfer_extents_resume(self):
+        self.service.diff_chunk_size = self.chunk_size
+        written = []
+
+        def read_data(inst, offset, length):
+            return 'x' * length
+
+        def write_data(inst, data, offset):
+            if len(self.called) == 1:
+                self.called.append('fail')
+                raise self.service.rbd.Error()
+
+            self.called.append('write')
+            written.append(offset)
+
+        self.stubs.Set(self.service.rbd.Image, 'read', read_data)
+        self.stubs.Set(self.service.rbd.Image, 'write', write_data)
+        image = self.service.rbd.Image()
+        extents = [(0, self.chunk_size, True),
+                   (self.chunk_size, self.chunk_size * 2, True)]
+
+        self.service._transfer_extents(image, image, extents)
+        # The second extent fails part way through and is resumed from its
+        # start.
+        self.assertEqual(self.called, ['write', 'fail', 'write', 'write'])
+        self.assertEqual(written,
+                         [0, self.chunk_size, self.chunk_size * 2])
+
+        self.called = []
+        self.flags(backup_ceph_diff_retries=0)
+        self.assertRaises(exception.BackupRBDOperationFailed,
+                          self.service._transfer_extents, image, image,
+                          extents)
+
+    def test_transfer_extents_aio(self):
+        self.service.diff_chunk_size = self.chunk_size
+        self.flags(backup_ceph_diff_max_inflight=2)
+        inflight = []
+
+        class FakeCompletion(object):
+            def __init__(comp, offset):
+                comp.offset = offset
+                inflight.append(comp)
+
+            def wait_for_complete_and_cb(comp):
+                inflight.remove(comp)
+
+            def get_return_value(comp):
+                return 0
+
+        test = self
+
+        class AioImage(self.service.rbd.Image):
+            def read(inst, offset, length):
+                return 'x' * length
+
+            def aio_write(inst, data, offset, oncomplete):
+                test.assertTrue(len(inflight) < 2)
+                test.called.append(offset)
+                return FakeCompletion(offset)
+
+        image = AioImage()
+        self.service._transfer_extents(image, image,
+                                       [(0, self.chunk_size * 4, True)])
+        self.assertEqual(self.called, [0, self.chunk_size,
+                                       self.chunk_size * 2,
+                                       self.chunk_size * 3])
+        self.assertEqual(inflight, [])
+
+    def test_transfer_extents_aio_drained_on_failure(self):
+        self.service.diff_chunk_size = self.chunk_size
+        self.flags(backup_ceph_diff_max_inflight=4,
+                   backup_ceph_diff_retries=0)
+        inflight = []
+
+        class FakeCompletion(object):
+            def __init__(comp):
+                inflight.append(comp)
+
+            def wait_for_complete_and_cb(comp):
+                inflight.remove(comp)
+
+            def get_return_value(comp):
+                return 0
+
+        test = self
+
+        class AioImage(self.service.rbd.Image):
+            def read(inst, offset, length):
+                if offset >= test.chunk_size * 2:
+                    raise test.service.rbd.Error()
+                return 'x' * length
+
+            def aio_write(inst, data, offset, oncomplete):
+                return FakeCompletion()
+
+        image = AioImage()
+        self.assertRaises(exception.BackupRBDOperationFailed,
+                          self.service._transfer_extents, image, image,
+                          [(0, self.chunk_size * 4, True)])
+        # Writes queued before the failed read are waited for rather than
+        # abandoned.
+        self.assertEqual(inflight, [])
+
+    def test_throttle(self):
+        sleeps = []
+        self.stubs.Set(eventlet, 'sleep', lambda secs: sleeps.append(secs))
+
+        self.service._throttle(time.time(), units.MiB)
+        self.flags(backup_ceph_diff_rate_limit=units.MiB)
+        # time.time() is stubbed to increase by one on each call
+        self.service._throttle(time.time(), units.MiB * 4)
+        self.assertEqual(sleeps, [0, 3])
+
     def test_backup_vol_length_0(self):
         self._set_common_backup_stubs(self.service)
 
@@ -654,13 +781,6 @@ class BackupCephTestCase(test.TestCase):
         self.assertEqual(resp, not_allowed)
         self._set_service_stub('_file_is_rbd', True)
 
-    def test_piped_execute(self):
-        self.stubs.Set(fcntl, 'fcntl', lambda *args, **kwargs: 0)
-        self._setup_mock_popen(self, ['out', 'err'])
-        self.service._piped_execute(['foo'], ['bar'])
-        self.assertEqual(self.called, ['popen_init', 'popen_init',
-                                       'stdout_close', 'communicate'])
-
     def tearDown(self):
         self.volume_file.close()
         self.stubs.UnsetAll()
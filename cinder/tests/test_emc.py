@@ -18,8 +18,10 @@
 import os
 import shutil
 import tempfile
+import time
 from xml.dom.minidom import Document
 
+import mock
 import mox
 
 from cinder import exception
@@ -605,6 +607,7 @@ class EMCSMISISCSIDriverTestCase(test.TestCase):
 
         configuration = mox.MockObject(conf.Configuration)
         configuration.cinder_emc_config_file = self.config_file_path
+        configuration.emc_cim_cache_ttl = 300
         configuration.append_config_values(mox.IgnoreArg())
 
         self.stubs.Set(EMCSMISISCSIDriver, '_do_iscsi_discovery',
@@ -755,6 +758,63 @@ class EMCSMISISCSIDriverTestCase(test.TestCase):
                           self.driver.delete_volume,
                           failed_delete_vol)
 
+    def test_find_pool_cached(self):
+        common = self.driver.common
+        common.conn = mock.Mock(wraps=FakeEcomConnection())
+        common._find_pool(storage_type)
+        common._find_pool(storage_type)
+        self.assertEqual(2, common.conn.EnumerateInstanceNames.call_count)
+        self.assertEqual(common._get_config_dom(self.config_file_path),
+                         common._get_config_dom(self.config_file_path))
+
+    def test_find_lun_refreshes_cache(self):
+        common = self.driver.common
+        common.conn = mock.Mock(wraps=FakeEcomConnection())
+        # The volume was created after the names were cached
+        common._cim_cache['EMC_StorageVolume'] = (time.time(), [])
+        vol_instance = common._find_lun(test_volume)
+        self.assertEqual(test_volume['name'], vol_instance['ElementName'])
+        common.conn.EnumerateInstanceNames.assert_called_once_with(
+            'EMC_StorageVolume')
+
+        # Our own deletes drop the cached names
+        self.assertIn('EMC_StorageVolume', common._cim_cache)
+        common._invalidate_cim_cache('EMC_StorageVolume')
+        self.assertNotIn('EMC_StorageVolume', common._cim_cache)
+
+    def test_find_storage_sync_not_cached(self):
+        common = self.driver.common
+        common.conn = mock.Mock(wraps=FakeEcomConnection())
+        common._find_storage_sync_sv_sv(test_snapshot['name'],
+                                        test_snapshot['volume_name'], False)
+        common._find_storage_sync_sv_sv(test_snapshot['name'],
+                                        test_snapshot['volume_name'], False)
+        self.assertEqual(2, common.conn.EnumerateInstanceNames.call_count)
+        self.assertNotIn('SE_StorageSynchronized_SV_SV', common._cim_cache)
+
+    def test_find_device_masking_group_no_view(self):
+        common = self.driver.common
+        common.conn = mock.Mock()
+        common.conn.EnumerateInstanceNames.return_value = ['view']
+        common.conn.GetInstance.return_value = {'ElementName': 'other-view'}
+        self.stubs.Set(common, '_get_masking_view', lambda: 'no-such-view')
+        self.assertRaises(exception.VolumeBackendAPIException,
+                          common._find_device_masking_group)
+
+    def test_wait_for_job_complete_backoff(self):
+        common = self.driver.common
+        states = [4L, 4L, 4L, 7L]
+        common.conn = mock.Mock()
+        common.conn.GetInstance.side_effect = lambda *args, **kwargs: {
+            'JobState': states.pop(0), 'ErrorCode': 0L,
+            'ErrorDescription': ''}
+        sleep = mock.Mock()
+        self.stubs.Set(time, 'sleep', sleep)
+        self.assertEqual((0L, ''),
+                         common._wait_for_job_complete({'Job': 'job'}))
+        self.assertEqual([mock.call(1), mock.call(2), mock.call(4)],
+                         sleep.call_args_list)
+
     def _cleanup(self):
         bExists = os.path.exists(self.config_file_path)
         if bExists:
@@ -509,6 +509,7 @@ class HVSRESTiSCSIDriverTestCase(test.TestCase):
         self.configuration.append_config_values(mox.IgnoreArg())
 
         self.stubs.Set(time, 'sleep', Fake_sleep)
+        self.flags(array_job_poll_interval=0)
 
         self.driver = FakeHVSiSCSIStorage(configuration=self.configuration)
         self.driver.do_setup({})
@@ -703,6 +704,7 @@ class HVSRESTFCDriverTestCase(test.TestCase):
         self.configuration.append_config_values(mox.IgnoreArg())
 
         self.stubs.Set(time, 'sleep', Fake_sleep)
+        self.flags(array_job_poll_interval=0)
 
         self.driver = FakeHVSFCStorage(configuration=self.configuration)
         self.driver.do_setup({})
@@ -1036,6 +1036,7 @@ class HuaweiTISCSIDriverTestCase(test.TestCase):
         self.configuration.append_config_values(mox.IgnoreArg())
 
         self.stubs.Set(time, 'sleep', Fake_sleep)
+        self.flags(array_job_poll_interval=0)
         self.stubs.Set(utils, 'SSHPool', FakeSSHPool)
         self.stubs.Set(ssh_common.TseriesCommon, '_change_file_mode',
                        Fake_change_file_mode)
@@ -1432,6 +1433,7 @@ class HuaweiTFCDriverTestCase(test.TestCase):
         self.configuration.append_config_values(mox.IgnoreArg())
 
         self.stubs.Set(time, 'sleep', Fake_sleep)
+        self.flags(array_job_poll_interval=0)
         self.stubs.Set(utils, 'SSHPool', FakeSSHPool)
         self.stubs.Set(ssh_common.TseriesCommon, '_change_file_mode',
                        Fake_change_file_mode)
@@ -1667,6 +1669,7 @@ class SSHMethodTestCase(test.TestCase):
         self.configuration.append_config_values(mox.IgnoreArg())
 
         self.stubs.Set(time, 'sleep', Fake_sleep)
+        self.flags(array_job_poll_interval=0)
         self.stubs.Set(utils, 'SSHPool', FakeSSHPool)
         self.stubs.Set(ssh_common.TseriesCommon, '_change_file_mode',
                        Fake_change_file_mode)
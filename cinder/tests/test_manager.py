@@ -0,0 +1,75 @@
+
+#    Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from cinder import context
+from cinder import manager
+from cinder import test
+
+
+class SchedulerDependentManagerTestCase(test.TestCase):
+
+    def setUp(self):
+        super(SchedulerDependentManagerTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.manager = manager.SchedulerDependentManager(
+            host='fake_host', service_name='volume')
+        self.manager._capabilities_generation = 'gen'
+        self.update = mock.Mock()
+        self.stubs.Set(self.manager.scheduler_rpcapi,
+                       'update_service_capabilities', self.update)
+
+    def _publish(self, capabilities):
+        self.manager.update_service_capabilities(capabilities)
+        self.manager._publish_service_capabilities(self.context)
+
+    def test_publish_nothing(self):
+        self.manager._publish_service_capabilities(self.context)
+        self.assertFalse(self.update.called)
+
+    def test_publish_deltas(self):
+        pools = [{'name': 'pool1', 'free_capacity_gb': 10}]
+        self._publish({'free_capacity_gb': 10, 'QoS_support': True,
+                       'pools': pools})
+        self.update.assert_called_with(
+            self.context, 'volume', 'fake_host',
+            {'free_capacity_gb': 10, 'QoS_support': True, 'pools': pools},
+            generation='gen', capabilities_version=1, base_version=None,
+            removed=None)
+
+        # Changes made in place are noticed too
+        pools[0]['free_capacity_gb'] = 5
+        self._publish({'free_capacity_gb': 10, 'pools': pools})
+        self.update.assert_called_with(
+            self.context, 'volume', 'fake_host', {'pools': pools},
+            generation='gen', capabilities_version=2, base_version=1,
+            removed=['QoS_support'])
+
+        # Nothing changed, send a heartbeat
+        self._publish({'free_capacity_gb': 10, 'pools': pools})
+        self.update.assert_called_with(
+            self.context, 'volume', 'fake_host', {},
+            generation='gen', capabilities_version=2, base_version=2,
+            removed=[])
+
+    def test_publish_snapshot_after_reset(self):
+        self._publish({'free_capacity_gb': 10})
+        self.manager.reset_published_capabilities()
+        self._publish({'free_capacity_gb': 10})
+        self.update.assert_called_with(
+            self.context, 'volume', 'fake_host', {'free_capacity_gb': 10},
+            generation='gen', capabilities_version=2, base_version=None,
+            removed=None)
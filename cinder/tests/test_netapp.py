@@ -21,13 +21,17 @@ Tests for NetApp volume driver
 import BaseHTTPServer
 import httplib
 from lxml import etree
+import mock
+import socket
 import StringIO
 
 from cinder import exception
 from cinder.openstack.common import log as logging
 from cinder import test
 from cinder.volume import configuration as conf
+from cinder.volume.drivers.netapp import api as netapp_api
 from cinder.volume.drivers.netapp import common
+from cinder.volume.drivers.netapp import iscsi
 from cinder.volume.drivers.netapp.options import netapp_7mode_opts
 from cinder.volume.drivers.netapp.options import netapp_basicauth_opts
 from cinder.volume.drivers.netapp.options import netapp_cluster_opts
@@ -470,6 +474,9 @@ class FakeDirectCmodeHTTPConnection(object):
     def set_debuglevel(self, level):
         pass
 
+    def close(self):
+        pass
+
     def getresponse(self):
         self.http_response.begin()
         return self.http_response
@@ -636,6 +643,67 @@ class NetAppDirectCmodeISCSIDriverTestCase(test.TestCase):
         self.driver.delete_snapshot(self.snapshot)
         self.driver.delete_volume(self.volume)
 
+    def test_lun_table_miss(self):
+        # Only the missing lun is looked up, not the whole lun list
+        self.stubs.Set(self.driver, '_get_lun_list', mock.Mock())
+        lun = self.driver._get_lun_from_table('lun1')
+        self.assertEqual('/vol/navneet/lun1', lun.metadata['Path'])
+        self.assertFalse(self.driver._get_lun_list.called)
+
+    def test_map_unmap_uses_cache(self):
+        self.driver.create_volume(self.volume)
+        self.driver.initialize_connection(self.volume, self.connector)
+        path = self.driver.lun_table['lun1'].metadata['Path']
+        self.assertIn(self.connector['initiator'], self.driver.igroup_table)
+        self.assertEqual(1, len(self.driver.lun_map_table[path]))
+
+        get_igroups = mock.Mock()
+        find_mapped = mock.Mock()
+        self.stubs.Set(self.driver, '_get_igroup_by_initiator', get_igroups)
+        self.stubs.Set(self.driver, '_find_mapped_lun_igroup', find_mapped)
+        self.driver.initialize_connection(self.volume, self.connector)
+        self.driver.terminate_connection(self.volume, self.connector)
+        self.assertFalse(get_igroups.called)
+        self.assertFalse(find_mapped.called)
+        self.assertEqual([], self.driver.lun_map_table[path])
+
+    def test_reconcile_lun_table(self):
+        self.driver.check_for_setup_error()
+        self.driver.igroup_table['iqn'] = []
+        self.driver._add_lun_to_table(
+            iscsi.NetAppLun('openstack:/vol/v/gone', 'gone', '1024',
+                            {'Path': '/vol/v/gone'}))
+        self.driver._refresh_lun_table(synchronous=True)
+        # Not due yet
+        self.assertIn('gone', self.driver.lun_table)
+
+        self.driver.lun_refresh_interval = -1
+        self.driver._refresh_lun_table(synchronous=True)
+        self.assertNotIn('gone', self.driver.lun_table)
+        self.assertIn('lun1', self.driver.lun_table)
+        self.assertEqual({}, self.driver.igroup_table)
+        self.assertFalse(self.driver.lun_refresh_running)
+
+    def test_reconcile_lun_table_concurrent_changes(self):
+        self.driver.check_for_setup_error()
+        new_lun = iscsi.NetAppLun('openstack:/vol/v/new', 'new', '1024',
+                                  {'Path': '/vol/v/new'})
+        get_lun_list = self.driver._get_lun_list
+
+        def scan(table=None):
+            self.assertIsNot(table, self.driver.lun_table)
+            names = get_lun_list(table=table)
+            # lun1 is deleted and another lun created during the scan
+            self.driver._remove_lun_from_table('lun1')
+            self.driver._add_lun_to_table(new_lun)
+            return names
+
+        self.stubs.Set(self.driver, '_get_lun_list', scan)
+        self.driver.lun_refresh_interval = -1
+        self.driver._refresh_lun_table(synchronous=True)
+        self.assertNotIn('lun1', self.driver.lun_table)
+        self.assertIs(new_lun, self.driver.lun_table['new'])
+
 
 class NetAppDriverNegativeTestCase(test.TestCase):
     """Test case for NetAppDriver"""
@@ -1086,6 +1154,9 @@ class FakeDirect7modeHTTPConnection(object):
     def set_debuglevel(self, level):
         pass
 
+    def close(self):
+        pass
+
     def getresponse(self):
         self.http_response.begin()
         return self.http_response
@@ -1141,6 +1212,14 @@ class NetAppDirect7modeISCSIDriverTestCase_NV(
         if not success:
             raise AssertionError('Failed creating on selected volumes')
 
+    def test_lun_table_miss(self):
+        # 7-mode cannot look a lun up by name, the luns are listed again
+        get_lun_list = mock.Mock(wraps=self.driver._get_lun_list)
+        self.stubs.Set(self.driver, '_get_lun_list', get_lun_list)
+        lun = self.driver._get_lun_from_table('lun1')
+        self.assertEqual('/vol/vol1/lun1', lun.metadata['Path'])
+        self.assertTrue(get_lun_list.called)
+
     def test_check_for_setup_error_version(self):
         drv = self.driver
         delattr(drv.client, '_api_version')
@@ -1184,3 +1263,116 @@ class NetAppDirect7modeISCSIDriverTestCase_WV(
         configuration.netapp_server_port = '80'
         configuration.netapp_vfiler = 'openstack'
         return configuration
+
+
+class FakeKeepAliveHTTPConnection(object):
+    """A fake httplib.HTTPConnection that records requests and replies."""
+
+    created = []
+
+    def __init__(self, host, timeout=None):
+        self.host = host
+        self.sock = None
+        self.requests = []
+        self.fail_next = False
+        self.fail_response = None
+        FakeKeepAliveHTTPConnection.created.append(self)
+
+    def request(self, method, path, data=None, headers=None):
+        if self.fail_next:
+            self.fail_next = False
+            raise httplib.BadStatusLine('')
+        self.sock = True
+        self.requests.append((method, path, data, headers))
+
+    def getresponse(self):
+        if self.fail_response:
+            exc, self.fail_response = self.fail_response, None
+            raise exc
+        body = (RESPONSE_PREFIX_DIRECT_CMODE + RESPONSE_PREFIX_DIRECT +
+                '<results status="passed"><num-records>1</num-records>'
+                '</results>' + RESPONSE_SUFFIX_DIRECT)
+        response = httplib.HTTPResponse(FakeHttplibSocket(
+            'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s' %
+            (len(body), body)))
+        response.begin()
+        return response
+
+    def close(self):
+        self.sock = None
+
+
+class NetAppApiServerTestCase(test.TestCase):
+    """Test case for the NaServer transport."""
+
+    def setUp(self):
+        super(NetAppApiServerTestCase, self).setUp()
+        FakeKeepAliveHTTPConnection.created = []
+        self.stubs.Set(httplib, 'HTTPConnection',
+                       FakeKeepAliveHTTPConnection)
+        self.server = netapp_api.NaServer('127.0.0.1', username='admin',
+                                          password='pass')
+
+    def _invoke(self, api_name):
+        return self.server.invoke_successfully(netapp_api.NaElement(api_name))
+
+    def test_invoke_reuses_connection(self):
+        for i in range(3):
+            result = self._invoke('lun-get-iter')
+            self.assertEqual('1', result.get_child_content('num-records'))
+
+        self.assertEqual(1, len(FakeKeepAliveHTTPConnection.created))
+        conn = FakeKeepAliveHTTPConnection.created[0]
+        self.assertEqual('127.0.0.1:80', conn.host)
+        self.assertEqual(3, len(conn.requests))
+        method, path, data, headers = conn.requests[0]
+        self.assertEqual('POST', method)
+        self.assertEqual('/' + netapp_api.NaServer.URL_FILER, path)
+        self.assertIn('<lun-get-iter/>', data)
+        self.assertEqual('Basic YWRtaW46cGFzcw==', headers['Authorization'])
+        self.assertEqual(len(data), headers['Content-Length'])
+
+    def test_invoke_retries_stale_connection(self):
+        self._invoke('lun-get-iter')
+        conn = FakeKeepAliveHTTPConnection.created[0]
+        conn.fail_next = True
+        self._invoke('lun-get-iter')
+        self.assertEqual(2, len(conn.requests))
+
+    def test_invoke_retries_closed_without_response(self):
+        self._invoke('lun-get-iter')
+        conn = FakeKeepAliveHTTPConnection.created[0]
+        conn.fail_response = httplib.BadStatusLine('')
+        self._invoke('lun-get-iter')
+        self.assertEqual(3, len(conn.requests))
+
+    def test_invoke_no_retry_after_request_sent(self):
+        self._invoke('lun-get-iter')
+        conn = FakeKeepAliveHTTPConnection.created[0]
+        conn.fail_response = socket.error()
+        self.assertRaises(netapp_api.NaApiError, self._invoke, 'lun-get-iter')
+        conn.fail_response = httplib.BadStatusLine('HTTP/1.1 2')
+        self.assertRaises(netapp_api.NaApiError, self._invoke, 'lun-get-iter')
+        # The api is not sent again once the server may have run it
+        self.assertEqual(3, len(conn.requests))
+
+    def test_invoke_fresh_connection_error(self):
+        self.server._build_pool()
+        conn = self.server._pool.get()
+        conn.fail_next = True
+        self.server._pool.put(conn)
+        self.assertRaises(netapp_api.NaApiError, self._invoke, 'lun-get-iter')
+        stats = self.server.get_api_stats()['lun-get-iter']
+        self.assertEqual(1, stats['calls'])
+        self.assertEqual(1, stats['failures'])
+
+    def test_api_stats(self):
+        self._invoke('lun-get-iter')
+        self._invoke('lun-get-iter')
+        self._invoke('igroup-get-iter')
+        stats = self.server.get_api_stats()
+        self.assertEqual(2, stats['lun-get-iter']['calls'])
+        self.assertEqual(0, stats['lun-get-iter']['failures'])
+        self.assertEqual(1, stats['igroup-get-iter']['calls'])
+        self.assertTrue(stats['igroup-get-iter']['avg_time'] <=
+                        stats['igroup-get-iter']['max_time'])
@@ -19,6 +19,7 @@ import BaseHTTPServer
 import copy
 import httplib
 from lxml import etree
+import mock
 from mox import IgnoreArg
 import StringIO
 
@@ -283,6 +284,9 @@ class FakeDirectCmodeHTTPConnection(object):
     def set_debuglevel(self, level):
         pass
 
+    def close(self):
+        pass
+
     def getresponse(self):
         self.http_response.begin()
         return self.http_response
@@ -452,6 +456,61 @@ class SscUtilsTestCase(test.TestCase):
         self.mox.VerifyAll()
         self.assertEqual(len(res_vols), 1)
 
+    def test_cl_vols_ssc_known_aggrs(self):
+        """Test cluster ssc does not query aggrs it already knows."""
+        na_server = api.NaServer('127.0.0.1')
+        vserver = 'openstack'
+        test_vols = set([copy.deepcopy(self.vol1)])
+        aggrs = {'aggr1': {'ha_policy': 'cfo', 'raid_type': 'raid4',
+                           'disk_type': 'SAS'}}
+
+        self.mox.StubOutWithMock(ssc_utils, 'query_cluster_vols_for_ssc')
+        self.mox.StubOutWithMock(ssc_utils, 'get_sis_vol_dict')
+        self.mox.StubOutWithMock(ssc_utils, 'get_snapmirror_vol_dict')
+        self.mox.StubOutWithMock(ssc_utils, 'query_aggr_options')
+        self.mox.StubOutWithMock(ssc_utils, 'query_aggr_storage_disk')
+        ssc_utils.query_cluster_vols_for_ssc(
+            na_server, vserver, 'vola').AndReturn(test_vols)
+        ssc_utils.get_sis_vol_dict(na_server, vserver, 'vola').AndReturn({})
+        ssc_utils.get_snapmirror_vol_dict(
+            na_server, vserver, 'vola').AndReturn({})
+        self.mox.ReplayAll()
+
+        res_vols = ssc_utils.get_cluster_vols_with_ssc(
+            na_server, vserver, volume='vola', aggrs=aggrs)
+
+        self.mox.VerifyAll()
+        vol = res_vols.pop()
+        self.assertEqual('raid4', vol.aggr['raid_type'])
+        self.assertEqual('SAS', vol.aggr['disk_type'])
+
+    def test_refresh_stale_ssc(self):
+        """Test stale ssc refresh queries only the stale vols."""
+        na_server = api.NaServer('127.0.0.1')
+        vserver = 'openstack'
+        backend = mock.Mock()
+        backend.refresh_stale_running = False
+        backend.ssc_vols = ssc_utils.create_ssc_map(
+            set([self.vol1, self.vol2, self.vol3]))
+        backend._update_stale_vols.return_value = set(
+            [ssc_utils.NetAppVolume('volb', vserver),
+             ssc_utils.NetAppVolume('volc', vserver)])
+        volb = copy.deepcopy(self.vol2)
+        volb.sis['dedup'] = False
+        query = mock.Mock(side_effect=lambda s, vs, name, aggrs:
+                          set([volb]) if name == 'volb' else set())
+        self.stubs.Set(ssc_utils, 'get_cluster_vols_with_ssc', query)
+
+        ssc_utils.refresh_cluster_stale_ssc(backend, na_server, vserver)
+
+        self.assertEqual(2, query.call_count)
+        self.assertIn('aggr1', query.call_args[0][3])
+        ssc_map = backend.refresh_ssc_vols.call_args[0][0]
+        self.assertEqual(set(['vola', 'volb']),
+                         set(vol.id['name'] for vol in ssc_map['all']))
+        self.assertEqual(set(), ssc_map['dedup'])
+        self.assertEqual(set([volb]), ssc_map['netapp:raid_type:raid4'])
+
     def test_get_cluster_ssc(self):
         """Test get cluster ssc map."""
         na_server = api.NaServer('127.0.0.1')
@@ -516,6 +575,21 @@ class SscUtilsTestCase(test.TestCase):
         res = ssc_utils.get_volumes_for_specs(ssc_map, extra_specs)
         self.assertEqual(len(res), 1)
 
+    def test_vols_for_indexed_specs(self):
+        """Test ssc for specs using the ssc map index."""
+        test_vols =\
+            set([self.vol1, self.vol2, self.vol3, self.vol4, self.vol5])
+        ssc_map = ssc_utils.create_ssc_map(test_vols)
+        self.assertEqual(set([self.vol1, self.vol3, self.vol4]),
+                         ssc_map['netapp:raid_type:raiddp'])
+        extra_specs = {'netapp:raid_type': 'RAID4',
+                       'netapp:disk_type': 'sas'}
+        res = ssc_utils.get_volumes_for_specs(ssc_map, extra_specs)
+        self.assertEqual(set([self.vol5]), res)
+        extra_specs = {'netapp:qos_policy_group': 'gold'}
+        res = ssc_utils.get_volumes_for_specs(ssc_map, extra_specs)
+        self.assertEqual(set(), res)
+
     def test_query_cl_vols_for_ssc(self):
         na_server = api.NaServer('127.0.0.1')
         na_server.set_api_version(1, 15)
@@ -18,7 +18,9 @@ Unit tests for OpenStack Cinder volume driver
 """
 
 import base64
-import urllib2
+import functools
+import httplib
+import socket
 
 import mox as mox_lib
 
@@ -331,10 +333,52 @@ class TestNexentaISCSIDriver(test.TestCase):
         self.assertEqual(stats['QoS_support'], False)
 
 
+class FakeNMSMessage(object):
+
+    def __init__(self, status):
+        self.status = status
+
+
+class FakeNMSResponse(object):
+
+    def __init__(self, body, status='', will_close=False):
+        self.body = body
+        self.msg = FakeNMSMessage(status)
+        self.will_close = will_close
+
+    def read(self):
+        return self.body
+
+
+class FakeNMSConnection(object):
+    """httplib connection returning queued responses."""
+
+    def __init__(self, scheme, host, port, responses):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.responses = responses
+        self.requests = []
+        self.sock = None
+
+    def request(self, method, url, body, headers):
+        self.requests.append((self.scheme, method, url, body, headers))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            self.sock = None
+            raise response
+        self.sock = 'connected'
+        self.response = response
+
+    def getresponse(self):
+        return self.response
+
+    def close(self):
+        self.sock = None
+
+
 class TestNexentaJSONRPC(test.TestCase):
     HOST = 'example.com'
-    URL = 'http://%s/' % HOST
-    URL_S = 'https://%s/' % HOST
     USER = 'user'
     PASSWORD = 'password'
     HEADERS = {
@@ -342,84 +386,118 @@ class TestNexentaJSONRPC(test.TestCase):
         'Basic %s' % base64.b64encode('%s:%s' % (USER, PASSWORD)),
         'Content-Type': 'application/json'
     }
-    REQUEST = 'the request'
+    RESULT = '{"error": null, "result": "the result"}'
 
     def setUp(self):
         super(TestNexentaJSONRPC, self).setUp()
         self.proxy = jsonrpc.NexentaJSONProxy(
             'http', self.HOST, 2000, '/', self.USER, self.PASSWORD, auto=True)
-        self.mox.StubOutWithMock(urllib2, 'Request', True)
-        self.mox.StubOutWithMock(urllib2, 'urlopen')
-        self.resp_mock = self.mox.CreateMockAnything()
-        self.resp_info_mock = self.mox.CreateMockAnything()
-        self.resp_mock.info().AndReturn(self.resp_info_mock)
-        urllib2.urlopen(self.REQUEST).AndReturn(self.resp_mock)
+        self.responses = []
+        self.connections = []
+        self.stubs.Set(httplib, 'HTTPConnection',
+                       functools.partial(self._connect, 'http'))
+        self.stubs.Set(httplib, 'HTTPSConnection',
+                       functools.partial(self._connect, 'https'))
+
+    def _connect(self, scheme, host, port):
+        connection = FakeNMSConnection(scheme, host, port, self.responses)
+        self.connections.append(connection)
+        return connection
+
+    def _requests(self):
+        return [request for connection in self.connections
+                for request in connection.requests]
 
     def test_call(self):
-        urllib2.Request(
-            'http://%s:2000/' % self.HOST,
-            '{"object": null, "params": ["arg1", "arg2"], "method": null}',
-            self.HEADERS).AndReturn(self.REQUEST)
-        self.resp_info_mock.status = ''
-        self.resp_mock.read().AndReturn(
-            '{"error": null, "result": "the result"}')
-        self.mox.ReplayAll()
+        self.responses.append(FakeNMSResponse(self.RESULT))
         result = self.proxy('arg1', 'arg2')
         self.assertEqual("the result", result)
+        self.assertEqual(
+            [('http', 'POST', '/',
+              '{"object": null, "params": ["arg1", "arg2"], "method": null}',
+              self.HEADERS)],
+            self._requests())
+        self.assertEqual((self.HOST, 2000), (self.connections[0].host,
+                                             self.connections[0].port))
 
     def test_call_deep(self):
-        urllib2.Request(
-            'http://%s:2000/' % self.HOST,
-            '{"object": "obj1.subobj", "params": ["arg1", "arg2"],'
-            ' "method": "meth"}',
-            self.HEADERS).AndReturn(self.REQUEST)
-        self.resp_info_mock.status = ''
-        self.resp_mock.read().AndReturn(
-            '{"error": null, "result": "the result"}')
-        self.mox.ReplayAll()
+        self.responses.append(FakeNMSResponse(self.RESULT))
         result = self.proxy.obj1.subobj.meth('arg1', 'arg2')
         self.assertEqual("the result", result)
+        self.assertEqual(
+            '{"object": "obj1.subobj", "params": ["arg1", "arg2"],'
+            ' "method": "meth"}', self._requests()[0][3])
 
     def test_call_auto(self):
-        urllib2.Request(
-            'http://%s:2000/' % self.HOST,
-            '{"object": null, "params": ["arg1", "arg2"], "method": null}',
-            self.HEADERS).AndReturn(self.REQUEST)
-        urllib2.Request(
-            'https://%s:2000/' % self.HOST,
-            '{"object": null, "params": ["arg1", "arg2"], "method": null}',
-            self.HEADERS).AndReturn(self.REQUEST)
-        self.resp_info_mock.status = 'EOF in headers'
-        self.resp_mock.read().AndReturn(
-            '{"error": null, "result": "the result"}')
-        urllib2.urlopen(self.REQUEST).AndReturn(self.resp_mock)
-        self.mox.ReplayAll()
+        self.responses.append(FakeNMSResponse('', status='EOF in headers'))
+        self.responses.append(FakeNMSResponse(self.RESULT))
         result = self.proxy('arg1', 'arg2')
         self.assertEqual("the result", result)
+        self.assertEqual(['http', 'https'],
+                         [request[0] for request in self._requests()])
+        # Child proxies share the switched transport
+        self.assertEqual('https', self.proxy.volume.scheme)
 
     def test_call_error(self):
-        urllib2.Request(
-            'http://%s:2000/' % self.HOST,
-            '{"object": null, "params": ["arg1", "arg2"], "method": null}',
-            self.HEADERS).AndReturn(self.REQUEST)
-        self.resp_info_mock.status = ''
-        self.resp_mock.read().AndReturn(
-            '{"error": {"message": "the error"}, "result": "the result"}')
-        self.mox.ReplayAll()
+        self.responses.append(FakeNMSResponse(
+            '{"error": {"message": "the error"}, "result": "the result"}'))
         self.assertRaises(jsonrpc.NexentaJSONException,
                           self.proxy, 'arg1', 'arg2')
 
     def test_call_fail(self):
-        urllib2.Request(
-            'http://%s:2000/' % self.HOST,
-            '{"object": null, "params": ["arg1", "arg2"], "method": null}',
-            self.HEADERS).AndReturn(self.REQUEST)
-        self.resp_info_mock.status = 'EOF in headers'
+        self.responses.append(FakeNMSResponse('', status='EOF in headers'))
         self.proxy.auto = False
-        self.mox.ReplayAll()
         self.assertRaises(jsonrpc.NexentaJSONException,
                           self.proxy, 'arg1', 'arg2')
 
+    def test_call_reuses_connection(self):
+        self.responses.extend([FakeNMSResponse(self.RESULT),
+                               FakeNMSResponse(self.RESULT)])
+        self.proxy.volume.get_child_props('vol')
+        self.proxy.folder.get_child_props('folder')
+        self.assertEqual(1, len(self.connections))
+        self.assertEqual(2, len(self.connections[0].requests))
+
+    def test_call_retries_stale_connection(self):
+        self.responses.extend([FakeNMSResponse(self.RESULT),
+                               httplib.BadStatusLine(''),
+                               FakeNMSResponse(self.RESULT)])
+        self.proxy('arg1')
+        self.assertEqual("the result", self.proxy('arg1'))
+        self.assertEqual(3, len(self._requests()))
+
+    def test_call_not_retried_on_new_connection(self):
+        self.responses.append(socket.error('refused'))
+        self.assertRaises(socket.error, self.proxy, 'arg1')
+        self.assertEqual(1, len(self._requests()))
+
+    def test_get_api_stats(self):
+        self.responses.extend([
+            FakeNMSResponse(self.RESULT),
+            FakeNMSResponse(self.RESULT),
+            FakeNMSResponse('{"error": {"message": "the error"}}')])
+        self.proxy.volume.object_exists('vol1')
+        self.proxy.volume.object_exists('vol2')
+        self.assertRaises(jsonrpc.NexentaJSONException,
+                          self.proxy.zvol.create, 'vol1/zvol')
+        stats = self.proxy.get_api_stats()
+        self.assertEqual(['volume.object_exists', 'zvol.create'],
+                         sorted(stats))
+        self.assertEqual(2, stats['volume.object_exists']['calls'])
+        self.assertEqual(0, stats['volume.object_exists']['failures'])
+        self.assertEqual(1, stats['zvol.create']['failures'])
+        self.assertIn('avg_time', stats['zvol.create'])
+
+    def test_batch(self):
+        error = jsonrpc.NexentaJSONException('the error')
+
+        def fail():
+            raise error
+
+        calls = [(lambda i: i * 2, (i,)) for i in range(5)]
+        calls.append((fail, ()))
+        self.assertEqual([0, 2, 4, 6, 8, error], jsonrpc.batch(calls))
+
 
 class TestNexentaNfsDriver(test.TestCase):
     TEST_EXPORT1 = 'host1:/volumes/stack/share'
@@ -658,6 +736,35 @@ class TestNexentaNfsDriver(test.TestCase):
         self.assertEqual(free, units.GiB)
         self.assertEqual(allocated, 2 * units.GiB)
 
+    def test_find_share_probes_each_share_once(self):
+        self.configuration.nfs_used_ratio = 0.95
+        self.configuration.nfs_oversub_ratio = 1.0
+        self.drv.share2nms = {self.TEST_EXPORT1: self.nms_mock,
+                              self.TEST_EXPORT2: self.nms_mock}
+        self.drv._mounted_shares = [self.TEST_EXPORT1, self.TEST_EXPORT2]
+        for used in ('2G', '1G'):
+            self.nms_mock.server.get_prop('volroot').AndReturn('/volumes')
+            self.nms_mock.folder.get_child_props('stack/share', '').\
+                AndReturn({'available': '5G', 'used': used})
+        self.mox.ReplayAll()
+
+        self.assertEqual(self.TEST_EXPORT2, self.drv._find_share(1))
+
+    def test_update_volume_stats_probes_each_share_once(self):
+        self.drv.share2nms = {self.TEST_EXPORT1: self.nms_mock,
+                              self.TEST_EXPORT2: self.nms_mock}
+        self.drv._mounted_shares = [self.TEST_EXPORT1, self.TEST_EXPORT2]
+        self.stubs.Set(self.drv, '_ensure_shares_mounted', lambda: None)
+        for used in ('2G', '1G'):
+            self.nms_mock.server.get_prop('volroot').AndReturn('/volumes')
+            self.nms_mock.folder.get_child_props('stack/share', '').\
+                AndReturn({'available': '5G', 'used': used})
+        self.mox.ReplayAll()
+
+        self.drv._update_volume_stats()
+        self.assertEqual(13, self.drv._stats['total_capacity_gb'])
+        self.assertEqual(10, self.drv._stats['free_capacity_gb'])
+
     def test_get_share_datasets(self):
         self.drv.share2nms = {self.TEST_EXPORT1: self.nms_mock}
         self.nms_mock.server.get_prop('volroot').AndReturn('/volumes')
@@ -20,6 +20,7 @@ import os.path
 import StringIO
 import urllib2
 
+import mox
 from oslo.config import cfg
 
 from cinder import context
@@ -63,6 +64,15 @@ class PolicyFileTestCase(test.TestCase):
             self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
                               self.context, action, self.target)
 
+    def test_policy_file_checked_on_interval(self):
+        self.flags(policy_file_check_interval=60)
+        self.mox.StubOutWithMock(os.path, 'getmtime')
+        os.path.getmtime(mox.IgnoreArg()).AndReturn(1)
+        self.mox.ReplayAll()
+        policy.init()
+        policy.init()
+        policy.init()
+
 
 class PolicyTestCase(test.TestCase):
     def setUp(self):
@@ -153,6 +163,48 @@ class PolicyTestCase(test.TestCase):
         policy.enforce(admin_context, lowercase_action, self.target)
         policy.enforce(admin_context, uppercase_action, self.target)
 
+    def test_enforce_caches_decision(self):
+        rules = policy._get_compiled_rules()
+        self.mox.StubOutWithMock(rules, 'check')
+        rules.check('example:my_file', {'project_id': 'fake'},
+                    mox.IgnoreArg()).AndReturn(True)
+        rules.check('example:my_file', {'project_id': 'another'},
+                    mox.IgnoreArg()).AndReturn(False)
+        self.mox.ReplayAll()
+        for i in range(3):
+            policy.enforce(self.context, 'example:my_file',
+                           {'project_id': 'fake'})
+            self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                              self.context, 'example:my_file',
+                              {'project_id': 'another'})
+
+    def test_enforce_does_not_cache_http(self):
+
+        responses = ['True', 'False']
+
+        def fakeurlopen(url, post_data):
+            return StringIO.StringIO(responses.pop(0))
+        self.stubs.Set(urllib2, 'urlopen', fakeurlopen)
+        action = "example:get_http"
+        policy.enforce(self.context, action, {})
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, {})
+
+    def test_cached_decision_depends_on_roles(self):
+        action = "example:lowercase_admin"
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, self.target)
+        self.context.roles.append('admin')
+        policy.enforce(self.context, action, self.target)
+
+    def test_get_dependencies(self):
+        rules = policy._get_compiled_rules()
+        self.assertEqual((set(['project_id']), set(['roles', 'project_id'])),
+                         rules.get_dependencies('example:my_file'))
+        self.assertEqual((set(), set()),
+                         rules.get_dependencies('example:noexist'))
+        self.assertIsNone(rules.get_dependencies('example:get_http'))
+
 
 class DefaultPolicyTestCase(test.TestCase):
 
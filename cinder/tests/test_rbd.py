@@ -74,10 +74,110 @@ class TestUtil(test.TestCase):
                           driver.ascii_str, 'foo' + unichr(300))
 
 
+class RADOSConnectionPoolTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RADOSConnectionPoolTestCase, self).setUp()
+        self.rados = mock.Mock()
+        self.rados.Error = test.TestingException
+        self.rados.Rados.side_effect = lambda *args, **kwargs: mock.Mock()
+        self.pool = driver.RADOSConnectionPool(max_size=2)
+        self.stubs.Set(driver.eventlet, 'sleep', lambda *args: None)
+
+    def test_get_reuses_connection(self):
+        client, ioctx = self.pool.get(self.rados, 'conf', 'user', 'rbd')
+        client.connect.assert_called_once_with()
+        client.open_ioctx.assert_called_once_with('rbd')
+        self.pool.put(client, ioctx)
+
+        self.assertEqual((client, ioctx),
+                         self.pool.get(self.rados, 'conf', 'user', 'rbd'))
+        self.assertEqual(self.rados.Rados.call_count, 1)
+        self.assertFalse(client.shutdown.called)
+
+        # A different pool gets a different connection
+        other = self.pool.get(self.rados, 'conf', 'user', 'images')
+        self.assertNotEqual(other, (client, ioctx))
+        self.assertEqual(self.rados.Rados.call_count, 2)
+
+    def test_put_discard(self):
+        client, ioctx = self.pool.get(self.rados, 'conf', 'user', 'rbd')
+        self.pool.put(client, ioctx, discard=True)
+        client.shutdown.assert_called_once_with()
+
+        self.pool.get(self.rados, 'conf', 'user', 'rbd')
+        self.assertEqual(self.rados.Rados.call_count, 2)
+
+    def test_health_check(self):
+        self.flags(rados_connection_health_check_interval=0)
+        client, ioctx = self.pool.get(self.rados, 'conf', 'user', 'rbd')
+        self.pool.put(client, ioctx)
+
+        client.get_cluster_stats.side_effect = self.rados.Error
+        new_client, new_ioctx = self.pool.get(self.rados, 'conf', 'user',
+                                              'rbd')
+        self.assertIsNot(new_client, client)
+        client.shutdown.assert_called_once_with()
+
+    def test_evict_idle_when_full(self):
+        client1, ioctx1 = self.pool.get(self.rados, 'conf', 'user', 'rbd')
+        client2, ioctx2 = self.pool.get(self.rados, 'conf', 'user', 'foo')
+        self.pool.put(client1, ioctx1)
+
+        self.pool.get(self.rados, 'conf', 'user', 'bar')
+        client1.shutdown.assert_called_once_with()
+        self.assertFalse(client2.shutdown.called)
+        self.assertEqual(self.rados.Rados.call_count, 3)
+
+    def test_nested_get_when_full(self):
+        self.pool.get(self.rados, 'conf', 'user', 'rbd')
+        self.pool.get(self.rados, 'conf', 'user', 'foo')
+
+        # The caller already holds connections so it is not made to wait.
+        client, ioctx = self.pool.get(self.rados, 'conf', 'user', 'bar')
+        self.assertEqual(self.rados.Rados.call_count, 3)
+        self.pool.put(client, ioctx)
+        client.shutdown.assert_called_once_with()
+        self.assertEqual(self.pool._free, {})
+
+    def test_pooling_disabled(self):
+        pool = driver.RADOSConnectionPool(max_size=0)
+        client, ioctx = pool.get(self.rados, 'conf', 'user', 'rbd')
+        pool.put(client, ioctx)
+        client.shutdown.assert_called_once_with()
+
+        pool.get(self.rados, 'conf', 'user', 'rbd')
+        self.assertEqual(self.rados.Rados.call_count, 2)
+
+    def test_connect_retry(self):
+        self.flags(rados_connect_retries=2)
+        client = mock.Mock()
+        client.connect.side_effect = self.rados.Error
+        self.rados.Rados.side_effect = None
+        self.rados.Rados.return_value = client
+
+        self.assertRaises(test.TestingException, self.pool.get, self.rados,
+                          'conf', 'user', 'rbd')
+        self.assertEqual(client.connect.call_count, 3)
+        self.assertEqual(client.shutdown.call_count, 3)
+
+        # The slot taken for the failed connection has been released
+        client.connect.side_effect = None
+        self.pool.get(self.rados, 'conf', 'user', 'rbd')
+        self.pool.get(self.rados, 'conf', 'user', 'rbd')
+
+    def test_empty(self):
+        client, ioctx = self.pool.get(self.rados, 'conf', 'user', 'rbd')
+        self.pool.put(client, ioctx)
+        self.pool.empty()
+        client.shutdown.assert_called_once_with()
+
+
 class RBDTestCase(test.TestCase):
 
     def setUp(self):
         super(RBDTestCase, self).setUp()
+        self.stubs.Set(driver, '_rados_pool', None)
 
         self.cfg = mock.Mock(spec=conf.Configuration)
         self.cfg.volume_tmp_dir = None
@@ -392,6 +492,104 @@ class RBDTestCase(test.TestCase):
         self.rbd.Image.remove_snap.assert_called_once()
         self.rbd.Image.close.assert_called_once()
 
+    @mock.patch('cinder.volume.drivers.rbd.RADOSClient')
+    def test_create_cloned_volume_updates_clone_graph(self, mock_client):
+        src_name = u'volume-00000001'
+        dst_name = u'volume-00000002'
+
+        self.cfg.rbd_max_clone_depth = 2
+        self.rbd.RBD.clone = mock.Mock()
+        self.rbd.Image.create_snap = mock.Mock()
+        self.rbd.Image.protect_snap = mock.Mock()
+        self.rbd.Image.close = mock.Mock()
+        self.driver._clone_graph.add(src_name)
+
+        self.driver.create_cloned_volume(dict(name=dst_name),
+                                         dict(name=src_name))
+
+        client = mock_client.return_value.__enter__.return_value
+        self.assertEqual(
+            self.driver._clone_graph.get_parent_info(client, dst_name),
+            ('rbd', src_name, '%s.clone_snap' % (dst_name)))
+        self.assertEqual(self.driver._get_clone_depth(client, dst_name), 1)
+
+    @mock.patch('cinder.volume.drivers.rbd.RADOSClient')
+    def test_delete_volume_ignores_stale_clone_graph(self, mock_client):
+        client = mock_client.return_value
+        client.__enter__.return_value = client
+        self.driver.rbd.Image.list_snaps = mock.Mock()
+        self.driver.rbd.Image.list_snaps.return_value = []
+        self.driver.rbd.Image.close = mock.Mock()
+        self.driver.rbd.RBD.remove = mock.Mock()
+
+        parent_info = ('rbd', 'parent.deleted',
+                       '%s.clone_snap' % self.volume_name)
+        self.driver._get_clone_info = mock.Mock(return_value=parent_info)
+        self.driver._delete_backup_snaps = mock.Mock()
+        self.driver._delete_clone_parent_refs = mock.Mock()
+        # Changed by another service, the graph still has the old parent
+        self.driver._clone_graph.add(self.volume_name, 'rbd', 'old_parent',
+                                     'old_snap')
+
+        self.driver.delete_volume(self.volume)
+
+        self.driver.rbd.RBD.remove.assert_called_once()
+        self.driver._delete_clone_parent_refs.assert_called_once_with(
+            client, 'parent.deleted', parent_info[2])
+        self.assertNotIn(self.volume_name, self.driver._clone_graph)
+
+    @mock.patch('cinder.volume.drivers.rbd.RADOSClient')
+    def test_get_fsid(self, mock_client):
+        client = mock_client.return_value
+        client.__enter__.return_value = client
+        client.cluster.get_fsid.return_value = 'abc'
+
+        self.assertEqual(self.driver._get_fsid(), 'abc')
+        self.assertEqual(self.driver._get_fsid(), 'abc')
+        self.assertEqual(client.cluster.get_fsid.call_count, 1)
+
+    @mock.patch('cinder.volume.drivers.rbd.RBDVolumeProxy')
+    @mock.patch('cinder.volume.drivers.rbd.RADOSClient')
+    def test_copy_volume_offload(self, mock_client, mock_proxy):
+        client = mock_client.return_value
+        client.__enter__.return_value = client
+        src_volume = mock_proxy.return_value.__enter__.return_value
+        self.driver._get_fsid = mock.Mock(return_value='abc')
+        self.driver.rbd.RBD.remove = mock.Mock()
+
+        src_info = self.driver.get_copy_offload_source(self.volume)
+        src_info['pool'] = 'other_pool'
+        self.assertTrue(self.driver.copy_volume_offload(
+            None, src_info, {'name': 'volume-00000002'}))
+        self.driver.rbd.RBD.remove.assert_called_once_with(
+            client.ioctx, 'volume-00000002')
+        mock_proxy.assert_called_once_with(self.driver, self.volume_name,
+                                           pool='other_pool', read_only=True)
+        src_volume.copy.assert_called_once_with(client.ioctx,
+                                                'volume-00000002')
+
+    @mock.patch('cinder.volume.drivers.rbd.RBDVolumeProxy')
+    @mock.patch('cinder.volume.drivers.rbd.RADOSClient')
+    def test_copy_volume_offload_source_unreadable(self, mock_client,
+                                                   mock_proxy):
+        self.driver._get_fsid = mock.Mock(return_value='abc')
+        self.driver.rbd.RBD.remove = mock.Mock()
+        self.rbd.Error = test.TestingException
+        mock_proxy.side_effect = self.rbd.Error
+
+        src_info = self.driver.get_copy_offload_source(self.volume)
+        self.assertFalse(self.driver.copy_volume_offload(
+            None, src_info, {'name': 'volume-00000002'}))
+        self.assertFalse(self.driver.rbd.RBD.remove.called)
+        self.assertFalse(mock_client.called)
+
+    def test_copy_volume_offload_other_cluster(self):
+        self.driver._get_fsid = mock.Mock(return_value='abc')
+        src_info = {'copy_offload': 'RBDDriver:def', 'pool': 'rbd',
+                    'name': self.volume_name}
+        self.assertFalse(self.driver.copy_volume_offload(
+            None, src_info, {'name': 'volume-00000002'}))
+
     def test_good_locations(self):
         locations = ['rbd://fsid/pool/image/snap',
                      'rbd://%2F/%2F/%2F/%2F', ]
@@ -479,6 +677,7 @@ class RBDTestCase(test.TestCase):
         client.cluster.get_cluster_stats = mock.Mock()
         client.cluster.get_cluster_stats.return_value = {'kb': 1024 ** 3,
                                                          'kb_avail': 1024 ** 2}
+        client.cluster.get_fsid.return_value = 'abc'
 
         self.driver.configuration.safe_get = mock.Mock()
         self.driver.configuration.safe_get.return_value = 'RBD'
@@ -490,7 +689,8 @@ class RBDTestCase(test.TestCase):
             storage_protocol='ceph',
             total_capacity_gb=1024,
             free_capacity_gb=1,
-            reserved_percentage=0)
+            reserved_percentage=0,
+            copy_offload='RBDDriver:abc')
 
         actual = self.driver.get_volume_stats(True)
         client.cluster.get_cluster_stats.assert_called_once()
@@ -655,6 +855,74 @@ class RBDTestCase(test.TestCase):
         client.shutdown.assert_called_once()
 
 
+class RBDCloneGraphTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RBDCloneGraphTestCase, self).setUp()
+        self.driver = mock.Mock()
+        self.client = mock.Mock()
+        self.graph = driver.RBDCloneGraph(self.driver)
+
+        # vol3 is a clone of vol2 which is a clone of vol1.
+        self.parents = {'vol1': (None, None, None),
+                        'vol2': ('rbd', 'vol1', 'vol2.clone_snap'),
+                        'vol3': ('rbd', 'vol2', 'vol3.clone_snap')}
+
+        def get_clone_info(volume, volume_name):
+            return self.parents[volume_name]
+
+        self.driver._get_clone_info.side_effect = get_clone_info
+
+    def test_get_depth(self):
+        self.flags(rbd_max_clone_depth=5)
+        self.assertEqual(self.graph.get_depth(self.client, 'vol3'), 2)
+        self.assertEqual(self.driver.rbd.Image.call_count, 3)
+
+        # Subsequent lookups are served from the graph
+        self.assertEqual(self.graph.get_depth(self.client, 'vol3'), 2)
+        self.assertEqual(self.graph.get_depth(self.client, 'vol2'), 1)
+        self.assertEqual(self.graph.get_depth(self.client, 'vol1'), 0)
+        self.assertEqual(self.driver.rbd.Image.call_count, 3)
+
+        self.assertEqual(self.graph.get_children('vol1'), set(['vol2']))
+        self.assertEqual(self.graph.get_children('vol2'), set(['vol3']))
+
+    def test_get_depth_exceeded(self):
+        self.flags(rbd_max_clone_depth=0)
+        self.assertRaises(Exception, self.graph.get_depth, self.client,
+                          'vol3')
+
+    def test_add_and_flatten(self):
+        self.flags(rbd_max_clone_depth=5)
+        self.graph.get_depth(self.client, 'vol3')
+        self.graph.add('vol4', 'rbd', 'vol3', 'vol4.clone_snap')
+        self.assertEqual(self.graph.get_depth(self.client, 'vol4'), 3)
+
+        self.graph.flatten('vol3')
+        self.assertEqual(self.graph.get_depth(self.client, 'vol4'), 1)
+        self.assertEqual(self.graph.get_children('vol2'), set())
+        self.assertEqual(self.graph.get_children('vol3'), set(['vol4']))
+        self.assertEqual(self.driver.rbd.Image.call_count, 3)
+
+    def test_rename_and_remove(self):
+        self.flags(rbd_max_clone_depth=5)
+        self.graph.get_depth(self.client, 'vol3')
+        self.graph.rename('vol2', 'vol2.deleted')
+
+        self.assertNotIn('vol2', self.graph)
+        self.assertEqual(self.graph.get_parent_info(self.client, 'vol3'),
+                         ('rbd', 'vol2.deleted', 'vol3.clone_snap'))
+        self.assertEqual(self.graph.get_children('vol1'),
+                         set(['vol2.deleted']))
+        self.assertEqual(self.graph.get_children('vol2.deleted'),
+                         set(['vol3']))
+
+        self.graph.remove('vol3')
+        self.assertNotIn('vol3', self.graph)
+        self.assertEqual(self.graph.get_children('vol2.deleted'), set())
+        self.assertEqual(self.driver.rbd.Image.call_count, 3)
+
+
 class RBDImageIOWrapperTestCase(test.TestCase):
     def setUp(self):
         super(RBDImageIOWrapperTestCase, self).setUp()
@@ -780,6 +1048,7 @@ class ManagedRBDTestCase(DriverTestCase):
 
     def setUp(self):
         super(ManagedRBDTestCase, self).setUp()
+        self.stubs.Set(driver, '_rados_pool', None)
         # TODO(dosaboy): need to remove dependency on mox stubs here once
         # image.fake has been converted to mock.
         fake_image.stub_out_image_service(self.stubs)
@@ -0,0 +1,261 @@
+#    Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Unit tests for the cinder kombu rpc backend and RPC latency histograms."""
+
+import mock
+from oslo.config import cfg
+
+from cinder.common import rpc_kombu
+from cinder.common import rpc_latency
+from cinder import context
+from cinder import test
+
+
+CONF = cfg.CONF
+
+
+class FakeConnectionPool(object):
+    """Connection pool handing out a single mock connection."""
+
+    def __init__(self):
+        self.connection = mock.Mock()
+        self.gets = 0
+
+    def get(self):
+        self.gets += 1
+        return self.connection
+
+    def put(self, connection):
+        pass
+
+
+class RpcKombuConnectionTestCase(test.TestCase):
+    """Test publisher reuse on the kombu memory transport."""
+
+    def setUp(self):
+        super(RpcKombuConnectionTestCase, self).setUp()
+        self.flags(fake_rabbit=True)
+        self.conn = rpc_kombu.Connection(CONF)
+        self.addCleanup(self.conn.close)
+
+    def test_publishers_cached(self):
+        self.conn.topic_send('topic', {'id': 1})
+        self.conn.topic_send('topic', {'id': 2})
+        self.assertEqual(len(self.conn.publishers), 1)
+
+        self.conn.fanout_send('topic', {'id': 3})
+        self.conn.topic_send('other', {'id': 4})
+        self.assertEqual(len(self.conn.publishers), 3)
+
+        # Reply publishers are only used once
+        self.conn.direct_send('msg_id', {'id': 5})
+        self.assertEqual(len(self.conn.publishers), 3)
+
+    def test_publisher_cache_bounded(self):
+        self.conn.max_cached_publishers = 2
+        self.conn.topic_send('a', {})
+        self.conn.topic_send('b', {})
+        self.conn.topic_send('a', {})
+        self.conn.topic_send('c', {})
+        self.assertEqual([key[1] for key in self.conn.publishers],
+                         ['a', 'c'])
+
+    def test_reset_keeps_channel_without_consumers(self):
+        self.conn.topic_send('topic', {})
+        channel = self.conn.channel
+
+        self.conn.reset()
+        self.assertIs(self.conn.channel, channel)
+        self.assertEqual(len(self.conn.publishers), 1)
+
+        self.conn.declare_topic_consumer('topic', lambda msg: None)
+        self.conn.reset()
+        self.assertIsNot(self.conn.channel, channel)
+        self.assertEqual(self.conn.publishers, {})
+        self.assertEqual(self.conn.consumers, [])
+
+    def test_reconnect_clears_publishers(self):
+        self.conn.topic_send('topic', {})
+        self.conn.reconnect()
+        self.assertEqual(self.conn.publishers, {})
+
+
+class BatchPublisherTestCase(test.TestCase):
+
+    def setUp(self):
+        super(BatchPublisherTestCase, self).setUp()
+        self.flags(amqp_publish_batch_size=2, rabbit_retry_interval=0)
+        self.pool = FakeConnectionPool()
+        self.publisher = rpc_kombu.BatchPublisher(CONF, self.pool)
+        self.stubs.Set(rpc_kombu.greenthread, 'spawn', mock.Mock())
+
+    def test_flush_in_batches(self):
+        for i in range(3):
+            self.publisher.publish('topic_send', 'topic', i)
+        self.publisher.flush()
+
+        self.assertEqual(self.pool.connection.topic_send.call_args_list,
+                         [mock.call('topic', i) for i in range(3)])
+        # Two messages per connection
+        self.assertEqual(self.pool.gets, 2)
+
+    def test_failed_batch_retried(self):
+        sent = []
+
+        def topic_send(topic, msg):
+            if msg == 1 and not sent.count('fail'):
+                sent.append('fail')
+                raise test.TestingException()
+            sent.append(msg)
+
+        self.pool.connection.topic_send.side_effect = topic_send
+        self.publisher.publish('topic_send', 'topic', 0)
+        self.publisher.publish('topic_send', 'topic', 1)
+        self.publisher.flush()
+
+        # Only the messages not yet sent are retried
+        self.assertEqual(sent, [0, 'fail', 1])
+
+    def test_failed_batch_logged_and_dropped(self):
+        self.flags(amqp_publish_batch_retries=1)
+        log_exception = mock.Mock()
+        self.stubs.Set(rpc_kombu.LOG, 'exception', log_exception)
+        self.pool.connection.topic_send.side_effect = test.TestingException
+        self.publisher.publish('topic_send', 'topic', 0)
+        self.publisher.flush()
+        self.assertEqual(self.pool.connection.topic_send.call_count, 2)
+        self.assertEqual(log_exception.call_count, 1)
+
+        # The error is not raised to later callers
+        self.pool.connection.topic_send.side_effect = None
+        self.publisher.publish('topic_send', 'topic', 2)
+        self.publisher.flush()
+        self.pool.connection.topic_send.assert_called_with('topic', 2)
+
+    def test_publish_queued_when_batching(self):
+        self.stubs.Set(rpc_kombu.rpc_amqp, 'get_connection_pool',
+                       lambda conf, cls: self.pool)
+        self.addCleanup(setattr, rpc_kombu.Connection, 'batch_publisher',
+                        None)
+
+        rpc_kombu._publish(CONF, 'topic_send', 'topic', 'msg')
+        self.assertFalse(self.pool.connection.topic_send.called)
+        rpc_kombu.Connection.batch_publisher.flush()
+        self.pool.connection.topic_send.assert_called_once_with('topic',
+                                                                'msg')
+
+    def test_stop_sends_pending(self):
+        self.publisher.pending = [('topic_send', 'topic', 0)]
+        self.publisher.publish('topic_send', 'topic', 1)
+        self.publisher.stop()
+
+        self.assertEqual(self.pool.connection.topic_send.call_args_list,
+                         [mock.call('topic', 0), mock.call('topic', 1)])
+        self.assertIsNone(self.publisher.thread)
+
+
+class RpcKombuCastTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RpcKombuCastTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.publish = mock.Mock()
+        self.stubs.Set(rpc_kombu, '_publish', self.publish)
+
+    def test_cast(self):
+        rpc_kombu.cast(CONF, self.context, 'topic', {'method': 'foo'})
+        method, topic, msg = self.publish.call_args[0][1:]
+        self.assertEqual((method, topic), ('topic_send', 'topic'))
+        self.assertIn('oslo.message', msg)
+
+    def test_notify(self):
+        rpc_kombu.notify(CONF, self.context, 'notifications',
+                         {'event_type': 'foo'}, False)
+        method, topic, msg = self.publish.call_args[0][1:]
+        self.assertEqual((method, topic), ('notify_send', 'notifications'))
+        self.assertEqual(msg['event_type'], 'foo')
+
+
+class RpcLatencyTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RpcLatencyTestCase, self).setUp()
+        rpc_latency.reset_latency_histograms()
+        self.addCleanup(rpc_latency.reset_latency_histograms)
+
+    def test_histogram(self):
+        histogram = rpc_latency.LatencyHistogram()
+        histogram.record(0.002)
+        histogram.record(0.002)
+        histogram.record(100)
+
+        stats = histogram.to_dict()
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(stats['max'], 100)
+        buckets = dict(stats['buckets'])
+        self.assertEqual(buckets[0.005], 2)
+        self.assertEqual(buckets[float('inf')], 1)
+
+    def test_dispatch_recorded(self):
+        class Proxy(object):
+            RPC_API_VERSION = '1.0'
+
+            def foo(self, ctxt):
+                return 'bar'
+
+            def fail(self, ctxt):
+                raise test.TestingException()
+
+        dispatcher = rpc_latency.RpcDispatcher([Proxy()])
+        self.assertEqual(dispatcher.dispatch(None, '1.0', 'foo', None),
+                         'bar')
+        self.assertRaises(test.TestingException,
+                          dispatcher.dispatch, None, '1.0', 'fail', None)
+
+        histograms = rpc_latency.get_latency_histograms()
+        self.assertEqual(histograms['foo']['count'], 1)
+        self.assertEqual(histograms['fail']['count'], 1)
+
+    def test_call_recorded(self):
+        self.stubs.Set(rpc_kombu.rpc_amqp, 'call',
+                       mock.Mock(return_value='result'))
+        self.stubs.Set(rpc_kombu.rpc_amqp, 'get_connection_pool',
+                       mock.Mock())
+
+        self.assertEqual(rpc_kombu.call(CONF, None, 'topic',
+                                        {'method': 'foo'}),
+                         'result')
+        histograms = rpc_latency.get_latency_histograms()
+        self.assertEqual(histograms['call.foo']['count'], 1)
+
+    def test_report_latency_histograms(self):
+        now = [1000.0]
+        log_info = mock.Mock()
+        self.stubs.Set(rpc_latency.time, 'time', lambda: now[0])
+        self.stubs.Set(rpc_latency.LOG, 'info', log_info)
+        self.flags(rpc_latency_report_interval=60)
+        rpc_latency.record_latency('foo', 0.002)
+
+        # The first call starts the interval
+        self.assertFalse(rpc_latency.report_latency_histograms())
+        now[0] += 30
+        self.assertFalse(rpc_latency.report_latency_histograms())
+        now[0] += 30
+        self.assertTrue(rpc_latency.report_latency_histograms())
+        self.assertEqual(log_info.call_count, 1)
+        self.assertIn('foo', log_info.call_args[0][0])
+
+        self.flags(rpc_latency_report_interval=0)
+        now[0] += 60
+        self.assertFalse(rpc_latency.report_latency_histograms())
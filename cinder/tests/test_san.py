@@ -0,0 +1,73 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the SSH command execution of the SAN base driver."""
+
+import mock
+
+from cinder.openstack.common import processutils
+from cinder import test
+from cinder.volume import configuration as conf
+from cinder.volume.drivers.san import san
+
+
+class FakeSanDriver(san.SanDriver):
+    SSH_CACHEABLE_COMMANDS = ('lsvdisk',)
+
+
+class SanDriverSSHTestCase(test.TestCase):
+
+    def setUp(self):
+        super(SanDriverSSHTestCase, self).setUp()
+        self.configuration = conf.Configuration(None)
+        self.configuration.ssh_cmd_cache_ttl = 60
+        self.driver = FakeSanDriver(configuration=self.configuration)
+        self.execute = mock.Mock(return_value=('out', ''))
+        self.stubs.Set(self.driver, '_execute_ssh', self.execute)
+
+    def test_cacheable_command_cached(self):
+        self.assertEqual(('out', ''), self.driver._run_ssh(['lsvdisk', 'v1']))
+        self.assertEqual(('out', ''), self.driver._run_ssh(['lsvdisk', 'v1']))
+        self.driver._run_ssh(['lsvdisk', 'v2'])
+        self.assertEqual(2, self.execute.call_count)
+
+        stats = self.driver.get_ssh_stats()['lsvdisk']
+        self.assertEqual(3, stats['calls'])
+        self.assertEqual(1, stats['cache_hits'])
+        self.assertEqual(0, stats['failures'])
+
+    def test_modifying_command_invalidates(self):
+        self.driver._run_ssh(['lsvdisk', 'v1'])
+        self.driver._run_ssh(['rmvdisk', 'v1'])
+        self.driver._run_ssh(['lsvdisk', 'v1'])
+        self.assertEqual(3, self.execute.call_count)
+        self.assertEqual(1, self.driver.get_ssh_stats()['rmvdisk']['calls'])
+
+    def test_cache_disabled(self):
+        self.configuration.ssh_cmd_cache_ttl = 0
+        self.driver._run_ssh(['lsvdisk', 'v1'])
+        self.driver._run_ssh(['lsvdisk', 'v1'])
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_failure_not_cached(self):
+        self.execute.side_effect = processutils.ProcessExecutionError()
+        self.assertRaises(processutils.ProcessExecutionError,
+                          self.driver._run_ssh, ['lsvdisk', 'v1'])
+        self.execute.side_effect = None
+        self.driver._run_ssh(['lsvdisk', 'v1'])
+        self.assertEqual(2, self.execute.call_count)
+        stats = self.driver.get_ssh_stats()['lsvdisk']
+        self.assertEqual(1, stats['failures'])
+        self.assertEqual(2, stats['calls'])
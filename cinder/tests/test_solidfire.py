@@ -14,6 +14,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import httplib
+import json
+import socket
+import time
+
 import mox
 
 from cinder import context
@@ -29,6 +34,49 @@ from cinder.volume import volume_types
 
 LOG = logging.getLogger(__name__)
 
+# The test case stubs out the API calls, keep the real one at hand
+issue_api_request = SolidFireDriver.__dict__['_issue_api_request']
+
+
+class FakeHTTPSResponse(object):
+    def __init__(self, body, status=200):
+        self.status = status
+        self.reason = 'OK'
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+class FakeHTTPSConnection(object):
+    """Keep-alive connection answering every call with an empty result."""
+
+    instances = []
+
+    def __init__(self, host, port):
+        self.sock = None
+        self.requests = []
+        self.fail_request = None
+        self.fail_response = None
+        FakeHTTPSConnection.instances.append(self)
+
+    def request(self, method, url, body, headers):
+        if self.fail_request:
+            exc, self.fail_request = self.fail_request, None
+            raise exc
+        self.sock = 'connected'
+        self.requests.append((url, json.loads(body), headers))
+
+    def getresponse(self):
+        if self.fail_response:
+            exc, self.fail_response = self.fail_response, None
+            raise exc
+        request_id = self.requests[-1][1]['id']
+        return FakeHTTPSResponse(json.dumps({'result': {}, 'id': request_id}))
+
+    def close(self):
+        self.sock = None
+
 
 def create_configuration():
     configuration = mox.MockObject(conf.Configuration)
@@ -46,6 +94,7 @@ class SolidFireVolumeTestCase(test.TestCase):
         self.configuration.san_is_local = True
         self.configuration.sf_emulate_512 = True
         self.configuration.sf_account_prefix = 'cinder'
+        self.configuration.sf_account_cache_ttl = 300
 
         super(SolidFireVolumeTestCase, self).setUp()
         self.stubs.Set(SolidFireDriver, '_issue_api_request',
@@ -325,6 +374,97 @@ class SolidFireVolumeTestCase(test.TestCase):
         account = sfv._get_sfaccount_by_name('some-name')
         self.assertIsNotNone(account)
 
+    def test_get_sfaccount_by_name_cached(self):
+        sfv = SolidFireDriver(configuration=self.configuration)
+        calls = []
+
+        def _fake_issue_api_request(obj, method, params, version='1.0'):
+            calls.append(method)
+            return self.fake_issue_api_request(method, params, version)
+
+        self.stubs.Set(SolidFireDriver, '_issue_api_request',
+                       _fake_issue_api_request)
+        account = sfv._get_sfaccount_by_name('some-name')
+        self.assertEqual(account, sfv._get_sfaccount_by_name('some-name'))
+        self.assertEqual(['GetAccountByName'], calls)
+
+        # The secrets may have been changed on the cluster
+        sfv._sf_accounts['some-name'] = (time.time() - 300, account)
+        sfv._get_sfaccount_by_name('some-name')
+        self.assertEqual(['GetAccountByName'] * 2, calls)
+
+    def _create_pooled_driver(self):
+        self.stubs.Set(SolidFireDriver, '_issue_api_request',
+                       issue_api_request)
+        self.stubs.Set(SolidFireDriver, '_update_cluster_status',
+                       self.fake_update_cluster_status)
+        self.stubs.Set(httplib, 'HTTPSConnection', FakeHTTPSConnection)
+        FakeHTTPSConnection.instances = []
+        self.configuration.san_ip = '10.10.10.10'
+        self.configuration.sf_api_port = 443
+        self.configuration.san_login = 'admin'
+        self.configuration.san_password = 'password'
+        return SolidFireDriver(configuration=self.configuration)
+
+    def test_issue_api_request_retries_idle_connection(self):
+        sfv = self._create_pooled_driver()
+        sfv._issue_api_request('GetClusterInfo', {})
+        conn = FakeHTTPSConnection.instances[0]
+
+        conn.fail_request = socket.error()
+        sfv._issue_api_request('GetClusterInfo', {})
+        conn.fail_response = httplib.BadStatusLine('')
+        sfv._issue_api_request('GetClusterInfo', {})
+        self.assertEqual(4, len(conn.requests))
+
+    def test_issue_api_request_no_retry_after_request_sent(self):
+        sfv = self._create_pooled_driver()
+        sfv._issue_api_request('GetClusterInfo', {})
+        conn = FakeHTTPSConnection.instances[0]
+
+        conn.fail_response = socket.error()
+        self.assertRaises(exception.SolidFireAPIException,
+                          sfv._issue_api_request, 'CreateVolume', {})
+        # The method is not sent again once the cluster may have run it
+        self.assertEqual(2, len(conn.requests))
+
+    def test_issue_api_request_reuses_connection(self):
+        sfv = self._create_pooled_driver()
+        sfv._issue_api_request('GetClusterInfo', {})
+        data = sfv._issue_api_request('ListVolumesForAccount',
+                                      {'accountID': 25}, version='5.0')
+        self.assertEqual({}, data['result'])
+        self.assertEqual(1, len(FakeHTTPSConnection.instances))
+        requests = FakeHTTPSConnection.instances[0].requests
+        self.assertEqual(['/json-rpc/1.0', '/json-rpc/5.0'],
+                         [url for (url, body, headers) in requests])
+        self.assertEqual('Basic YWRtaW46cGFzc3dvcmQ=',
+                         requests[1][2]['Authorization'])
+
+    def test_get_sf_volume_indexed(self):
+        sfv = SolidFireDriver(configuration=self.configuration)
+        calls = []
+        sf_volumes = [{'volumeID': 5, 'name': 'UUID-vol-5', 'accountID': 25,
+                       'attributes': {'uuid': 'vol-5'}},
+                      {'volumeID': 6, 'name': 'UUID-vol-6', 'accountID': 25,
+                       'attributes': None}]
+
+        def _fake_issue_api_request(obj, method, params, version='1.0'):
+            calls.append(method)
+            if params['accountID'] != 25:
+                return {'result': {'volumes': []}}
+            return {'result': {'volumes': sf_volumes}}
+
+        self.stubs.Set(SolidFireDriver, '_issue_api_request',
+                       _fake_issue_api_request)
+        params = {'accountID': 25}
+        self.assertEqual(5, sfv._get_sf_volume('vol-5', params)['volumeID'])
+        self.assertEqual(6, sfv._get_sf_volume('vol-6', params)['volumeID'])
+        self.assertEqual(['ListVolumesForAccount'], calls)
+        # Another account does not get the volume from the index
+        self.assertIsNone(sfv._get_sf_volume('vol-6', {'accountID': 26}))
+        self.assertEqual(2, len(calls))
+
     def test_get_sfaccount_by_name_fails(self):
         sfv = SolidFireDriver(configuration=self.configuration)
         self.stubs.Set(SolidFireDriver, '_issue_api_request',
@@ -1568,6 +1568,7 @@ class StorwizeSVCDriverTestCase(test.TestCase):
         self.sleeppatch = mock.patch('eventlet.greenthread.sleep')
         self.sleeppatch.start()
         self.driver._helpers.check_fcmapping_interval = 0
+        self.flags(array_job_poll_interval=0)
 
     def tearDown(self):
         if self.USESIM:
@@ -1643,6 +1644,11 @@ class StorwizeSVCDriverTestCase(test.TestCase):
                           self.driver.check_for_setup_error)
         self._reset_flags()
 
+        self._set_flag('storwize_svc_copy_offload_rate', 101)
+        self.assertRaises(exception.InvalidInput,
+                          self.driver.check_for_setup_error)
+        self._reset_flags()
+
         self._set_flag('storwize_svc_vol_compression', True)
         self._set_flag('storwize_svc_vol_rsize', -1)
         self.assertRaises(exception.InvalidInput,
@@ -1701,6 +1707,14 @@ class StorwizeSVCDriverTestCase(test.TestCase):
         volume_types.destroy(ctxt, type_ref['id'])
         return attrs
 
+    def test_storwize_svc_ssh_cmd_name(self):
+        self.assertEqual('lsvdisk', self.driver._get_ssh_cmd_name(
+            'svcinfo lsvdisk -bytes -delim ! vol1'))
+        self.assertEqual('rmvdisk', self.driver._get_ssh_cmd_name(
+            'svctask rmvdisk vol1'))
+        self.assertIn('lshost', self.driver.SSH_CACHEABLE_COMMANDS)
+        self.assertNotIn('lsfcmap', self.driver.SSH_CACHEABLE_COMMANDS)
+
     def test_storwize_svc_snapshots(self):
         vol1 = self._generate_vol_info(None, None)
         self.driver.create_volume(vol1)
@@ -2263,6 +2277,34 @@ class StorwizeSVCDriverTestCase(test.TestCase):
             self.assertAlmostEqual(stats['total_capacity_gb'], 3328.0)
             self.assertAlmostEqual(stats['free_capacity_gb'], 3287.5)
 
+    def test_storwize_svc_copy_volume_offload(self):
+        src = self._generate_vol_info(None, None)
+        self.driver.create_volume(src)
+        dest = self._generate_vol_info(None, None)
+        self.driver.create_volume(dest)
+
+        src_info = self.driver.get_copy_offload_source(src)
+        self.assertEqual(self.driver.get_volume_stats()['copy_offload'],
+                         src_info['copy_offload'])
+        ssh = self.driver._helpers.ssh
+        with mock.patch.object(ssh, 'mkfcmap',
+                               wraps=ssh.mkfcmap) as mkfcmap:
+            self.assertTrue(self.driver.copy_volume_offload(None, src_info,
+                                                            dest))
+            mkfcmap.assert_called_once_with(src['name'], dest['name'], True,
+                                            copy_rate='100')
+        self.assertEqual(
+            [], self.driver._helpers._get_vdisk_fc_mappings(dest['name']))
+
+        src_info['copy_offload'] = 'StorwizeSVCDriver:other'
+        with mock.patch.object(self.driver._helpers,
+                               'run_flashcopy') as run_flashcopy:
+            self.assertFalse(self.driver.copy_volume_offload(None, src_info,
+                                                             dest))
+            self.assertFalse(run_flashcopy.called)
+        self.driver.delete_volume(src)
+        self.driver.delete_volume(dest)
+
     def test_storwize_svc_extend_volume(self):
         volume = self._generate_vol_info(None, None)
         self.driver.db.volume_set(volume)
@@ -2281,6 +2323,32 @@ class StorwizeSVCDriverTestCase(test.TestCase):
         self.driver.delete_snapshot(snap)
         self.driver.delete_volume(volume)
 
+    def test_storwize_svc_poll_vdisk_copies(self):
+        helpers = self.driver._helpers
+        error = exception.VolumeBackendAPIException(data='CMMVC5754E')
+
+        def lsvdiskcopy(vdisk, copy_id=None):
+            if vdisk == 'gone':
+                raise error
+            return [{'sync': 'yes' if vdisk == 'synced' else 'no'}]
+
+        with mock.patch.object(helpers.ssh, 'lsvdiskcopy',
+                               side_effect=lsvdiskcopy):
+            with mock.patch.object(helpers, 'is_vdisk_defined',
+                                   return_value=False):
+                # Only the copy of the deleted vdisk fails
+                self.assertEqual(
+                    {('synced', '1'): None, ('gone', '1'): error},
+                    helpers._poll_vdisk_copies(
+                        'system', [('synced', '1'), ('copying', '1'),
+                                   ('gone', '1')]))
+            with mock.patch.object(helpers, 'is_vdisk_defined',
+                                   return_value=True):
+                # Left for the tracker to retry
+                self.assertRaises(exception.VolumeBackendAPIException,
+                                  helpers._poll_vdisk_copies, 'system',
+                                  [('gone', '1')])
+
     def _check_loc_info(self, capabilities, expected):
         host = {'host': 'foo', 'capabilities': capabilities}
         vol = {'name': 'test', 'id': 1, 'size': 1}
@@ -17,6 +17,7 @@
 Test suite for VMware VMDK driver.
 """
 
+from eventlet import greenthread
 import mox
 
 from cinder import exception
@@ -119,6 +120,29 @@ class FakeObj(object):
         self.obj = obj
 
 
+class FakeObjectUpdate(object):
+    def __init__(self, obj, kind='enter', change_set=None):
+        self.obj = obj
+        self.kind = kind
+        self.changeSet = change_set
+
+
+class FakePropertyChange(object):
+    def __init__(self, name, val=None, op='assign'):
+        self.name = name
+        self.val = val
+        self.op = op
+
+
+class FakeUpdateSet(object):
+    def __init__(self, object_set, version, truncated=False):
+        filter_update = FakeObject()
+        filter_update.objectSet = object_set
+        self.filterSet = [filter_update]
+        self.version = version
+        self.truncated = truncated
+
+
 class VMwareEsxVmdkDriverTestCase(test.TestCase):
     """Test class for VMwareEsxVmdkDriver."""
 
@@ -281,12 +305,91 @@ class VMwareEsxVmdkDriverTestCase(test.TestCase):
         m.StubOutWithMock(api.VMwareAPISession, 'vim')
         self._session.vim = self._vim
         m.StubOutWithMock(self._session, 'invoke_api')
-        self._session.invoke_api(vim_util, 'get_objects',
-                                 self._vim, 'VirtualMachine',
-                                 self.MAX_OBJECTS)
+        self._session.invoke_api(vim_util, 'create_filter', self._vim,
+                                 volumeops.VMwareVolumeOps.INDEX_PROPERTIES)
+        backing = FakeMor('VirtualMachine', 'my_back')
+        host = FakeMor('HostSystem', 'my_host')
+        update_set = FakeUpdateSet(
+            [FakeObjectUpdate(backing, change_set=[
+                FakePropertyChange('name', 'my_back'),
+                FakePropertyChange('runtime.host', host)])],
+            '1')
+        self._session.invoke_api(vim_util, 'wait_for_updates_ex', self._vim,
+                                 '', self.MAX_OBJECTS).AndReturn(update_set)
 
         m.ReplayAll()
-        self._volumeops.get_backing(mox.IgnoreArg())
+        self.assertEqual(backing, self._volumeops.get_backing('my_back'))
+        # The host of a VM seen by the index is not queried again
+        self.assertEqual(host, self._volumeops.get_host(backing))
+        m.UnsetStubs()
+        m.VerifyAll()
+
+    def test_get_backing_index_updates(self):
+        """Test get_backing follows incremental updates of the index."""
+        m = self.mox
+        m.StubOutWithMock(api.VMwareAPISession, 'vim')
+        self._session.vim = self._vim
+        m.StubOutWithMock(self._session, 'invoke_api')
+        self._session.invoke_api(vim_util, 'create_filter', self._vim,
+                                 mox.IgnoreArg())
+        vm1 = FakeMor('VirtualMachine', 'vm-1')
+        vm2 = FakeMor('VirtualMachine', 'vm-2')
+        # The initial state arrives in two pages
+        self._session.invoke_api(
+            vim_util, 'wait_for_updates_ex', self._vim, '',
+            self.MAX_OBJECTS).AndReturn(FakeUpdateSet(
+            [FakeObjectUpdate(vm1, change_set=[
+                FakePropertyChange('name', 'vol1')])], '1', True))
+        self._session.invoke_api(
+            vim_util, 'wait_for_updates_ex', self._vim, '1',
+            self.MAX_OBJECTS).AndReturn(FakeUpdateSet(
+            [FakeObjectUpdate(vm2, change_set=[
+                FakePropertyChange('name', 'vol2')])], '2'))
+        self._session.invoke_api(
+            vim_util, 'wait_for_updates_ex', self._vim, '2',
+            self.MAX_OBJECTS).AndReturn(FakeUpdateSet(
+            [FakeObjectUpdate(vm1, kind='leave'),
+             FakeObjectUpdate(vm2, kind='modify', change_set=[
+                 FakePropertyChange('name', 'vol3')])], '3'))
+        self._session.invoke_api(vim_util, 'wait_for_updates_ex', self._vim,
+                                 '3', self.MAX_OBJECTS).AndReturn(None)
+
+        m.ReplayAll()
+        self.assertEqual(vm1, self._volumeops.get_backing('vol1'))
+        self.assertIsNone(self._volumeops.get_backing('vol1'))
+        self.assertEqual(vm2, self._volumeops.get_backing('vol3'))
+        self.assertEqual({'vol3': ('VirtualMachine', 'vm-2')},
+                         self._volumeops._backing_keys)
+        m.UnsetStubs()
+        m.VerifyAll()
+
+    def test_update_index_serialized(self):
+        """Test concurrent index updates wait for each other."""
+        m = self.mox
+        m.StubOutWithMock(api.VMwareAPISession, 'vim')
+        self._session.vim = self._vim
+        m.ReplayAll()
+        calls = []
+
+        def invoke_api(module, method, vim, *args):
+            calls.append((method,) + args[:1])
+            if method == 'wait_for_updates_ex':
+                # Let the other callers run
+                greenthread.sleep(0)
+                return FakeUpdateSet([], args[0] + '1')
+            return FakeMor('PropertyFilter', 'filter')
+
+        self.stubs.Set(self._session, 'invoke_api', invoke_api)
+        threads = [greenthread.spawn(self._volumeops._update_index)
+                   for i in range(3)]
+        self.assertEqual([True] * 3, [thread.wait() for thread in threads])
+        # The first update may have started before the other callers, the
+        # last caller uses the update made for the second one
+        self.assertEqual([('create_filter', volumeops.VMwareVolumeOps.
+                           INDEX_PROPERTIES),
+                          ('wait_for_updates_ex', ''),
+                          ('wait_for_updates_ex', '1')], calls)
+        self.assertEqual('11', self._volumeops._index_version)
         m.UnsetStubs()
         m.VerifyAll()
 
@@ -296,6 +399,10 @@ class VMwareEsxVmdkDriverTestCase(test.TestCase):
         m.StubOutWithMock(api.VMwareAPISession, 'vim')
         self._session.vim = self._vim
         m.StubOutWithMock(self._session, 'invoke_api')
+        # Without an index the inventory is scanned
+        self._session.invoke_api(
+            vim_util, 'create_filter', self._vim,
+            mox.IgnoreArg()).AndRaise(error_util.VimException('error'))
         retrieve_result = FakeRetrieveResult([], 'my_token')
         self._session.invoke_api(vim_util, 'get_objects',
                                  self._vim, 'VirtualMachine',
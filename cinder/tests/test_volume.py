@@ -20,6 +20,7 @@ Tests for Volume Code.
 
 import contextlib
 import datetime
+import itertools
 import os
 import re
 import shutil
@@ -2160,6 +2161,76 @@ class VolumeTestCase(BaseVolumeTestCase):
         self.assertEqual(volume['host'], 'newhost')
         self.assertIsNone(volume['migration_status'])
 
+    def _migrate_volume_offload(self, offloaded, force_host_copy=False,
+                                size=0):
+        def fake_create_volume(self, ctxt, volume, host, req_spec, filters,
+                               allow_reschedule=True):
+            db.volume_update(ctxt, volume['id'],
+                             {'status': 'available'})
+
+        self.stubs.Set(volume_rpcapi.VolumeAPI, 'create_volume',
+                       fake_create_volume)
+        self.stubs.Set(self.volume.driver, 'get_copy_offload_source',
+                       lambda vol: {'copy_offload': 'array1',
+                                    'name': vol['name']})
+        copy_offload = mock.Mock(return_value=offloaded)
+        self.stubs.Set(volume_rpcapi.VolumeAPI, 'copy_volume_offload',
+                       copy_offload)
+        copy_volume_data = mock.Mock()
+        self.stubs.Set(self.volume.driver, 'copy_volume_data',
+                       copy_volume_data)
+
+        volume = tests_utils.create_volume(self.context, size=size,
+                                           host=CONF.host)
+        host_obj = {'host': 'newhost',
+                    'capabilities': {'copy_offload': 'array1'}}
+        self.volume.migrate_volume(self.context, volume['id'],
+                                   host_obj, force_host_copy,
+                                   new_type_id='fake_type')
+        volume = db.volume_get(context.get_admin_context(), volume['id'])
+        self.assertEqual(volume['host'], 'newhost')
+        self.assertIsNone(volume['migration_status'])
+        return copy_offload, copy_volume_data
+
+    def test_migrate_volume_generic_offload(self):
+        copy_offload, copy_volume_data = self._migrate_volume_offload(True)
+        self.assertEqual(1, copy_offload.call_count)
+        src_info = copy_offload.call_args[0][2]
+        self.assertEqual('array1', src_info['copy_offload'])
+        self.assertFalse(copy_volume_data.called)
+
+    def test_migrate_volume_generic_offload_timeout(self):
+        self.flags(migration_copy_offload_timeout_secs=100,
+                   migration_copy_offload_timeout_secs_per_gb=10)
+        copy_offload, copy_volume_data = self._migrate_volume_offload(
+            True, size=5)
+        self.assertEqual(150, copy_offload.call_args[1]['timeout'])
+
+    def test_migrate_volume_generic_offload_declined(self):
+        copy_offload, copy_volume_data = self._migrate_volume_offload(False)
+        self.assertEqual(1, copy_offload.call_count)
+        self.assertEqual(1, copy_volume_data.call_count)
+
+    def test_migrate_volume_generic_force_host_copy(self):
+        copy_offload, copy_volume_data = self._migrate_volume_offload(
+            True, force_host_copy=True)
+        self.assertFalse(copy_offload.called)
+        self.assertEqual(1, copy_volume_data.call_count)
+
+    def test_copy_volume_offload(self):
+        volume = tests_utils.create_volume(self.context, size=0,
+                                           host=CONF.host)
+        src_info = {'copy_offload': 'array1', 'name': 'src'}
+        with mock.patch.object(self.volume.driver,
+                               'copy_volume_offload') as copy_offload:
+            copy_offload.return_value = True
+            self.assertTrue(self.volume.copy_volume_offload(
+                self.context, volume['id'], src_info))
+            copy_offload.assert_called_once_with(self.context, src_info,
+                                                 mock.ANY)
+            self.assertEqual(volume['id'],
+                             copy_offload.call_args[0][2]['id'])
+
     def _retype_volume_exec(self, driver, snap=False, policy='on-demand',
                             migrate_exc=False, exc=None, diff_equal=False):
         elevated = context.get_admin_context()
@@ -2480,6 +2551,33 @@ class GetActiveByWindowTestCase(BaseVolumeTestCase):
         self.assertEqual(snapshots[2].id, u'4')
         self.assertEqual(snapshots[2].volume.id, u'1')
 
+    def test_volume_get_active_by_window_paged(self):
+        for attrs in self.db_attrs:
+            db.volume_create(self.ctx, attrs)
+
+        begin = datetime.datetime(1, 3, 1, 1, 1, 1)
+        end = datetime.datetime(1, 4, 1, 1, 1, 1)
+        volumes = db.volume_get_active_by_window(self.context, begin, end,
+                                                 limit=2)
+        self.assertEqual([u'2', u'3'], [v.id for v in volumes])
+        volumes = db.volume_get_active_by_window(self.context, begin, end,
+                                                 marker=u'3', limit=2)
+        self.assertEqual([u'4'], [v.id for v in volumes])
+
+    def test_snapshot_get_active_by_window_paged(self):
+        db.volume_create(self.context, {'id': 1})
+        for attrs in self.db_attrs:
+            attrs['volume_id'] = 1
+            db.snapshot_create(self.ctx, attrs)
+
+        begin = datetime.datetime(1, 3, 1, 1, 1, 1)
+        end = datetime.datetime(1, 4, 1, 1, 1, 1)
+        snapshots = db.snapshot_get_active_by_window(self.context, begin,
+                                                     end, marker=u'2',
+                                                     limit=1)
+        self.assertEqual([u'3'], [s.id for s in snapshots])
+        self.assertEqual(u'1', snapshots[0].volume.id)
+
 
 class DriverTestCase(test.TestCase):
     """Base Test class for Drivers."""
@@ -2986,6 +3084,85 @@ class FibreChannelTestCase(DriverTestCase):
                           self.driver.initialize_connection, {}, {})
 
 
+class ArrayJobTrackerTestCase(test.TestCase):
+    """Test Case for the ArrayJobTracker."""
+
+    def setUp(self):
+        super(ArrayJobTrackerTestCase, self).setUp()
+        self.flags(array_job_poll_interval=0)
+        self.tracker = driver.ArrayJobTracker()
+        self.polls = []
+
+    def _poll(self, array, job_ids):
+        self.polls.append((array, sorted(job_ids)))
+        # Job 'a' completes on the second poll, 'b' on the third
+        return dict((job_id, job_id.upper()) for job_id in job_ids
+                    if len(self.polls) > ' ab'.index(job_id))
+
+    def test_jobs_of_an_array_polled_together(self):
+        job_a = self.tracker.track('array1', 'a', self._poll)
+        job_b = self.tracker.track('array1', 'b', self._poll)
+        self.assertEqual('A', job_a.wait())
+        self.assertEqual('B', job_b.wait())
+        self.assertEqual([('array1', ['a', 'b']), ('array1', ['a', 'b']),
+                          ('array1', ['b'])], self.polls)
+
+    def test_jobs_of_other_arrays_polled_apart(self):
+        job_a = self.tracker.track('array1', 'a', self._poll)
+        job_b = self.tracker.track('array2', 'a', self._poll)
+        job_a.wait()
+        job_b.wait()
+        self.assertEqual(['array1', 'array2'],
+                         sorted(array for array, job_ids in self.polls[:2]))
+
+    def test_job_failure(self):
+        error = exception.VolumeBackendAPIException(data='copy failed')
+        poll = mock.Mock(return_value={'a': error})
+        self.assertRaises(exception.VolumeBackendAPIException,
+                          self.tracker.wait, 'array1', 'a', poll)
+
+    def test_poll_failure(self):
+        self.flags(array_job_max_poll_failures=3)
+        poll = mock.Mock(side_effect=exception.VolumeBackendAPIException(
+            data='array down'))
+        job_a = self.tracker.track('array1', 'a', poll)
+        job_b = self.tracker.track('array1', 'b', poll)
+        self.assertRaises(exception.VolumeBackendAPIException, job_a.wait)
+        self.assertRaises(exception.VolumeBackendAPIException, job_b.wait)
+        self.assertEqual(3, poll.call_count)
+
+    def test_poll_failure_retried(self):
+        poll = mock.Mock(side_effect=[
+            exception.VolumeBackendAPIException(data='ssh timeout'),
+            {'a': 'A'}])
+        self.assertEqual('A', self.tracker.wait('array1', 'a', poll))
+        self.assertEqual(2, poll.call_count)
+
+    def test_job_timeout(self):
+        poll = mock.Mock(return_value={})
+        times = itertools.chain([0, 0, 5, 10], itertools.repeat(20))
+        with mock.patch('time.time', side_effect=times):
+            job = self.tracker.track('array1', 'a', poll, timeout=10)
+            self.assertRaises(exception.VolumeBackendAPIException, job.wait)
+        self.assertEqual(2, poll.call_count)
+
+    @mock.patch.object(driver.greenthread, 'spawn')
+    @mock.patch('time.time')
+    def test_poll_interval_backoff(self, mock_time, mock_spawn):
+        self.flags(array_job_poll_interval=2,
+                   array_job_max_poll_interval=5)
+        mock_time.return_value = 0
+        job = self.tracker.track('array1', 'a', mock.Mock(return_value={}))
+        intervals = []
+        for now in (2, 3, 6, 11, 16):
+            mock_time.return_value = now
+            self.tracker._poll_jobs()
+            intervals.append(job.interval)
+        # Not due at 3, polls at 2, 6, 11 and 16
+        self.assertEqual([4, 4, 5, 5, 5], intervals)
+        self.assertEqual(4, job.poll.call_count)
+
+
 class VolumePolicyTestCase(test.TestCase):
 
     def setUp(self):
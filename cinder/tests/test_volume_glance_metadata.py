@@ -101,6 +101,12 @@ class VolumeGlanceMetadataTestCase(test.TestCase):
         self._assert_metadata_equals('2', 'key2', 'value2', metadata[1])
         self._assert_metadata_equals('2', 'key22', 'value22', metadata[2])
 
+        metadata = db.volume_glance_metadata_list_get(ctxt, ['2', '3'])
+        self.assertEqual(len(metadata), 2)
+        self._assert_metadata_equals('2', 'key2', 'value2', metadata[0])
+        self._assert_metadata_equals('2', 'key22', 'value22', metadata[1])
+        self.assertEqual([], db.volume_glance_metadata_list_get(ctxt, []))
+
     def _assert_metadata_equals(self, volume_id, key, value, observed):
         self.assertEqual(volume_id, observed.volume_id)
         self.assertEqual(key, observed.key)
@@ -0,0 +1,121 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the asynchronous usage notification emitter."""
+
+from eventlet import greenthread
+import mock
+
+from cinder import context
+from cinder.openstack.common.notifier import api as notifier_api
+from cinder.openstack.common.notifier import test_notifier
+from cinder import test
+from cinder.volume import notifier
+
+
+class UsageNotifierTestCase(test.TestCase):
+
+    def setUp(self):
+        super(UsageNotifierTestCase, self).setUp()
+        self.flags(notification_driver=[test_notifier.__name__])
+        self.context = context.get_admin_context()
+        test_notifier.NOTIFICATIONS = []
+        self.addCleanup(notifier_api._reset_drivers)
+        self.addCleanup(notifier.reset)
+
+    def _notify(self, event_type='volume.exists'):
+        notifier.notify(self.context, 'volume.fake', event_type,
+                        notifier_api.INFO, {'volume_id': 'fake'})
+
+    def test_notify_synchronous_by_default(self):
+        self._notify()
+        self.assertEqual(1, len(test_notifier.NOTIFICATIONS))
+        self.assertIsNone(notifier._queue)
+
+    def test_notify_queued(self):
+        self.flags(usage_notification_queue_size=10)
+        self._notify()
+        self._notify('volume.delete.end')
+        self.assertEqual([], test_notifier.NOTIFICATIONS)
+
+        notifier.flush()
+        self.assertEqual(['volume.exists', 'volume.delete.end'],
+                         [msg['event_type']
+                          for msg in test_notifier.NOTIFICATIONS])
+        msg = test_notifier.NOTIFICATIONS[0]
+        self.assertEqual('volume.fake', msg['publisher_id'])
+        self.assertEqual('INFO', msg['priority'])
+        self.assertEqual({'volume_id': 'fake'}, msg['payload'])
+        self.assertEqual(2, notifier.get_stats()['sent'])
+
+    def _stub_slow_driver(self):
+        sent = []
+
+        def notify(context, msg):
+            greenthread.sleep(0.01)
+            sent.append(msg['event_type'])
+
+        self.stubs.Set(notifier_api, '_get_drivers',
+                       lambda: [mock.Mock(notify=notify)])
+        return sent
+
+    def test_flush_waits_for_notification_being_sent(self):
+        self.flags(usage_notification_queue_size=10)
+        sent = self._stub_slow_driver()
+        self._notify()
+        # Let the greenthread take the notification off the queue
+        greenthread.sleep(0)
+        self.assertEqual([], sent)
+
+        notifier.flush()
+        self.assertEqual(['volume.exists'], sent)
+
+    def test_reset_sends_queued(self):
+        self.flags(usage_notification_queue_size=10)
+        sent = self._stub_slow_driver()
+        self._notify()
+        self._notify('volume.delete.end')
+        greenthread.sleep(0)
+
+        queue = notifier._get_queue()
+        notifier.reset()
+        self.assertEqual(['volume.exists', 'volume.delete.end'], sent)
+        self.assertIsNone(queue.thread)
+        self.assertEqual(0, queue.pending)
+
+    def test_notify_full_queue_drops(self):
+        self.flags(usage_notification_queue_size=1,
+                   usage_notification_queue_timeout=0.01)
+        # Without a flusher greenthread the queue stays full
+        self.stubs.Set(greenthread, 'spawn', mock.Mock())
+        self._notify()
+        self._notify()
+        stats = notifier.get_stats()
+        self.assertEqual(1, stats['queued'])
+        self.assertEqual(1, stats['blocked'])
+        self.assertEqual(1, stats['dropped'])
+
+    def test_notify_bad_priority(self):
+        self.flags(usage_notification_queue_size=10)
+        self.assertRaises(notifier_api.BadPriorityException,
+                          notifier.notify, self.context, 'volume.fake',
+                          'volume.exists', 'BAD', {})
+
+    def test_flusher_sends_queued(self):
+        self.flags(usage_notification_queue_size=10)
+        self._notify()
+        # Let the flusher greenthread run
+        greenthread.sleep(0)
+        self.assertEqual(1, len(test_notifier.NOTIFICATIONS))
@@ -252,6 +252,13 @@ class VolumeRpcAPITestCase(test.TestCase):
                               error=False,
                               version='1.10')
 
+    def test_copy_volume_offload(self):
+        self._test_volume_api('copy_volume_offload',
+                              rpc_method='call',
+                              volume=self.fake_volume,
+                              src_info={'copy_offload': 'array1'},
+                              version='1.13')
+
     def test_retype(self):
         class FakeHost(object):
             def __init__(self):
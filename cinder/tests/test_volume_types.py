@@ -302,3 +302,53 @@ class VolumeTypeTestCase(test.TestCase):
         self.assertEqual(diff['extra_specs']['key1'], ('val1', 'val1'))
         self.assertEqual(diff['qos_specs']['k1'], ('v1', 'v1'))
         self.assertEqual(diff['encryption']['key_size'], (256, 128))
+
+    def test_lookup_cache(self):
+        self.flags(volume_type_cache_ttl=60)
+        volume_types.invalidate_cache()
+        type_ref = volume_types.create(self.ctxt, "type1", {"key1": "val1"})
+        stats = volume_types.get_cache_stats()
+
+        vol_type = volume_types.get_volume_type(self.ctxt, type_ref['id'])
+        vol_type['extra_specs']['key1'] = 'changed'
+        self.assertEqual({'key1': 'val1'},
+                         volume_types.get_volume_type_extra_specs(
+                             type_ref['id']))
+        new_stats = volume_types.get_cache_stats()
+        self.assertEqual(stats['misses'] + 1, new_stats['misses'])
+        self.assertEqual(stats['hits'] + 1, new_stats['hits'])
+
+        # Changes made behind the back of the cache are not seen...
+        db.volume_type_extra_specs_update_or_create(self.ctxt,
+                                                    type_ref['id'],
+                                                    {"key1": "val2"})
+        self.assertEqual('val1', volume_types.get_volume_type_extra_specs(
+            type_ref['id'], 'key1'))
+        # ... until the cache is invalidated or the entries expire
+        volume_types.invalidate_cache()
+        self.assertEqual('val2', volume_types.get_volume_type_extra_specs(
+            type_ref['id'], 'key1'))
+        db.volume_type_extra_specs_update_or_create(self.ctxt,
+                                                    type_ref['id'],
+                                                    {"key1": "val3"})
+        expired = time.time() + 61
+        self.stubs.Set(volume_types.time, 'time', lambda: expired)
+        self.assertEqual('val3', volume_types.get_volume_type_extra_specs(
+            type_ref['id'], 'key1'))
+
+    def test_lookup_cache_invalidated_by_qos_specs(self):
+        self.flags(volume_type_cache_ttl=60)
+        type_ref = volume_types.create(self.ctxt, "type1")
+        qos_ref = qos_specs.create(self.ctxt, 'qos-specs-1', {'k1': 'v1'})
+        self.assertIsNone(volume_types.get_volume_type_qos_specs(
+            type_ref['id'])['qos_specs'])
+        self.assertEqual({'k1': 'v1'}, qos_specs.get_qos_specs(
+            self.ctxt, qos_ref['id'])['specs'])
+
+        qos_specs.associate_qos_with_type(self.ctxt, qos_ref['id'],
+                                          type_ref['id'])
+        qos_specs.update(self.ctxt, qos_ref['id'], {'k1': 'v2'})
+        res = volume_types.get_volume_type_qos_specs(type_ref['id'])
+        self.assertEqual(qos_ref['id'], res['qos_specs']['id'])
+        self.assertEqual({'k1': 'v2'}, qos_specs.get_qos_specs(
+            self.ctxt, qos_ref['id'])['specs'])
@@ -33,14 +33,12 @@ import tempfile
 
 from eventlet import pools
 from oslo.config import cfg
-import paramiko
 from xml.dom import minidom
 from xml.parsers import expat
 from xml import sax
 from xml.sax import expatreader
 from xml.sax import saxutils
 
-from cinder.brick.initiator import connector
 from cinder import exception
 from cinder.openstack.common import importutils
 from cinder.openstack.common import lockutils
@@ -191,6 +189,10 @@ class SSHPool(pools.Pool):
         super(SSHPool, self).__init__(*args, **kwargs)
 
     def create(self):
+        # NOTE: paramiko is imported here rather than at module level since
+        # it is slow to import and most cinder services never use ssh.
+        import paramiko
+
         try:
             ssh = paramiko.SSHClient()
             ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -720,6 +722,9 @@ def brick_get_connector_properties():
     the root_helper needed for cinder.
     """
 
+    # NOTE: brick is imported on first use to keep it out of cinder-api
+    from cinder.brick.initiator import connector
+
     root_helper = get_root_helper()
     return connector.get_connector_properties(root_helper,
                                               CONF.my_ip)
@@ -735,6 +740,8 @@ def brick_get_connector(protocol, driver=None,
     as the root_helper needed to execute commands.
     """
 
+    from cinder.brick.initiator import connector
+
     root_helper = get_root_helper()
     return connector.InitiatorConnector.factory(protocol, root_helper,
                                                 driver=driver,
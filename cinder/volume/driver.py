@@ -20,6 +20,9 @@ Drivers for volumes.
 
 import time
 
+from eventlet import event
+from eventlet import greenthread
+from eventlet import queue
 from oslo.config import cfg
 
 from cinder.brick.iscsi import iscsi
@@ -98,6 +101,20 @@ volume_opts = [
                default='1M',
                help='The default block size used when copying/clearing '
                     'volumes'),
+    cfg.IntOpt('array_job_poll_interval',
+               default=2,
+               help='Seconds before the first status poll of a long-running '
+                    'array job such as a LUN copy. The interval doubles '
+                    'after each poll that finds the job still running'),
+    cfg.IntOpt('array_job_max_poll_interval',
+               default=60,
+               help='Maximum number of seconds between two status polls of '
+                    'a long-running array job'),
+    cfg.IntOpt('array_job_max_poll_failures',
+               default=10,
+               help='Number of consecutive failed status polls after which '
+                    'a long-running array job is failed. Failed polls are '
+                    'retried until then, or until the job times out'),
 ]
 
 # for backward compatibility
@@ -129,6 +146,149 @@ CONF.register_opts(volume_opts)
 CONF.register_opts(iser_opts)
 
 
+class ArrayJob(object):
+    """A long-running job of a storage array, see ArrayJobTracker."""
+
+    def __init__(self, array, job_id, poll, interval, timeout=None):
+        now = time.time()
+        self.array = array
+        self.job_id = job_id
+        self.poll = poll
+        self.interval = interval
+        self.next_poll = now + interval
+        self.deadline = now + timeout if timeout else None
+        # Consecutive polls of the job that failed
+        self.poll_failures = 0
+        self.done = event.Event()
+
+    def wait(self):
+        """Wait for the job to complete and return its result.
+
+        Raises the exception the job failed with.
+        """
+        return self.done.wait()
+
+
+class ArrayJobTracker(object):
+    """Polls the long-running jobs of storage arrays from one greenthread.
+
+    Drivers register a job with a poll callback and wait for it instead
+    of sleeping in their own loops.  The callback is called as
+    poll(array, job_ids) and returns a dict holding the result of each
+    finished job, or the exception it failed with; the jobs it leaves out
+    are still running.  The jobs of an array sharing a callback are polled
+    with a single call, and the interval between two polls of a job
+    doubles from array_job_poll_interval up to array_job_max_poll_interval.
+
+    An exception raised by the callback is taken as a transient error and
+    the jobs are polled again, until they time out or
+    array_job_max_poll_failures polls in a row failed.  Callbacks report
+    the failure of a single job in their result instead.
+
+    The callers still wait for their job, this only saves each of them
+    from running its own polling loop.
+    """
+
+    def __init__(self):
+        self._jobs = []
+        self._wakeup = queue.LightQueue()
+        self._thread = None
+
+    def track(self, array, job_id, poll, timeout=None):
+        """Start following a job, returns its ArrayJob."""
+        job = ArrayJob(array, job_id, poll, CONF.array_job_poll_interval,
+                       timeout)
+        self._jobs.append(job)
+        if self._thread is None:
+            self._thread = greenthread.spawn(self._run)
+        else:
+            self._wakeup.put(None)
+        return job
+
+    def wait(self, array, job_id, poll, timeout=None):
+        """Follow a job until it completes and return its result."""
+        return self.track(array, job_id, poll, timeout).wait()
+
+    def _run(self):
+        try:
+            while self._jobs:
+                delay = (min(job.next_poll for job in self._jobs) -
+                         time.time())
+                if delay > 0:
+                    try:
+                        # A new job may be due before the others
+                        self._wakeup.get(timeout=delay)
+                        continue
+                    except queue.Empty:
+                        pass
+                else:
+                    greenthread.sleep(0)
+                self._poll_jobs()
+        except Exception as ex:
+            # Do not leave the waiters hanging
+            LOG.exception(_("Array job tracker failed."))
+            for job in list(self._jobs):
+                self._finish(job, ex)
+        finally:
+            self._thread = None
+
+    def _poll_jobs(self):
+        now = time.time()
+        groups = {}
+        for job in self._jobs:
+            groups.setdefault((job.array, job.poll), []).append(job)
+        for (array, poll), jobs in groups.items():
+            if not any(job.next_poll <= now for job in jobs):
+                continue
+            error = None
+            try:
+                results = poll(array, [job.job_id for job in jobs])
+            except Exception as ex:
+                LOG.warn(_("Polling jobs %(jobs)s of array %(array)s "
+                           "failed: %(err)s") %
+                         {'jobs': [job.job_id for job in jobs],
+                          'array': array, 'err': ex})
+                error = ex
+                results = {}
+            for job in jobs:
+                if job.job_id in results:
+                    self._finish(job, results[job.job_id])
+                    continue
+                job.poll_failures = job.poll_failures + 1 if error else 0
+                if job.deadline is not None and job.deadline <= now:
+                    msg = (_('Job %(job)s of array %(array)s did not '
+                             'complete in time.') %
+                           {'job': job.job_id, 'array': array})
+                    LOG.error(msg)
+                    self._finish(job, error or
+                                 exception.VolumeBackendAPIException(data=msg))
+                elif job.poll_failures >= CONF.array_job_max_poll_failures:
+                    LOG.error(_('Giving up on job %(job)s of array '
+                                '%(array)s after %(count)d failed polls.') %
+                              {'job': job.job_id, 'array': array,
+                               'count': job.poll_failures})
+                    self._finish(job, error)
+                elif job.next_poll <= now:
+                    job.interval = min(job.interval * 2,
+                                       CONF.array_job_max_poll_interval)
+                    job.next_poll = now + job.interval
+
+    def _finish(self, job, result):
+        self._jobs.remove(job)
+        if isinstance(result, Exception):
+            job.done.send_exception(result)
+        else:
+            job.done.send(result)
+
+
+_array_job_tracker = ArrayJobTracker()
+
+
+def get_array_job_tracker():
+    """Return the tracker shared by the drivers of this process."""
+    return _array_job_tracker
+
+
 class VolumeDriver(object):
     """Executes commands relating to Volumes."""
 
@@ -503,6 +663,28 @@ class VolumeDriver(object):
         """
         return False
 
+    def get_copy_offload_source(self, volume):
+        """Describe the volume to drivers able to copy it on the array.
+
+        Returns None, or a dictionary whose 'copy_offload' key matches the
+        'copy_offload' capability of the backends that can copy the volume
+        on the array; the other keys locate the volume for them.
+        """
+        return None
+
+    def copy_volume_offload(self, context, src_info, volume):
+        """Copy a volume of another backend of the array into volume.
+
+        Returns a boolean indicating whether the data was copied; if not,
+        the caller falls back to copying through a cinder-volume host.
+
+        :param context: Context
+        :param src_info: What get_copy_offload_source returned on the
+                         backend of the source volume
+        :param volume: A dictionary describing the volume to copy to
+        """
+        return False
+
     def accept_transfer(self, context, volume, new_user, new_project):
         """Accept the transfer of a volume for a new user/project."""
         pass
@@ -21,6 +21,7 @@ It supports VNX and VMAX arrays.
 
 """
 
+import os
 import time
 
 from oslo.config import cfg
@@ -41,12 +42,21 @@ except ImportError:
                'Install PyWBEM using the python-pywbem package.'))
 
 CINDER_EMC_CONFIG_FILE = '/etc/cinder/cinder_emc_config.xml'
+# Bounds of the interval between two polls of a running job, in seconds
+JOB_POLL_MIN_INTERVAL = 1
+JOB_POLL_MAX_INTERVAL = 10
 
 emc_opts = [
     cfg.StrOpt('cinder_emc_config_file',
                default=CINDER_EMC_CONFIG_FILE,
                help='use this file for cinder emc plugin '
-                    'config data'), ]
+                    'config data'),
+    cfg.IntOpt('emc_cim_cache_ttl',
+               default=0,
+               help='Seconds the CIM object names enumerated on the ECOM '
+                    'server are reused. Objects created or deleted other '
+                    'than through this driver may be missed for up to this '
+                    'long. 0 disables caching'), ]
 
 
 CONF.register_opts(emc_opts)
@@ -67,6 +77,14 @@ class EMCSMISCommon():
         self.protocol = prtcl
         self.configuration = configuration
         self.configuration.append_config_values(emc_opts)
+        self._config_dom = None
+        self._ecom_conn = None
+        # Key -> (time fetched, CIM object names); see _invalidate_cim_cache
+        self._cim_cache = {}
+        # ElementName -> instance name of the volumes seen so far
+        self._lun_names = {}
+        # Device numbers of the protocol controller units seen so far
+        self._unit_device_numbers = {}
 
         ip, port = self._get_ecom_server()
         self.user, self.passwd = self._get_ecom_cred()
@@ -126,6 +144,7 @@ class EMCSMISCommon():
             configservice, ElementName=volumename, InPool=pool,
             ElementType=self._getnum(5, '16'),
             Size=self._getnum(volumesize, '64'))
+        self._invalidate_cim_cache('EMC_StorageVolume')
 
         LOG.debug(_('Create Volume: %(volumename)s  Return code: %(rc)lu')
                   % {'volumename': volumename,
@@ -211,6 +230,7 @@ class EMCSMISCommon():
             ElementName=volumename,
             SyncType=self._getnum(8, '16'),
             SourceElement=snapshot_instance.path)
+        self._invalidate_cim_cache('EMC_StorageVolume')
 
         if rc != 0L:
             rc, errordesc = self._wait_for_job_complete(job)
@@ -335,6 +355,7 @@ class EMCSMISCommon():
             ElementName=volumename,
             SyncType=self._getnum(8, '16'),
             SourceElement=src_instance.path)
+        self._invalidate_cim_cache('EMC_StorageVolume')
 
         if rc != 0L:
             rc, errordesc = self._wait_for_job_complete(job)
@@ -449,6 +470,7 @@ class EMCSMISCommon():
             self.conn.InvokeMethod('EMCReturnToStoragePool',
                                    configservice,
                                    TheElements=[vol_instance.path])
+        self._invalidate_cim_cache('EMC_StorageVolume')
 
         if rc != 0L:
             rc, errordesc = self._wait_for_job_complete(job)
@@ -514,6 +536,7 @@ class EMCSMISCommon():
                                    ElementName=snapshotname,
                                    SyncType=self._getnum(7, '16'),
                                    SourceElement=vol_instance.path)
+        self._invalidate_cim_cache('EMC_StorageVolume')
 
         LOG.debug(_('Create Snapshot: Volume: %(volumename)s  '
                   'Snapshot: %(snapshotname)s  Return code: %(rc)lu')
@@ -586,6 +609,7 @@ class EMCSMISCommon():
                                    repservice,
                                    Operation=self._getnum(19, '16'),
                                    Synchronization=sync_name)
+        self._invalidate_cim_cache('EMC_StorageVolume')
 
         LOG.debug(_('Delete Snapshot: Volume: %(volumename)s  Snapshot: '
                   '%(snapshotname)s  Return code: %(rc)lu')
@@ -659,6 +683,9 @@ class EMCSMISCommon():
                                        configservice, LUNames=[lun_name],
                                        InitiatorPortIDs=initiators,
                                        DeviceAccesses=[self._getnum(2, '16')])
+            # A new storage group may have been created for the initiators
+            self._invalidate_cim_cache('EMC_LunMaskingSCSIProtocolController',
+                                       'EMC_StorageHardwareID')
         else:
             LOG.debug(_('ExposePaths parameter '
                       'LunMaskingSCSIProtocolController: '
@@ -872,10 +899,7 @@ class EMCSMISCommon():
         if filename is None:
             filename = self.configuration.cinder_emc_config_file
 
-        file = open(filename, 'r')
-        data = file.read()
-        file.close()
-        dom = parseString(data)
+        dom = self._get_config_dom(filename)
         storageTypes = dom.getElementsByTagName('StorageType')
         if storageTypes is not None and len(storageTypes) > 0:
             storageType = storageTypes[0].toxml()
@@ -892,10 +916,7 @@ class EMCSMISCommon():
         if filename is None:
             filename = self.configuration.cinder_emc_config_file
 
-        file = open(filename, 'r')
-        data = file.read()
-        file.close()
-        dom = parseString(data)
+        dom = self._get_config_dom(filename)
         views = dom.getElementsByTagName('MaskingView')
         if views is not None and len(views) > 0:
             view = views[0].toxml().replace('<MaskingView>', '')
@@ -910,10 +931,7 @@ class EMCSMISCommon():
         if filename is None:
             filename = self.configuration.cinder_emc_config_file
 
-        file = open(filename, 'r')
-        data = file.read()
-        file.close()
-        dom = parseString(data)
+        dom = self._get_config_dom(filename)
         ecomUsers = dom.getElementsByTagName('EcomUserName')
         if ecomUsers is not None and len(ecomUsers) > 0:
             ecomUser = ecomUsers[0].toxml().replace('<EcomUserName>', '')
@@ -932,10 +950,7 @@ class EMCSMISCommon():
         if filename is None:
             filename = self.configuration.cinder_emc_config_file
 
-        file = open(filename, 'r')
-        data = file.read()
-        file.close()
-        dom = parseString(data)
+        dom = self._get_config_dom(filename)
         ecomIps = dom.getElementsByTagName('EcomServerIp')
         if ecomIps is not None and len(ecomIps) > 0:
             ecomIp = ecomIps[0].toxml().replace('<EcomServerIp>', '')
@@ -952,18 +967,70 @@ class EMCSMISCommon():
             LOG.debug(_("Ecom server not found."))
             return None
 
+    def _get_config_dom(self, filename):
+        """Parse the config file, reusing the result until it changes."""
+        mtime = os.path.getmtime(filename)
+        if (self._config_dom is None or
+                self._config_dom[:2] != (filename, mtime)):
+            file = open(filename, 'r')
+            data = file.read()
+            file.close()
+            self._config_dom = (filename, mtime, parseString(data))
+        return self._config_dom[2]
+
     def _get_ecom_connection(self, filename=None):
+        if self._ecom_conn is not None:
+            return self._ecom_conn
+
         conn = pywbem.WBEMConnection(self.url, (self.user, self.passwd),
                                      default_namespace='root/emc')
         if conn is None:
             exception_message = (_("Cannot connect to ECOM server"))
             raise exception.VolumeBackendAPIException(data=exception_message)
 
+        self._ecom_conn = conn
         return conn
 
+    def _get_cached(self, key, fetch, refresh=False):
+        ttl = self.configuration.emc_cim_cache_ttl
+        entry = self._cim_cache.get(key)
+        if not refresh and entry is not None and time.time() - entry[0] < ttl:
+            return entry[1]
+        value = fetch()
+        if ttl > 0:
+            self._cim_cache[key] = (time.time(), value)
+        return value
+
+    def _enumerate_instance_names(self, classname, refresh=False):
+        """EnumerateInstanceNames, reused for emc_cim_cache_ttl seconds."""
+        return self._get_cached(
+            classname,
+            lambda: self.conn.EnumerateInstanceNames(classname),
+            refresh)
+
+    def _associators(self, objectpath, result_class, refresh=False):
+        """Associators, reused for emc_cim_cache_ttl seconds."""
+        return self._get_cached(
+            (str(objectpath), result_class),
+            lambda: self.conn.Associators(objectpath,
+                                          resultClass=result_class),
+            refresh)
+
+    def _invalidate_cim_cache(self, *classnames):
+        """Forget cached names of, and associations to, the classes.
+
+        Called after our own calls that create or delete such objects.
+        """
+        for key in self._cim_cache.keys():
+            if key in classnames or (isinstance(key, tuple) and
+                                     key[1] in classnames):
+                del self._cim_cache[key]
+        if 'EMC_StorageVolume' in classnames:
+            self._lun_names.clear()
+
     def _find_replication_service(self, storage_system):
         foundRepService = None
-        repservices = self.conn.EnumerateInstanceNames(
+        repservices = self._enumerate_instance_names(
             'EMC_ReplicationService')
         for repservice in repservices:
             if storage_system == repservice['SystemName']:
@@ -976,7 +1043,7 @@ class EMCSMISCommon():
 
     def _find_storage_configuration_service(self, storage_system):
         foundConfigService = None
-        configservices = self.conn.EnumerateInstanceNames(
+        configservices = self._enumerate_instance_names(
             'EMC_StorageConfigurationService')
         for configservice in configservices:
             if storage_system == configservice['SystemName']:
@@ -989,7 +1056,7 @@ class EMCSMISCommon():
 
     def _find_controller_configuration_service(self, storage_system):
         foundConfigService = None
-        configservices = self.conn.EnumerateInstanceNames(
+        configservices = self._enumerate_instance_names(
             'EMC_ControllerConfigurationService')
         for configservice in configservices:
             if storage_system == configservice['SystemName']:
@@ -1002,7 +1069,7 @@ class EMCSMISCommon():
 
     def _find_storage_hardwareid_service(self, storage_system):
         foundConfigService = None
-        configservices = self.conn.EnumerateInstanceNames(
+        configservices = self._enumerate_instance_names(
             'EMC_StorageHardwareIDManagementService')
         for configservice in configservices:
             if storage_system == configservice['SystemName']:
@@ -1020,9 +1087,9 @@ class EMCSMISCommon():
         # Only get instance names if details flag is False;
         # Otherwise get the whole instances
         if details is False:
-            vpools = self.conn.EnumerateInstanceNames(
+            vpools = self._enumerate_instance_names(
                 'EMC_VirtualProvisioningPool')
-            upools = self.conn.EnumerateInstanceNames(
+            upools = self._enumerate_instance_names(
                 'EMC_UnifiedStoragePool')
         else:
             vpools = self.conn.EnumerateInstances(
@@ -1092,23 +1159,24 @@ class EMCSMISCommon():
 
         volumename = volume['name']
 
-        names = self.conn.EnumerateInstanceNames('EMC_StorageVolume')
-
-        for n in names:
-            if device_id is not None:
-                if n['DeviceID'] == device_id:
-                    vol_instance = self.conn.GetInstance(n)
-                    foundinstance = vol_instance
-                    break
-                else:
-                    continue
-
-            else:
-                vol_instance = self.conn.GetInstance(n)
-                if vol_instance['ElementName'] == volumename:
-                    foundinstance = vol_instance
-                    volume['provider_location'] = foundinstance['DeviceID']
-                    break
+        # Cached names miss volumes created elsewhere since, and may still
+        # hold volumes deleted elsewhere; such lookups are retried afresh
+        cached = ('EMC_StorageVolume' in self._cim_cache or
+                  volumename in self._lun_names)
+        try:
+            foundinstance = self._find_lun_instance(device_id, volumename,
+                                                    False)
+        except pywbem.CIMError:
+            if not cached:
+                raise
+            foundinstance = None
+        if foundinstance is None and cached:
+            self._invalidate_cim_cache('EMC_StorageVolume')
+            foundinstance = self._find_lun_instance(device_id, volumename,
+                                                    True)
+
+        if foundinstance is not None and device_id is None:
+            volume['provider_location'] = foundinstance['DeviceID']
 
         if foundinstance is None:
             LOG.debug(_("Volume %(volumename)s not found on the array.")
@@ -1121,6 +1189,25 @@ class EMCSMISCommon():
 
         return foundinstance
 
+    def _find_lun_instance(self, device_id, volumename, refresh):
+        if device_id is None and volumename in self._lun_names:
+            vol_instance = self.conn.GetInstance(self._lun_names[volumename])
+            if vol_instance['ElementName'] == volumename:
+                return vol_instance
+
+        names = self._enumerate_instance_names('EMC_StorageVolume', refresh)
+        for n in names:
+            if device_id is not None:
+                if n['DeviceID'] == device_id:
+                    return self.conn.GetInstance(n)
+            else:
+                vol_instance = self.conn.GetInstance(n)
+                if self.configuration.emc_cim_cache_ttl > 0:
+                    self._lun_names[vol_instance['ElementName']] = n
+                if vol_instance['ElementName'] == volumename:
+                    return vol_instance
+        return None
+
     def _find_storage_sync_sv_sv(self, snapshotname, volumename,
                                  waitforsync=True):
         foundsyncname = None
@@ -1130,6 +1217,8 @@ class EMCSMISCommon():
         LOG.debug(_("Source: %(volumename)s  Target: %(snapshotname)s.")
                   % {'volumename': volumename, 'snapshotname': snapshotname})
 
+        # Never cached: a stale list would make delete_snapshot report a
+        # snapshot as gone while it is left behind on the array.
         names = self.conn.EnumerateInstanceNames(
             'SE_StorageSynchronized_SV_SV')
 
@@ -1160,8 +1249,10 @@ class EMCSMISCommon():
                       % {'storage_system': storage_system,
                          'sync': str(foundsyncname)})
             # Wait for SE_StorageSynchronized_SV_SV to be fully synced
+            interval = JOB_POLL_MIN_INTERVAL
             while waitforsync and percent_synced < 100:
-                time.sleep(10)
+                time.sleep(interval)
+                interval = min(interval * 2, JOB_POLL_MAX_INTERVAL)
                 sync_instance = self.conn.GetInstance(foundsyncname,
                                                       LocalOnly=False)
                 percent_synced = sync_instance['PercentSynced']
@@ -1193,6 +1284,7 @@ class EMCSMISCommon():
     def _wait_for_job_complete(self, job):
         jobinstancename = job['Job']
 
+        interval = JOB_POLL_MIN_INTERVAL
         while True:
             jobinstance = self.conn.GetInstance(jobinstancename,
                                                 LocalOnly=False)
@@ -1205,7 +1297,10 @@ class EMCSMISCommon():
             # Completed, Terminated, Killed, Exception, Service,
             # Query Pending, DMTF Reserved, Vendor Reserved")]
             if jobstate in [2L, 3L, 4L, 32767L]:
-                time.sleep(10)
+                # Short jobs finish in a few seconds, long ones are polled
+                # every JOB_POLL_MAX_INTERVAL seconds
+                time.sleep(interval)
+                interval = min(interval * 2, JOB_POLL_MAX_INTERVAL)
             else:
                 break
 
@@ -1220,14 +1315,12 @@ class EMCSMISCommon():
                                                   connector):
         foundCtrl = None
         initiators = self._find_initiator_names(connector)
-        controllers = self.conn.EnumerateInstanceNames(
+        controllers = self._enumerate_instance_names(
             'EMC_LunMaskingSCSIProtocolController')
         for ctrl in controllers:
             if storage_system != ctrl['SystemName']:
                 continue
-            associators =\
-                self.conn.Associators(ctrl,
-                                      resultClass='EMC_StorageHardwareID')
+            associators = self._associators(ctrl, 'EMC_StorageHardwareID')
             for assoc in associators:
                 # if EMC_StorageHardwareID matches the initiator,
                 # we found the existing EMC_LunMaskingSCSIProtocolController
@@ -1265,10 +1358,7 @@ class EMCSMISCommon():
                 resultClass='EMC_LunMaskingSCSIProtocolController')
 
         for ctrl in controllers:
-            associators =\
-                self.conn.Associators(
-                    ctrl,
-                    resultClass='EMC_StorageHardwareID')
+            associators = self._associators(ctrl, 'EMC_StorageHardwareID')
             for assoc in associators:
                 # if EMC_StorageHardwareID matches the initiator,
                 # we found the existing EMC_LunMaskingSCSIProtocolController
@@ -1340,6 +1430,7 @@ class EMCSMISCommon():
 
         unitnames = self.conn.EnumerateInstanceNames(
             'CIM_ProtocolControllerForUnit')
+        device_numbers = {}
         for unitname in unitnames:
             controller = unitname['Antecedent']
             if storage_system != controller['SystemName']:
@@ -1347,11 +1438,18 @@ class EMCSMISCommon():
             classname = controller['CreationClassName']
             index = classname.find('LunMaskingSCSIProtocolController')
             if index > -1:
-                unitinstance = self.conn.GetInstance(unitname,
-                                                     LocalOnly=False)
-                numDeviceNumber = int(unitinstance['DeviceNumber'])
+                # The device number of an existing unit does not change
+                key = str(unitname)
+                numDeviceNumber = self._unit_device_numbers.get(key)
+                if numDeviceNumber is None:
+                    unitinstance = self.conn.GetInstance(unitname,
+                                                         LocalOnly=False)
+                    numDeviceNumber = int(unitinstance['DeviceNumber'])
+                device_numbers[key] = numDeviceNumber
                 numlist.append(numDeviceNumber)
                 myunitnames.append(unitname)
+        # Units that went away are forgotten
+        self._unit_device_numbers = device_numbers
 
         maxnum = max(numlist)
         out_num_device_number = maxnum + 1
@@ -1425,18 +1523,29 @@ class EMCSMISCommon():
         foundMaskingGroup = None
         maskingview_name = self._get_masking_view()
 
-        maskingviews = self.conn.EnumerateInstanceNames(
-            'EMC_LunMaskingSCSIProtocolController')
-        for view in maskingviews:
-            instance = self.conn.GetInstance(view, LocalOnly=False)
-            if maskingview_name == instance['ElementName']:
-                foundView = view
-                break
+        def _find_masking_group():
+            foundView = None
+            maskingviews = self._enumerate_instance_names(
+                'EMC_LunMaskingSCSIProtocolController')
+            for view in maskingviews:
+                instance = self.conn.GetInstance(view, LocalOnly=False)
+                if maskingview_name == instance['ElementName']:
+                    foundView = view
+                    break
+
+            if foundView is None:
+                exception_message = (_("Cannot find Masking View %s.")
+                                     % maskingview_name)
+                raise exception.VolumeBackendAPIException(
+                    data=exception_message)
+
+            groups = self.conn.AssociatorNames(
+                foundView,
+                ResultClass='SE_DeviceMaskingGroup')
+            return groups[0]
 
-        groups = self.conn.AssociatorNames(
-            foundView,
-            ResultClass='SE_DeviceMaskingGroup')
-        foundMaskingGroup = groups[0]
+        foundMaskingGroup = self._get_cached(
+            (maskingview_name, 'SE_DeviceMaskingGroup'), _find_masking_group)
 
         LOG.debug(_("Masking view: %(view)s DeviceMaskingGroup: %(masking)s.")
                   % {'view': maskingview_name,
@@ -1447,7 +1556,7 @@ class EMCSMISCommon():
     # Find a StorageProcessorSystem given sp and storage system
     def _find_storage_processor_system(self, owningsp, storage_system):
         foundSystem = None
-        systems = self.conn.EnumerateInstanceNames(
+        systems = self._enumerate_instance_names(
             'EMC_StorageProcessorSystem')
         for system in systems:
             # Clar_StorageProcessorSystem.CreationClassName=
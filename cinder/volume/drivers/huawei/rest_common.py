@@ -30,6 +30,7 @@ from cinder.openstack.common import excutils
 from cinder.openstack.common import log as logging
 from cinder import units
 from cinder import utils
+from cinder.volume import driver
 from cinder.volume.drivers.huawei import huawei_utils
 from cinder.volume import volume_types
 
@@ -974,35 +975,41 @@ class HVSCommon():
 
     def _wait_for_luncopy(self, luncopyid):
         """Wait for LUNcopy to complete."""
-        while True:
-            luncopy_info = self._get_luncopy_info(luncopyid)
-            if luncopy_info['status'] == '40':
-                break
-            elif luncopy_info['state'] != '1':
+        driver.get_array_job_tracker().wait(self.url, luncopyid,
+                                            self._poll_luncopies)
+
+    def _poll_luncopies(self, array, luncopy_ids):
+        """Return the finished LUNcopies, polled with one request."""
+        luncopies = self._get_all_luncopy_info()
+        finished = {}
+        for luncopyid in luncopy_ids:
+            luncopy_info = luncopies.get(luncopyid, {})
+            if luncopy_info.get('status') == '40':
+                finished[luncopyid] = None
+            elif luncopy_info.get('state') != '1':
                 err_msg = (_('_wait_for_luncopy:LUNcopy status is not normal.'
                              'LUNcopy name: %(luncopyname)s')
                            % {'luncopyname': luncopyid})
                 LOG.error(err_msg)
-                raise exception.VolumeBackendAPIException(data=err_msg)
-            time.sleep(10)
+                finished[luncopyid] = exception.VolumeBackendAPIException(
+                    data=err_msg)
+        return finished
 
-    def _get_luncopy_info(self, luncopyid):
-        """Get LUNcopy information."""
+    def _get_all_luncopy_info(self):
+        """Get the information of all LUNcopies by ID."""
         url = self.url + "/LUNCOPY?range=[0-100000]"
         data = json.dumps({"TYPE": "219", })
         result = self.call(url, data, "GET")
         self._assert_rest_result(result, 'Get lun copy information error.')
 
-        luncopyinfo = {}
+        luncopies = {}
         if "data" in result:
             for item in result['data']:
-                if luncopyid == item['ID']:
-                    luncopyinfo['name'] = item['NAME']
-                    luncopyinfo['id'] = item['ID']
-                    luncopyinfo['state'] = item['HEALTHSTATUS']
-                    luncopyinfo['status'] = item['RUNNINGSTATUS']
-                    break
-        return luncopyinfo
+                luncopies[item['ID']] = {'name': item['NAME'],
+                                         'id': item['ID'],
+                                         'state': item['HEALTHSTATUS'],
+                                         'status': item['RUNNINGSTATUS']}
+        return luncopies
 
     def _delete_luncopy(self, luncopyid):
         """Delete a LUNcopy."""
@@ -32,6 +32,7 @@ from cinder import exception
 from cinder.openstack.common import excutils
 from cinder.openstack.common import log as logging
 from cinder import utils
+from cinder.volume import driver
 from cinder.volume.drivers.huawei import huawei_utils
 from cinder.volume import volume_types
 
@@ -640,24 +641,37 @@ class TseriesCommon():
 
     def _wait_for_luncopy(self, luncopyname):
         """Wait for LUNcopy to complete."""
-        while True:
-            luncopy_info = self._get_luncopy_info(luncopyname)
+        driver.get_array_job_tracker().wait(self.login_info['ControllerIP0'],
+                                            luncopyname,
+                                            self._poll_luncopies)
+
+    def _poll_luncopies(self, array, luncopy_names):
+        """Return the finished LUNcopies, polled with one CLI command."""
+        luncopies = self._get_all_luncopy_info()
+        finished = {}
+        for luncopyname in luncopy_names:
+            luncopy_info = luncopies.get(luncopyname)
             # If state is complete
-            if luncopy_info[3] == 'Complete':
-                break
+            if luncopy_info and luncopy_info[3] == 'Complete':
+                finished[luncopyname] = None
             # If status is not normal
-            elif luncopy_info[4] != 'Normal':
+            elif not luncopy_info or luncopy_info[4] != 'Normal':
                 err_msg = (_('_wait_for_luncopy: LUNcopy %(luncopyname)s '
                              'status is %(status)s.')
                            % {'luncopyname': luncopyname,
-                              'status': luncopy_info[4]})
+                              'status': (luncopy_info[4] if luncopy_info
+                                         else 'missing')})
                 LOG.error(err_msg)
-                raise exception.VolumeBackendAPIException(data=err_msg)
-
-            time.sleep(10)
+                finished[luncopyname] = exception.VolumeBackendAPIException(
+                    data=err_msg)
+        return finished
 
     def _get_luncopy_info(self, luncopyname):
         """Return a LUNcopy information list."""
+        return self._get_all_luncopy_info().get(luncopyname)
+
+    def _get_all_luncopy_info(self):
+        """Return the information lists of all LUNcopies by name."""
         cli_cmd = 'showluncopy'
         out = self._execute_cli(cli_cmd)
 
@@ -666,11 +680,11 @@ class TseriesCommon():
                              'No LUNcopy information was found.',
                              cli_cmd, out)
 
+        luncopies = {}
         for line in out.split('\r\n')[6:-2]:
             tmp_line = line.split()
-            if tmp_line[0] == luncopyname:
-                return tmp_line
-        return None
+            luncopies[tmp_line[0]] = tmp_line
+        return luncopies
 
     def _delete_luncopy(self, luncopyid):
         """Run CLI command to delete LUNcopy."""
@@ -28,6 +28,7 @@ from cinder.openstack.common import log as logging
 from cinder.openstack.common import loopingcall
 from cinder.openstack.common import strutils
 from cinder import utils
+from cinder.volume import driver
 from cinder.volume.drivers.ibm.storwize_svc import ssh as storwize_ssh
 from cinder.volume import volume_types
 
@@ -539,13 +540,15 @@ class StorwizeHelpers(object):
             LOG.error(msg)
             raise exception.VolumeDriverException(message=msg)
 
-    def run_flashcopy(self, source, target, timeout, full_copy=True):
+    def run_flashcopy(self, source, target, timeout, full_copy=True,
+                      copy_rate=None):
         """Create a FlashCopy mapping from the source to the target."""
         LOG.debug(_('enter: run_flashcopy: execute FlashCopy from source '
                     '%(source)s to target %(target)s') %
                   {'source': source, 'target': target})
 
-        fc_map_id = self.ssh.mkfcmap(source, target, full_copy)
+        fc_map_id = self.ssh.mkfcmap(source, target, full_copy,
+                                     copy_rate=copy_rate)
         self._prepare_fc_map(fc_map_id, timeout)
         self.ssh.startfcmap(fc_map_id)
 
@@ -701,16 +704,31 @@ class StorwizeHelpers(object):
         params = self._get_vdisk_create_params(opts)
         new_copy_id = self.ssh.addvdiskcopy(vdisk, dest_pool, params)
 
-        sync = False
-        while not sync:
-            sync = self.ssh.lsvdiskcopy(vdisk, copy_id=new_copy_id)[0]['sync']
-            if sync == 'yes':
-                sync = True
-            else:
-                greenthread.sleep(10)
+        driver.get_array_job_tracker().wait(state['system_id'],
+                                            (vdisk, new_copy_id),
+                                            self._poll_vdisk_copies)
 
         self.ssh.rmvdiskcopy(vdisk, orig_copy_id)
 
+    def _poll_vdisk_copies(self, system_id, copies):
+        """Return the (vdisk, copy_id) copies that are in sync.
+
+        A copy of a vdisk deleted meanwhile is failed on its own, other
+        errors are raised for the tracker to poll again.
+        """
+        synced = {}
+        for vdisk, copy_id in copies:
+            try:
+                resp = self.ssh.lsvdiskcopy(vdisk, copy_id=copy_id)
+            except exception.VolumeBackendAPIException as e:
+                if self.is_vdisk_defined(vdisk):
+                    raise
+                synced[(vdisk, copy_id)] = e
+                continue
+            if resp[0]['sync'] == 'yes':
+                synced[(vdisk, copy_id)] = None
+        return synced
+
     def migrate_vdisk(self, vdisk, dest_pool):
         self.ssh.migratevdisk(vdisk, dest_pool)
 
@@ -234,11 +234,13 @@ class StorwizeSSH(object):
                    '-vdisk', vdisk]
         self.run_ssh_assert_no_output(ssh_cmd)
 
-    def mkfcmap(self, source, target, full_copy):
+    def mkfcmap(self, source, target, full_copy, copy_rate=None):
         ssh_cmd = ['svctask', 'mkfcmap', '-source', source, '-target',
                    target, '-autodelete']
         if not full_copy:
             ssh_cmd.extend(['-copyrate', '0'])
+        elif copy_rate is not None:
+            ssh_cmd.extend(['-copyrate', copy_rate])
         out, err = self._ssh(ssh_cmd, check_exit_code=False)
         if 'successfully created' not in out:
             msg = (_('CLI Exception output:\n command: %(cmd)s\n '
@@ -19,10 +19,14 @@ NetApp api for ONTAP and OnCommand DFM.
 Contains classes required to issue api calls to ONTAP and OnCommand DFM.
 """
 
+import base64
+import httplib
+import time
+
 from lxml import etree
-import urllib2
 
 from cinder.openstack.common import log as logging
+from cinder.volume import http_pool
 
 LOG = logging.getLogger(__name__)
 
@@ -39,6 +43,8 @@ class NaServer(object):
     NETAPP_NS = 'http://www.netapp.com/filer/admin'
     STYLE_LOGIN_PASSWORD = 'basic_auth'
     STYLE_CERTIFICATE = 'certificate_auth'
+    MAX_CONNECTIONS = 4
+    READ_CHUNK_SIZE = 65536
 
     def __init__(self, host, server_type=SERVER_TYPE_FILER,
                  transport_type=TRANSPORT_TYPE_HTTP,
@@ -51,6 +57,8 @@ class NaServer(object):
         self._username = username
         self._password = password
         self._refresh_conn = True
+        self._pool = None
+        self._api_stats = http_pool.CallStats()
 
     def get_transport_type(self):
         """Get the transport type protocol."""
@@ -147,6 +155,7 @@ class NaServer(object):
             self._timeout = int(seconds)
         except ValueError:
             raise ValueError('timeout in seconds must be integer')
+        self._refresh_conn = True
 
     def get_timeout(self):
         """Gets the timeout in seconds if set."""
@@ -185,20 +194,56 @@ class NaServer(object):
         if na_element and not isinstance(na_element, NaElement):
             ValueError('NaElement must be supplied to invoke api')
         request = self._create_request(na_element, enable_tunneling)
-        if not hasattr(self, '_opener') or not self._opener \
-                or self._refresh_conn:
-            self._build_opener()
+        if self._pool is None or self._refresh_conn:
+            self._build_pool()
+        api_name = na_element.get_name()
+        start = time.time()
         try:
-            if hasattr(self, '_timeout'):
-                response = self._opener.open(request, timeout=self._timeout)
-            else:
-                response = self._opener.open(request)
-        except urllib2.HTTPError as e:
-            raise NaApiError(e.code, e.msg)
+            result = self._send_request(request)
+        except Exception:
+            self._api_stats.record(api_name, time.time() - start,
+                                   failed=True)
+            raise
+        self._api_stats.record(api_name, time.time() - start)
+        return result
+
+    def _send_request(self, request):
+        """Posts the request over a pooled keep-alive connection."""
+        pool = self._pool
+        conn = pool.get()
+        try:
+            headers = dict(self._headers,
+                           **{'Content-Length': len(request)})
+            response = http_pool.post(conn, '/%s' % self._url, request,
+                                      headers)
+            if response.status != httplib.OK:
+                response.read()
+                raise NaApiError(response.status, response.reason)
+            return self._read_result(response)
+        except NaApiError:
+            raise
         except Exception as e:
+            conn.close()
             raise NaApiError('Unexpected error', e)
-        xml = response.read()
-        return self._get_result(xml)
+        finally:
+            pool.put(conn)
+
+    def _read_result(self, response):
+        """Parses the response body while it is being received."""
+        parser = etree.XMLParser()
+        received = False
+        chunk = response.read(self.READ_CHUNK_SIZE)
+        while chunk:
+            received = True
+            parser.feed(chunk)
+            chunk = response.read(self.READ_CHUNK_SIZE)
+        if not received:
+            raise NaApiError('No response received')
+        return NaElement(parser.close()).get_child_by_name('results')
+
+    def get_api_stats(self):
+        """Returns the call count and latency of each api invoked so far."""
+        return self._api_stats.get()
 
     def invoke_successfully(self, na_element, enable_tunneling=False):
         """Invokes api and checks execution status as success.
@@ -228,11 +273,7 @@ class NaServer(object):
         if enable_tunneling:
             self._enable_tunnel_request(netapp_elem)
         netapp_elem.add_child_elem(na_element)
-        request_d = netapp_elem.to_string()
-        request = urllib2.Request(
-            self._get_url(), data=request_d,
-            headers={'Content-Type': 'text/xml', 'charset': 'utf-8'})
-        return request
+        return netapp_elem.to_string()
 
     def _enable_tunnel_request(self, netapp_elem):
         """Enables vserver or vfiler tunneling."""
@@ -255,38 +296,28 @@ class NaServer(object):
                 raise ValueError('ontapi version has to be atleast 1.15'
                                  ' to send request to vserver')
 
-    def _parse_response(self, response):
-        """Get the NaElement for the response."""
-        if not response:
-            raise NaApiError('No response received')
-        xml = etree.XML(response)
-        return NaElement(xml)
-
-    def _get_result(self, response):
-        """Gets the call result."""
-        processed_response = self._parse_response(response)
-        return processed_response.get_child_by_name('results')
-
-    def _get_url(self):
-        return '%s://%s:%s/%s' % (self._protocol, self._host, self._port,
-                                  self._url)
-
-    def _build_opener(self):
+    def _build_pool(self):
+        headers = {'Content-Type': 'text/xml', 'charset': 'utf-8'}
         if self._auth_style == NaServer.STYLE_LOGIN_PASSWORD:
-            auth_handler = self._create_basic_auth_handler()
+            headers.update(self._create_basic_auth_header())
         else:
-            auth_handler = self._create_certificate_auth_handler()
-        opener = urllib2.build_opener(auth_handler)
-        self._opener = opener
-
-    def _create_basic_auth_handler(self):
-        password_man = urllib2.HTTPPasswordMgrWithDefaultRealm()
-        password_man.add_password(None, self._get_url(), self._username,
-                                  self._password)
-        auth_handler = urllib2.HTTPBasicAuthHandler(password_man)
-        return auth_handler
-
-    def _create_certificate_auth_handler(self):
+            headers.update(self._create_certificate_auth_header())
+        if self._pool is not None:
+            self._pool.close()
+        self._headers = headers
+        self._pool = http_pool.HTTPConnectionPool(
+            self._protocol, '%s:%s' % (self._host, self._port),
+            timeout=self.get_timeout(), max_size=self.MAX_CONNECTIONS)
+        self._refresh_conn = False
+
+    def _create_basic_auth_header(self):
+        # Send the credentials up front rather than waiting for a 401
+        # challenge, which would cost a second round trip for every call.
+        credentials = base64.b64encode('%s:%s' % (self._username,
+                                                  self._password))
+        return {'Authorization': 'Basic %s' % credentials}
+
+    def _create_certificate_auth_header(self):
         raise NotImplementedError()
 
     def __str__(self):
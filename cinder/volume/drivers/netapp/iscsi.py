@@ -22,9 +22,12 @@ storage systems with installed iSCSI licenses.
 
 import copy
 import sys
+from threading import Timer
 import time
 import uuid
 
+from eventlet import greenpool
+
 from cinder import exception
 from cinder.openstack.common import excutils
 from cinder.openstack.common import log as logging
@@ -94,6 +97,15 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
         self.configuration.append_config_values(netapp_transport_opts)
         self.configuration.append_config_values(netapp_provisioning_opts)
         self.lun_table = {}
+        # Caches kept alongside lun_table so attach and detach do not
+        # have to query the storage system: initiator to its igroups and
+        # lun path to its lun maps.
+        self.igroup_table = {}
+        self.lun_map_table = {}
+        self.lun_refresh_time = None
+        self.lun_refresh_interval = (
+            self.configuration.netapp_lun_table_refresh_interval)
+        self.lun_refresh_running = False
 
     def _create_client(self, **kwargs):
         """Instantiate a client for NetApp server.
@@ -147,6 +159,7 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
 
         self.lun_table = {}
         self._get_lun_list()
+        self.lun_refresh_time = timeutils.utcnow()
         LOG.debug(_("Success getting LUN list from server"))
 
     def create_volume(self, volume):
@@ -177,7 +190,7 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
             LOG.warn(msg % msg_fmt)
             return
         self._destroy_lun(metadata['Path'])
-        self.lun_table.pop(name)
+        self._remove_lun_from_table(name)
 
     def _destroy_lun(self, path, force=True):
         """Destroys the lun at the path."""
@@ -362,16 +375,22 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
         """Returns lun handle based on filer type."""
         raise NotImplementedError()
 
-    def _get_lun_list(self):
-        """Gets the list of luns on filer."""
+    def _get_lun_list(self, table=None):
+        """Gets the list of luns on filer.
+
+        Populates the lun table, or table if given, and returns the names
+        of the luns found.
+        """
         raise NotImplementedError()
 
-    def _extract_and_populate_luns(self, api_luns):
+    def _extract_and_populate_luns(self, api_luns, table=None):
         """Extracts the luns from api.
 
-        Populates in the lun table.
+        Populates in the lun table, or table if given, and returns the
+        names of the luns.
         """
 
+        names = []
         for lun in api_luns:
             meta_dict = self._create_lun_meta(lun)
             path = lun.get_child_content('path')
@@ -380,7 +399,9 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
             size = lun.get_child_content('size')
             discovered_lun = NetAppLun(handle, name,
                                        size, meta_dict)
-            self._add_lun_to_table(discovered_lun)
+            self._add_lun_to_table(discovered_lun, table)
+            names.append(name)
+        return names
 
     def _is_naelement(self, elem):
         """Checks if element is NetApp element."""
@@ -405,7 +426,9 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
             lun_map.add_new_child('lun-id', lun_id)
         try:
             result = self.client.invoke_successfully(lun_map, True)
-            return result.get_child_content('lun-id-assigned')
+            lun_id = result.get_child_content('lun-id-assigned')
+            self._add_lun_map_to_table(path, igroup_name, lun_id)
+            return lun_id
         except NaApiError as e:
             code = e.code
             message = e.message
@@ -413,20 +436,28 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
             msg_fmt = {'code': code, 'message': message}
             exc_info = sys.exc_info()
             LOG.warn(msg % msg_fmt)
+            # The cached igroup or map may be stale, ask the storage system
+            self.igroup_table.pop(initiator, None)
+            self.lun_map_table.pop(path, None)
             (igroup, lun_id) = self._find_mapped_lun_igroup(path, initiator)
             if lun_id is not None:
+                self._add_lun_map_to_table(path, igroup, lun_id)
                 return lun_id
             else:
                 raise exc_info[0], exc_info[1], exc_info[2]
 
     def _unmap_lun(self, path, initiator):
         """Unmaps a lun from given initiator."""
-        (igroup_name, lun_id) = self._find_mapped_lun_igroup(path, initiator)
+        (igroup_name, lun_id) = self._find_cached_lun_igroup(path, initiator)
+        if igroup_name is None:
+            (igroup_name, lun_id) = self._find_mapped_lun_igroup(path,
+                                                                 initiator)
         lun_unmap = NaElement.create_node_with_children(
             'lun-unmap',
             **{'path': path, 'initiator-group': igroup_name})
         try:
             self.client.invoke_successfully(lun_unmap, True)
+            self._remove_lun_map_from_table(path, igroup_name)
         except NaApiError as e:
             msg = _("Error unmapping lun. Code :%(code)s,"
                     " Message:%(message)s")
@@ -435,7 +466,7 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
             LOG.warn(msg % msg_fmt)
             # if the lun is already unmapped
             if e.code == '13115' or e.code == '9016':
-                pass
+                self._remove_lun_map_from_table(path, igroup_name)
             else:
                 raise exc_info[0], exc_info[1], exc_info[2]
 
@@ -443,6 +474,37 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
         """Find the igroup for mapped lun with initiator."""
         raise NotImplementedError()
 
+    def _find_cached_lun_igroup(self, path, initiator):
+        """Find the igroup for mapped lun with initiator in the cache.
+
+        Returns (None, None) if the cache does not know the mapping.
+        """
+
+        igroups = self.igroup_table.get(initiator)
+        lun_maps = self.lun_map_table.get(path)
+        if igroups and lun_maps:
+            for igroup in igroups:
+                igroup_name = igroup['initiator-group-name']
+                if igroup_name.startswith(self.IGROUP_PREFIX):
+                    for lun_map in lun_maps:
+                        if lun_map['initiator-group'] == igroup_name:
+                            return (igroup_name, lun_map['lun-id'])
+        return (None, None)
+
+    def _add_lun_map_to_table(self, path, igroup_name, lun_id):
+        """Records a lun map made by the driver in the cache."""
+        lun_maps = self.lun_map_table.setdefault(path, [])
+        lun_maps[:] = [m for m in lun_maps
+                       if m['initiator-group'] != igroup_name]
+        lun_maps.append({'initiator-group': igroup_name, 'lun-id': lun_id})
+
+    def _remove_lun_map_from_table(self, path, igroup_name):
+        """Drops a lun map removed by the driver from the cache."""
+        lun_maps = self.lun_map_table.get(path)
+        if lun_maps:
+            lun_maps[:] = [m for m in lun_maps
+                           if m['initiator-group'] != igroup_name]
+
     def _get_or_create_igroup(self, initiator, initiator_type='iscsi',
                               os='default'):
         """Checks for an igroup for an initiator.
@@ -450,7 +512,7 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
         Creates igroup if not found.
         """
 
-        igroups = self._get_igroup_by_initiator(initiator=initiator)
+        igroups = self._get_cached_igroups(initiator)
         igroup_name = None
         for igroup in igroups:
             if igroup['initiator-group-os-type'] == os:
@@ -464,12 +526,23 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
             igroup_name = self.IGROUP_PREFIX + str(uuid.uuid4())
             self._create_igroup(igroup_name, initiator_type, os)
             self._add_igroup_initiator(igroup_name, initiator)
+            igroups.append({'initiator-group-os-type': os,
+                            'initiator-group-type': initiator_type,
+                            'initiator-group-name': igroup_name})
         return igroup_name
 
     def _get_igroup_by_initiator(self, initiator):
         """Get igroups by initiator."""
         raise NotImplementedError()
 
+    def _get_cached_igroups(self, initiator):
+        """Get igroups by initiator, querying only on a cache miss."""
+        igroups = self.igroup_table.get(initiator)
+        if igroups is None:
+            igroups = self._get_igroup_by_initiator(initiator=initiator)
+            self.igroup_table[initiator] = igroups
+        return igroups
+
     def _check_allowed_os(self, os):
         """Checks if the os type supplied is NetApp supported."""
         if os in ['linux', 'aix', 'hpux', 'windows', 'solaris',
@@ -505,26 +578,87 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
             return None
         return volume_type['name']
 
-    def _add_lun_to_table(self, lun):
+    def _add_lun_to_table(self, lun, table=None):
         """Adds LUN to cache table."""
         if not isinstance(lun, NetAppLun):
             msg = _("Object is not a NetApp LUN.")
             raise exception.VolumeBackendAPIException(data=msg)
-        self.lun_table[lun.name] = lun
+        if table is None:
+            table = self.lun_table
+        table[lun.name] = lun
+
+    def _remove_lun_from_table(self, name):
+        """Removes LUN from cache table."""
+        lun = self.lun_table.pop(name, None)
+        if lun:
+            self.lun_map_table.pop(lun.get_metadata_property('Path'), None)
 
     def _get_lun_from_table(self, name):
         """Gets LUN from cache table.
 
-        Refreshes cache if lun not found in cache.
+        Looks the lun up on the filer if not found in cache.
         """
         lun = self.lun_table.get(name)
         if lun is None:
-            self._get_lun_list()
+            self._find_lun(name)
             lun = self.lun_table.get(name)
             if lun is None:
                 raise exception.VolumeNotFound(volume_id=name)
         return lun
 
+    def _find_lun(self, name):
+        """Looks up a lun missing from the cache table on the filer."""
+        self._get_lun_list()
+
+    def _refresh_lun_table(self, synchronous=False):
+        """Reconciles the lun table if it is older than the interval."""
+        if self.lun_refresh_time is None or self.lun_refresh_running:
+            return
+        if timeutils.is_newer_than(self.lun_refresh_time,
+                                   self.lun_refresh_interval):
+            if synchronous:
+                self._reconcile_lun_table()
+            else:
+                t = Timer(0, self._reconcile_lun_table)
+                t.start()
+
+    def _reconcile_lun_table(self):
+        """Brings the cache tables in line with the filer.
+
+        Luns found on the filer are added or updated, luns that went away
+        are dropped and the igroup and lun map caches are emptied so they
+        are refilled on demand. The new lun table is built separately and
+        swapped in once complete, since attach, detach, create and delete
+        carry on using the tables while the filer is scanned.
+        """
+
+        if not set_safe_attr(self, 'lun_refresh_running', True):
+            LOG.warn(_("Lun table refresh already running. Returning..."))
+            return
+        try:
+            known = set(self.lun_table)
+            found = {}
+            self._get_lun_list(table=found)
+            lun_table = self.lun_table
+            for name in known - set(found):
+                LOG.debug(_("Lun %s no longer on filer, dropping it from "
+                            "lun table.") % name)
+            for name in known - set(lun_table):
+                # Deleted while the filer was being scanned
+                found.pop(name, None)
+            for name, lun in lun_table.items():
+                if name not in known and name not in found:
+                    # Created after the scan had passed it
+                    found[name] = lun
+            self.lun_table = found
+            self.igroup_table = {}
+            self.lun_map_table = {}
+            self.lun_refresh_time = timeutils.utcnow()
+        except Exception as e:
+            LOG.warn(_("Error refreshing lun table. Message: %s"), e)
+        finally:
+            set_safe_attr(self, 'lun_refresh_running', False)
+
     def _clone_lun(self, name, new_name, space_reserved='true',
                    start_block=0, end_block=0, block_count=0):
         """Clone LUN with the given name to the new name."""
@@ -695,6 +829,8 @@ class NetAppDirectISCSIDriver(driver.ISCSIDriver):
             try:
                 self._clone_lun(name, new_lun, block_count=block_count)
                 self._post_sub_clone_resize(path)
+                # The clone now lives at the original path under the old name
+                self.lun_table.pop(new_lun, None)
             except Exception:
                 with excutils.save_and_reraise_exception():
                     new_path = '/vol/%s/%s' % (vol_name, new_lun)
@@ -845,12 +981,13 @@ class NetAppDirectCmodeISCSIDriver(NetAppDirectISCSIDriver):
         """Returns lun handle based on filer type."""
         return '%s:%s' % (self.vserver, metadata['Path'])
 
-    def _get_lun_list(self):
+    def _get_lun_list(self, table=None):
         """Gets the list of luns on filer.
 
         Gets the luns from cluster with vserver.
         """
 
+        names = []
         tag = None
         while True:
             api = NaElement('lun-get-iter')
@@ -866,15 +1003,28 @@ class NetAppDirectCmodeISCSIDriver(NetAppDirectISCSIDriver):
             if result.get_child_by_name('num-records') and\
                     int(result.get_child_content('num-records')) >= 1:
                 attr_list = result.get_child_by_name('attributes-list')
-                self._extract_and_populate_luns(attr_list.get_children())
+                names.extend(self._extract_and_populate_luns(
+                    attr_list.get_children(), table))
             tag = result.get_child_content('next-tag')
             if tag is None:
                 break
+        return names
+
+    def _find_lun(self, name):
+        """Looks up a lun missing from the cache table on the filer."""
+        luns = self._get_lun_by_args(vserver=self.vserver,
+                                     path='/vol/*/%s' % name)
+        luns = [lun for lun in luns
+                if lun.get_child_content('path').rpartition('/')[2] == name]
+        self._extract_and_populate_luns(luns)
 
     def _find_mapped_lun_igroup(self, path, initiator, os=None):
         """Find the igroup for mapped lun with initiator."""
-        initiator_igroups = self._get_igroup_by_initiator(initiator=initiator)
+        initiator_igroups = self._get_cached_igroups(initiator)
         lun_maps = self._get_lun_map(path)
+        self.lun_map_table[path] = [
+            {'initiator-group': m['initiator-group'], 'lun-id': m['lun-id']}
+            for m in lun_maps]
         if initiator_igroups and lun_maps:
             for igroup in initiator_igroups:
                 igroup_name = igroup['initiator-group-name']
@@ -1003,6 +1153,8 @@ class NetAppDirectCmodeISCSIDriver(NetAppDirectISCSIDriver):
         query.add_node_with_children('lun-info', **args)
         luns = self.client.invoke_successfully(lun_iter)
         attr_list = luns.get_child_by_name('attributes-list')
+        if attr_list is None:
+            return []
         return attr_list.get_children()
 
     def _create_lun_meta(self, lun):
@@ -1045,6 +1197,7 @@ class NetAppDirectCmodeISCSIDriver(NetAppDirectISCSIDriver):
         data['QoS_support'] = False
         self._update_cluster_vol_stats(data)
         provide_ems(self, self.client, data, netapp_backend)
+        self._refresh_lun_table()
         self._stats = data
 
     def _update_cluster_vol_stats(self, data):
@@ -1260,22 +1413,27 @@ class NetAppDirect7modeISCSIDriver(NetAppDirectISCSIDriver):
             owner = self.configuration.netapp_server_hostname
         return '%s:%s' % (owner, metadata['Path'])
 
-    def _get_lun_list(self):
+    def _get_lun_list(self, table=None):
         """Gets the list of luns on filer."""
         lun_list = []
         if self.volume_list:
-            for vol in self.volume_list:
-                try:
-                    luns = self._get_vol_luns(vol)
-                    if luns:
-                        lun_list.extend(luns)
-                except NaApiError:
-                    LOG.warn(_("Error finding luns for volume %s."
-                               " Verify volume exists.") % (vol))
+            # List the volumes concurrently over the client's connections
+            pool = greenpool.GreenPool(NaServer.MAX_CONNECTIONS)
+            for luns in pool.imap(self._find_vol_luns, self.volume_list):
+                lun_list.extend(luns)
         else:
             luns = self._get_vol_luns(None)
             lun_list.extend(luns)
-        self._extract_and_populate_luns(lun_list)
+        return self._extract_and_populate_luns(lun_list, table)
+
+    def _find_vol_luns(self, vol_name):
+        """Gets the luns for a volume, logging volumes that fail."""
+        try:
+            return self._get_vol_luns(vol_name) or []
+        except NaApiError:
+            LOG.warn(_("Error finding luns for volume %s."
+                       " Verify volume exists.") % (vol_name))
+            return []
 
     def _get_vol_luns(self, vol_name):
         """Gets the luns for a volume."""
@@ -1430,6 +1588,7 @@ class NetAppDirect7modeISCSIDriver(NetAppDirectISCSIDriver):
         self._get_capacity_info(data)
         provide_ems(self, self.client, data, netapp_backend,
                     server_type="7mode")
+        self._refresh_lun_table()
         self._stats = data
 
     def _get_lun_block_count(self, path):
@@ -82,7 +82,13 @@ netapp_provisioning_opts = [
                      'restrict provisioning to the specified controller '
                      'volumes. Specify the value of this option to be a '
                      'comma separated list of NetApp controller volume names '
-                     'to be used for provisioning.')), ]
+                     'to be used for provisioning.')),
+    cfg.IntOpt('netapp_lun_table_refresh_interval',
+               default=1800,
+               help=('This option is only utilized when the storage protocol '
+                     'is configured to use iSCSI. It specifies the number of '
+                     'seconds after which the cached LUN, igroup and LUN map '
+                     'details are reconciled with the storage system.')), ]
 
 netapp_cluster_opts = [
     cfg.StrOpt('netapp_vserver',
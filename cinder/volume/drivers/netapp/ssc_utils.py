@@ -17,9 +17,10 @@
 Storage service catalog utility functions and classes for NetApp systems.
 """
 
-import copy
 from threading import Timer
 
+from eventlet import greenpool
+
 from cinder import exception
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import timeutils
@@ -94,24 +95,43 @@ class NetAppVolume(object):
         return vol_str
 
 
-def get_cluster_vols_with_ssc(na_server, vserver, volume=None):
-    """Gets ssc vols for cluster vserver."""
-    volumes = query_cluster_vols_for_ssc(na_server, vserver, volume)
-    sis_vols = get_sis_vol_dict(na_server, vserver, volume)
-    mirrored_vols = get_snapmirror_vol_dict(na_server, vserver, volume)
-    aggrs = {}
+# Attributes of a volume that the storage service catalog indexes by value
+SSC_SPEC_ATTRS = {'netapp:raid_type': ('aggr', 'raid_type'),
+                  'netapp:disk_type': ('aggr', 'disk_type'),
+                  'netapp:qos_policy_group': ('qos', 'qos_policy_group')}
+
+
+def get_cluster_vols_with_ssc(na_server, vserver, volume=None, aggrs=None):
+    """Gets ssc vols for cluster vserver.
+
+        The volume, sis and snapmirror queries run concurrently, as do the
+        queries for each aggregate hosting the volumes. Aggregates already
+        present in aggrs are not queried again; aggrs is updated in place.
+    """
+
+    pool = greenpool.GreenPool(api.NaServer.MAX_CONNECTIONS)
+    vols_job = pool.spawn(query_cluster_vols_for_ssc, na_server, vserver,
+                          volume)
+    sis_job = pool.spawn(get_sis_vol_dict, na_server, vserver, volume)
+    mirror_job = pool.spawn(get_snapmirror_vol_dict, na_server, vserver,
+                            volume)
+    volumes = vols_job.wait()
+    sis_vols = sis_job.wait()
+    mirrored_vols = mirror_job.wait()
+    if aggrs is None:
+        aggrs = {}
+    aggr_names = set(vol.aggr['name'] for vol in volumes
+                     if vol.aggr['name'] and vol.aggr['name'] not in aggrs)
+    aggr_names = list(aggr_names)
+    for aggr_name, aggr_attrs in zip(
+            aggr_names,
+            pool.imap(lambda name: query_aggr_attrs(na_server, name),
+                      aggr_names)):
+        aggrs[aggr_name] = aggr_attrs
     for vol in volumes:
         aggr_name = vol.aggr['name']
         if aggr_name:
-            if aggr_name in aggrs:
-                aggr_attrs = aggrs[aggr_name]
-            else:
-                aggr_attrs = query_aggr_options(na_server, aggr_name)
-                if aggr_attrs:
-                    eff_disk_type = query_aggr_storage_disk(na_server,
-                                                            aggr_name)
-                    aggr_attrs['disk_type'] = eff_disk_type
-                aggrs[aggr_name] = aggr_attrs
+            aggr_attrs = aggrs[aggr_name]
             vol.aggr['raid_type'] = aggr_attrs.get('raid_type')
             vol.aggr['ha_policy'] = aggr_attrs.get('ha_policy')
             vol.aggr['disk_type'] = aggr_attrs.get('disk_type')
@@ -244,6 +264,15 @@ def create_vol_list(vol_attrs):
     return vols
 
 
+def query_aggr_attrs(na_server, aggr_name):
+    """Queries cluster aggr for its raid type, ha policy and disk type."""
+    aggr_attrs = query_aggr_options(na_server, aggr_name)
+    if aggr_attrs:
+        aggr_attrs['disk_type'] = query_aggr_storage_disk(na_server,
+                                                          aggr_name)
+    return aggr_attrs
+
+
 def query_aggr_options(na_server, aggr_name):
     """Queries cluster aggr for attributes.
 
@@ -383,6 +412,17 @@ def query_aggr_storage_disk(na_server, aggr):
 def get_cluster_ssc(na_server, vserver):
     """Provides cluster volumes with ssc."""
     netapp_volumes = get_cluster_vols_with_ssc(na_server, vserver)
+    return create_ssc_map(netapp_volumes)
+
+
+def create_ssc_map(netapp_volumes):
+    """Creates the ssc map of feature to volume set for the volumes.
+
+        Besides the boolean features the map holds a set per value of
+        each attribute in SSC_SPEC_ATTRS, keyed '<spec>:<lowercase value>',
+        so that volumes can be shortlisted for specs without scanning them.
+    """
+
     mirror_vols = set()
     dedup_vols = set()
     compress_vols = set()
@@ -399,9 +439,26 @@ def get_cluster_ssc(na_server, vserver):
             mirror_vols.add(vol)
         if vol.space.get('thin_provisioned'):
             thin_prov_vols.add(vol)
+        for spec, (group, attr) in SSC_SPEC_ATTRS.items():
+            value = getattr(vol, group).get(attr)
+            if value:
+                key = '%s:%s' % (spec, value.lower())
+                ssc_map.setdefault(key, set()).add(vol)
     return ssc_map
 
 
+def get_aggr_attrs_from_vols(netapp_volumes):
+    """Collects the known aggregate attributes of the volumes."""
+    aggrs = {}
+    for vol in netapp_volumes:
+        aggr_name = vol.aggr.get('name')
+        if aggr_name and aggr_name not in aggrs:
+            aggrs[aggr_name] = {'raid_type': vol.aggr.get('raid_type'),
+                                'ha_policy': vol.aggr.get('ha_policy'),
+                                'disk_type': vol.aggr.get('disk_type')}
+    return aggrs
+
+
 def refresh_cluster_stale_ssc(*args, **kwargs):
     """Refreshes stale ssc volumes with latest."""
     backend = args[0]
@@ -417,41 +474,28 @@ def refresh_cluster_stale_ssc(*args, **kwargs):
 
         @utils.synchronized(lock_pr)
         def refresh_stale_ssc():
-                stale_vols = backend._update_stale_vols(reset=True)
+                stale_vols = list(backend._update_stale_vols(reset=True))
                 LOG.info(_('Running stale ssc refresh job for %(server)s'
                            ' and vserver %(vs)s')
                          % {'server': na_server, 'vs': vserver})
                 # refreshing single volumes can create inconsistency
-                # hence doing manipulations on copy
-                ssc_vols_copy = copy.deepcopy(backend.ssc_vols)
-                refresh_vols = set()
-                expired_vols = set()
-                for vol in stale_vols:
-                    name = vol.id['name']
-                    res = get_cluster_vols_with_ssc(na_server, vserver, name)
+                # hence building a new map from a copy of the volume set
+                all_vols = set(backend.ssc_vols['all'])
+                # Only the stale volumes are queried again, reusing the
+                # attributes of the aggregates already known.
+                aggrs = get_aggr_attrs_from_vols(all_vols)
+                pool = greenpool.GreenPool(api.NaServer.MAX_CONNECTIONS)
+
+                def _query_vol(vol):
+                    return get_cluster_vols_with_ssc(
+                        na_server, vserver, vol.id['name'], aggrs)
+
+                for vol, res in zip(stale_vols,
+                                    pool.imap(_query_vol, stale_vols)):
+                    all_vols.discard(vol)
                     if res:
-                        refresh_vols.add(res.pop())
-                    else:
-                        expired_vols.add(vol)
-                for vol in refresh_vols:
-                    for k in ssc_vols_copy:
-                        vol_set = ssc_vols_copy[k]
-                        vol_set.discard(vol)
-                        if k == "mirrored" and vol.mirror.get('mirrored'):
-                            vol_set.add(vol)
-                        if k == "dedup" and vol.sis.get('dedup'):
-                            vol_set.add(vol)
-                        if k == "compression" and vol.sis.get('compression'):
-                            vol_set.add(vol)
-                        if k == "thin" and vol.space.get('thin_provisioned'):
-                            vol_set.add(vol)
-                        if k == "all":
-                            vol_set.add(vol)
-                for vol in expired_vols:
-                    for k in ssc_vols_copy:
-                        vol_set = ssc_vols_copy[k]
-                        vol_set.discard(vol)
-                backend.refresh_ssc_vols(ssc_vols_copy)
+                        all_vols.add(res.pop())
+                backend.refresh_ssc_vols(create_ssc_map(all_vols))
                 LOG.info(_('Successfully completed stale refresh job for'
                            ' %(server)s and vserver %(vs)s')
                          % {'server': na_server, 'vs': vserver})
@@ -526,14 +570,31 @@ def refresh_cluster_ssc(backend, na_server, vserver, synchronous=False):
                 t.start()
 
 
+def _get_volumes_for_spec_value(ssc_vols, spec, value):
+    """Gets the volumes whose attribute for spec has the value.
+
+        Uses the index in the ssc map, falling back to checking each
+        volume for maps not built by create_ssc_map.
+    """
+
+    prefix = '%s:' % spec
+    value = value.lower()
+    if any(key.startswith(prefix) for key in ssc_vols):
+        return ssc_vols.get(prefix + value, set())
+    (group, attr) = SSC_SPEC_ATTRS[spec]
+    vols = set()
+    for vol in ssc_vols['all']:
+        vol_value = getattr(vol, group).get(attr)
+        if vol_value and vol_value.lower() == value:
+            vols.add(vol)
+    return vols
+
+
 def get_volumes_for_specs(ssc_vols, specs):
     """Shortlists volumes for extra specs provided."""
     if specs is None or not isinstance(specs, dict):
         return ssc_vols['all']
-    result = copy.deepcopy(ssc_vols['all'])
-    raid_type = specs.get('netapp:raid_type')
-    disk_type = specs.get('netapp:disk_type')
-    qos_policy_group = specs.get('netapp:qos_policy_group')
+    result = set(ssc_vols['all'])
     bool_specs_list = ['netapp_mirrored', 'netapp_unmirrored',
                        'netapp_dedup', 'netapp_nodedup',
                        'netapp_compression', 'netapp_nocompression',
@@ -582,24 +643,10 @@ def get_volumes_for_specs(ssc_vols, specs):
             result = result & ssc_vols['thin']
         else:
             result = result - ssc_vols['thin']
-    if raid_type or disk_type or qos_policy_group:
-        tmp = copy.deepcopy(result)
-        for vol in tmp:
-            if raid_type:
-                vol_raid = vol.aggr['raid_type']
-                vol_raid = vol_raid.lower() if vol_raid else None
-                if raid_type.lower() != vol_raid:
-                    result.discard(vol)
-            if disk_type:
-                vol_dtype = vol.aggr['disk_type']
-                vol_dtype = vol_dtype.lower() if vol_dtype else None
-                if disk_type.lower() != vol_dtype:
-                    result.discard(vol)
-            if qos_policy_group:
-                vol_qos = vol.qos['qos_policy_group']
-                vol_qos = vol_qos.lower() if vol_qos else None
-                if qos_policy_group.lower() != vol_qos:
-                    result.discard(vol)
+    for spec in sorted(SSC_SPEC_ATTRS):
+        if specs.get(spec):
+            result = result & _get_volumes_for_spec_value(ssc_vols, spec,
+                                                          specs[spec])
     return result
 
 
@@ -21,24 +21,71 @@
 .. moduleauthor:: Victor Rodionov <victor.rodionov@nexenta.com>
 """
 
-import urllib2
+import time
+
+from eventlet import greenpool
 
 from cinder.openstack.common import jsonutils
 from cinder.openstack.common import log as logging
 from cinder.volume.drivers import nexenta
+from cinder.volume import http_pool
 
 LOG = logging.getLogger(__name__)
 
+# Connections kept open to each NMS server, also the width of batch()
+MAX_CONNECTIONS = 4
+
 
 class NexentaJSONException(nexenta.NexentaException):
     pass
 
 
+class NexentaJSONTransport(object):
+    """Connections and call statistics shared by the proxies of a server."""
+
+    def __init__(self, scheme, host, port):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.pool = http_pool.HTTPConnectionPool(scheme, host, port,
+                                                 max_size=MAX_CONNECTIONS)
+        self.stats = http_pool.CallStats()
+
+    def switch_scheme(self, scheme):
+        self.pool.close()
+        self.scheme = scheme
+        self.pool = http_pool.HTTPConnectionPool(scheme, self.host, self.port,
+                                                 max_size=MAX_CONNECTIONS)
+
+    def post(self, path, data, headers):
+        """Posts data over a pooled connection, returns the response.
+
+        The body of the response is read before the connection is given
+        back to the pool.
+        """
+        pool = self.pool
+        connection = pool.get()
+        try:
+            try:
+                response = http_pool.post(connection, path, data, headers)
+                body = response.read()
+            except Exception:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            return response, body
+        finally:
+            pool.put(connection)
+
+
 class NexentaJSONProxy(object):
 
     def __init__(self, scheme, host, port, path, user, password, auto=False,
-                 obj=None, method=None):
-        self.scheme = scheme.lower()
+                 obj=None, method=None, transport=None):
+        if transport is None:
+            transport = NexentaJSONTransport(scheme.lower(), host, port)
+        self.transport = transport
         self.host = host
         self.port = port
         self.path = path
@@ -57,7 +104,11 @@ class NexentaJSONProxy(object):
             obj, method = '%s.%s' % (self.obj, self.method), name
         return NexentaJSONProxy(self.scheme, self.host, self.port, self.path,
                                 self.user, self.password, self.auto, obj,
-                                method)
+                                method, transport=self.transport)
+
+    @property
+    def scheme(self):
+        return self.transport.scheme
 
     @property
     def url(self):
@@ -69,6 +120,10 @@ class NexentaJSONProxy(object):
     def __repr__(self):
         return 'NMS proxy: %s' % self.url
 
+    def get_api_stats(self):
+        """Returns the call count and latency of each NMS method called."""
+        return self.transport.stats.get()
+
     def __call__(self, *args):
         data = jsonutils.dumps({
             'object': self.obj,
@@ -80,21 +135,52 @@ class NexentaJSONProxy(object):
             'Content-Type': 'application/json',
             'Authorization': 'Basic %s' % auth
         }
+        name = '.'.join(part for part in (self.obj, self.method) if part)
         LOG.debug(_('Sending JSON data: %s'), data)
-        request = urllib2.Request(self.url, data, headers)
-        response_obj = urllib2.urlopen(request)
-        if response_obj.info().status == 'EOF in headers':
+        start = time.time()
+        try:
+            response_data = self._post(data, headers)
+            LOG.debug(_('Got response: %s'), response_data)
+            response = jsonutils.loads(response_data)
+            if response.get('error') is not None:
+                raise NexentaJSONException(
+                    response['error'].get('message', ''))
+        except Exception:
+            self.transport.stats.record(name, time.time() - start,
+                                        failed=True)
+            raise
+        self.transport.stats.record(name, time.time() - start)
+        return response.get('result')
+
+    def _post(self, data, headers):
+        response, response_data = self.transport.post(self.path, data,
+                                                      headers)
+        if response.msg.status == 'EOF in headers':
             if not self.auto or self.scheme != 'http':
                 LOG.error(_('No headers in server response'))
                 raise NexentaJSONException(_('Bad response from server'))
             LOG.info(_('Auto switching to HTTPS connection to %s'), self.url)
-            self.scheme = 'https'
-            request = urllib2.Request(self.url, data, headers)
-            response_obj = urllib2.urlopen(request)
-
-        response_data = response_obj.read()
-        LOG.debug(_('Got response: %s'), response_data)
-        response = jsonutils.loads(response_data)
-        if response.get('error') is not None:
-            raise NexentaJSONException(response['error'].get('message', ''))
-        return response.get('result')
+            self.transport.switch_scheme('https')
+            response, response_data = self.transport.post(self.path, data,
+                                                          headers)
+        return response_data
+
+
+def _call(call):
+    method, args = call
+    try:
+        return method(*args)
+    except Exception as exc:
+        return exc
+
+
+def batch(calls):
+    """Runs independent NMS calls concurrently.
+
+    :param calls: list of (method, args) tuples, the method usually being
+        an NMS proxy such as nms.folder.get_child_props
+    :return: list with the result of each call, or the exception it raised,
+        in the order of calls
+    """
+    pool = greenpool.GreenPool(MAX_CONNECTIONS)
+    return list(pool.imap(_call, calls))
@@ -35,7 +35,7 @@ from cinder.volume.drivers.nexenta import options
 from cinder.volume.drivers.nexenta import utils
 from cinder.volume.drivers import nfs
 
-VERSION = '1.1.3'
+VERSION = '1.1.4'
 LOG = logging.getLogger(__name__)
 
 
@@ -50,6 +50,8 @@ class NexentaNfsDriver(nfs.NfsDriver):  # pylint: disable=R0921
                 delete_snapshot method.
         1.1.3 - Redefined volume_backend_name attribute inherited from
                 RemoteFsDriver.
+        1.1.4 - Shares of an appliance use one pooled NMS connection, share
+                capacity is probed concurrently.
     """
 
     driver_prefix = 'nexenta'
@@ -64,6 +66,7 @@ class NexentaNfsDriver(nfs.NfsDriver):  # pylint: disable=R0921
         conf = self.configuration
         self.nms_cache_volroot = conf.nexenta_nms_cache_volroot
         self._nms2volroot = {}
+        self._url2nms = {}
         self.share2nms = {}
 
     def do_setup(self, context):
@@ -405,12 +408,84 @@ class NexentaNfsDriver(nfs.NfsDriver):  # pylint: disable=R0921
         allocated = utils.str2size(folder_props['used'])
         return free + allocated, free, allocated
 
+    def _probe_shares_capacity(self, shares):
+        """Returns the capacity info of the shares, probed concurrently.
+
+        Shares that could not be probed are asked for again, so that the
+        error is raised to the caller.
+        """
+        shares = list(shares)
+        results = jsonrpc.batch([(self._get_capacity_info, (share,))
+                                 for share in shares])
+        capacity = {}
+        for share, result in zip(shares, results):
+            if isinstance(result, Exception):
+                result = self._get_capacity_info(share)
+            capacity[share] = result
+        return capacity
+
+    def _update_volume_stats(self):
+        """Retrieve stats info, probing the shares concurrently."""
+        data = {}
+        backend_name = self.configuration.safe_get('volume_backend_name')
+        data['volume_backend_name'] = backend_name or self.volume_backend_name
+        data['vendor_name'] = 'Open Source'
+        data['driver_version'] = self.get_version()
+        data['storage_protocol'] = self.driver_volume_type
+
+        self._ensure_shares_mounted()
+
+        global_capacity = 0
+        global_free = 0
+        capacity = self._probe_shares_capacity(self._mounted_shares)
+        for share in self._mounted_shares:
+            total, free, used = capacity[share]
+            global_capacity += total
+            global_free += free
+
+        data['total_capacity_gb'] = global_capacity / float(units.GiB)
+        data['free_capacity_gb'] = global_free / float(units.GiB)
+        data['reserved_percentage'] = 0
+        data['QoS_support'] = False
+        self._stats = data
+
+    def _find_share(self, volume_size_in_gib):
+        """Choose the share with the least allocated space for a volume.
+
+        The capacity of all shares is probed concurrently first.
+
+        :param volume_size_in_gib: int size in GB
+        """
+        if not self._mounted_shares:
+            raise exception.NfsNoSharesMounted()
+
+        capacity = self._probe_shares_capacity(self._mounted_shares)
+        target_share = None
+        target_share_reserved = 0
+        for nfs_share in self._mounted_shares:
+            if not self._is_share_eligible(nfs_share, volume_size_in_gib,
+                                           capacity[nfs_share]):
+                continue
+            total_allocated = capacity[nfs_share][2]
+            if target_share is None or target_share_reserved > total_allocated:
+                target_share = nfs_share
+                target_share_reserved = total_allocated
+
+        if target_share is None:
+            raise exception.NfsNoSuitableShareFound(
+                volume_size=volume_size_in_gib)
+
+        LOG.debug(_('Selected %s as target nfs share.'), target_share)
+        return target_share
+
     def _get_nms_for_url(self, url):
         """Returns initialized nms object for url."""
-        auto, scheme, user, password, host, port, path =\
-            utils.parse_nms_url(url)
-        return jsonrpc.NexentaJSONProxy(scheme, host, port, path, user,
-                                        password, auto=auto)
+        if url not in self._url2nms:
+            auto, scheme, user, password, host, port, path =\
+                utils.parse_nms_url(url)
+            self._url2nms[url] = jsonrpc.NexentaJSONProxy(
+                scheme, host, port, path, user, password, auto=auto)
+        return self._url2nms[url]
 
     def _get_snapshot_volume(self, snapshot):
         ctxt = context.get_admin_context()
@@ -494,7 +494,8 @@ class NfsDriver(RemoteFsDriver):
 
         return target_share
 
-    def _is_share_eligible(self, nfs_share, volume_size_in_gib):
+    def _is_share_eligible(self, nfs_share, volume_size_in_gib,
+                           capacity_info=None):
         """Verifies NFS share is eligible to host volume with given size.
 
         First validation step: ratio of actual space (used_space / total_space)
@@ -506,14 +507,17 @@ class NfsDriver(RemoteFsDriver):
 
         :param nfs_share: nfs share
         :param volume_size_in_gib: int size in GB
+        :param capacity_info: capacity info of the share if already known,
+                              as returned by _get_capacity_info
         """
 
         used_ratio = self.configuration.nfs_used_ratio
         oversub_ratio = self.configuration.nfs_oversub_ratio
         requested_volume_size = volume_size_in_gib * units.GiB
 
-        total_size, total_available, total_allocated = \
-            self._get_capacity_info(nfs_share)
+        if capacity_info is None:
+            capacity_info = self._get_capacity_info(nfs_share)
+        total_size, total_available, total_allocated = capacity_info
         apparent_size = max(0, total_size * oversub_ratio)
         apparent_available = max(0, apparent_size - total_allocated)
         used = (total_size - total_available) / total_size
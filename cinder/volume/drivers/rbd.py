@@ -18,8 +18,12 @@ import io
 import json
 import os
 import tempfile
+import time
 import urllib
 
+import eventlet
+from eventlet import greenthread
+from eventlet import semaphore
 from oslo.config import cfg
 
 from cinder import exception
@@ -68,8 +72,28 @@ rbd_opts = [
                     'volume before enforcing a flatten prior to next clone. '
                     'A value of zero disables cloning')]
 
+rados_pool_opts = [
+    cfg.IntOpt('rados_connection_pool_size',
+               default=10,
+               help='maximum number of RADOS connections kept open by a '
+                    'process for use by the rbd volume and ceph backup '
+                    'drivers. A value of zero disables connection pooling'),
+    cfg.IntOpt('rados_connection_health_check_interval',
+               default=60,
+               help='number of seconds a pooled RADOS connection may be idle '
+                    'before it is checked for health prior to reuse'),
+    cfg.IntOpt('rados_connect_retries',
+               default=3,
+               help='number of times to retry connecting to the Ceph cluster '
+                    'before giving up'),
+    cfg.IntOpt('rados_connect_retry_interval',
+               default=1,
+               help='seconds to wait before the first connection retry. The '
+                    'interval is doubled for each subsequent retry')]
+
 CONF = cfg.CONF
 CONF.register_opts(rbd_opts)
+CONF.register_opts(rados_pool_opts)
 
 
 def ascii_str(string):
@@ -83,6 +107,191 @@ def ascii_str(string):
     return str(string)
 
 
+class RADOSConnectionPool(object):
+    """Pool of long-lived connections to Ceph clusters.
+
+    Connecting to the monitors is expensive so rather than connecting and
+    shutting down for every operation, connections are returned to the pool
+    once used and handed out again to the next caller using the same
+    (conf, user, pool). Connections that have been idle for longer than
+    rados_connection_health_check_interval are checked before reuse and
+    replaced if broken.
+
+    No more than rados_connection_pool_size connections are open at any one
+    time. If the limit is reached, idle connections for other keys are closed
+    to make room, otherwise callers wait for a connection to be released.
+    A caller that already holds a connection is not made to wait, since the
+    connection it holds may be the one it is waiting for; it is given a
+    connection outside the limit which is closed rather than pooled once
+    released.
+    """
+
+    def __init__(self, max_size=None):
+        if max_size is None:
+            max_size = CONF.rados_connection_pool_size
+        self.max_size = max_size
+        self._slots = semaphore.Semaphore(max(max_size, 1))
+        self._free = {}
+        self._in_use = []
+
+    def _connect(self, rados_module, conf, user, pool):
+        retries = CONF.rados_connect_retries
+        interval = CONF.rados_connect_retry_interval
+        while True:
+            client = rados_module.Rados(rados_id=user, conffile=conf)
+            try:
+                client.connect()
+                break
+            except rados_module.Error:
+                # shutdown cannot raise an exception
+                client.shutdown()
+                if retries <= 0:
+                    raise
+
+                LOG.warning(_("failed to connect to ceph cluster, retrying "
+                              "in %ss") % (interval))
+                eventlet.sleep(interval)
+                retries -= 1
+                interval *= 2
+
+        try:
+            return client, client.open_ioctx(pool)
+        except rados_module.Error:
+            client.shutdown()
+            raise
+
+    def _is_healthy(self, rados_module, client):
+        try:
+            # get_fsid() only reads local state so ask the monitors.
+            client.get_cluster_stats()
+        except rados_module.Error:
+            LOG.info(_("pooled ceph connection is no longer healthy"))
+            return False
+
+        return True
+
+    def _close(self, client, ioctx):
+        # closing an ioctx cannot raise an exception
+        ioctx.close()
+        client.shutdown()
+        if self.max_size > 0:
+            self._slots.release()
+
+    def _evict_idle(self):
+        """Close the least recently used idle connection, if there is one."""
+        oldest = None
+        for key, conns in self._free.iteritems():
+            if conns and (oldest is None or
+                          conns[0][2] < self._free[oldest][0][2]):
+                oldest = key
+
+        if oldest is None:
+            return False
+
+        client, ioctx, last_used = self._free[oldest].pop(0)
+        self._close(client, ioctx)
+        return True
+
+    def _holds_connection(self, owner):
+        for client, ioctx, key, holder in self._in_use:
+            if holder is owner:
+                return True
+
+        return False
+
+    def get(self, rados_module, conf, user, pool):
+        """Return a (client, ioctx) tuple connected to the given pool."""
+        if self.max_size <= 0:
+            return self._connect(rados_module, conf, user, pool)
+
+        owner = greenthread.getcurrent()
+        key = (rados_module, conf, user, pool)
+        conns = self._free.get(key, [])
+        while conns:
+            client, ioctx, last_used = conns.pop()
+            idle = time.time() - last_used
+            if (idle < CONF.rados_connection_health_check_interval or
+                    self._is_healthy(rados_module, client)):
+                self._in_use.append((client, ioctx, key, owner))
+                return client, ioctx
+
+            self._close(client, ioctx)
+
+        while not self._slots.acquire(blocking=False):
+            if self._evict_idle():
+                continue
+
+            if self._holds_connection(owner):
+                # Nested use, e.g. holding a source and a destination
+                # connection at once. Waiting here could deadlock so this
+                # connection is not counted against the limit.
+                client, ioctx = self._connect(rados_module, conf, user, pool)
+                self._in_use.append((client, ioctx, None, owner))
+                return client, ioctx
+
+            # Wait for a connection to be released.
+            self._slots.acquire()
+            break
+
+        try:
+            client, ioctx = self._connect(rados_module, conf, user, pool)
+        except Exception:
+            self._slots.release()
+            raise
+
+        self._in_use.append((client, ioctx, key, owner))
+        return client, ioctx
+
+    def put(self, client, ioctx, discard=False):
+        """Return a connection to the pool.
+
+        If discard is True, or if another caller is waiting for a connection,
+        the connection is closed rather than being kept for reuse.
+        """
+        if self.max_size <= 0:
+            ioctx.close()
+            client.shutdown()
+            return
+
+        for index, (c, i, key, owner) in enumerate(self._in_use):
+            if c is client and i is ioctx:
+                del self._in_use[index]
+                break
+        else:
+            key = None
+
+        if key is None:
+            # Not counted against the limit so do not release a slot.
+            ioctx.close()
+            client.shutdown()
+            return
+
+        if discard or self._slots.balance < 0:
+            self._close(client, ioctx)
+            return
+
+        self._free.setdefault(key, []).append((client, ioctx, time.time()))
+
+    def empty(self):
+        """Close all idle connections."""
+        for conns in self._free.values():
+            while conns:
+                client, ioctx, last_used = conns.pop()
+                self._close(client, ioctx)
+        self._free = {}
+
+
+_rados_pool = None
+
+
+def get_rados_connection_pool():
+    """Return the process-wide RADOS connection pool."""
+    global _rados_pool
+    if _rados_pool is None:
+        _rados_pool = RADOSConnectionPool()
+    return _rados_pool
+
+
 class RBDImageMetadata(object):
     """RBD image metadata to be used with RBDImageIOWrapper."""
     def __init__(self, image, pool, user, conf):
@@ -221,12 +430,115 @@ class RBDVolumeProxy(object):
         try:
             self.volume.close()
         finally:
-            self.driver._disconnect_from_rados(self.client, self.ioctx)
+            # Do not reuse the connection if something went wrong with it.
+            self.driver._disconnect_from_rados(self.client, self.ioctx,
+                                               discard=type_ is not None)
 
     def __getattr__(self, attrib):
         return getattr(self.volume, attrib)
 
 
+class RBDCloneGraph(object):
+    """In-memory graph of the clone relationships between rbd volumes.
+
+    Each node records the (pool, parent, snap) tuple, as returned by
+    RBDDriver._get_clone_info(), of the volume it was cloned from along with
+    the volumes that have been cloned from it. Nodes are loaded lazily from
+    librbd the first time a volume is looked up and are then kept up to date
+    by the driver's own clone, flatten, rename and delete operations so that
+    checking the clone depth does not require opening every image in the
+    clone chain.
+
+    Other cinder-volume services sharing the pool, or an admin, may change
+    the clone chain without the graph knowing, so it is only a hint:
+    operations that modify an image read its parent from the image itself.
+    """
+
+    NO_PARENT = (None, None, None)
+
+    def __init__(self, driver):
+        self.driver = driver
+        self._parents = {}
+        self._children = {}
+
+    def __contains__(self, volume_name):
+        return volume_name in self._parents
+
+    def _load(self, client, volume_name):
+        volume = self.driver.rbd.Image(client.ioctx, volume_name)
+        try:
+            info = self.driver._get_clone_info(volume, volume_name)
+        finally:
+            volume.close()
+
+        self.add(volume_name, *info)
+
+    def add(self, volume_name, pool=None, parent=None, snap=None):
+        """Add or replace a volume in the graph."""
+        self.remove(volume_name, keep_children=True)
+        self._parents[volume_name] = (pool, parent, snap)
+        if parent:
+            self._children.setdefault(parent, set()).add(volume_name)
+
+    def remove(self, volume_name, keep_children=False):
+        """Remove a volume from the graph."""
+        pool, parent, snap = self._parents.pop(volume_name, self.NO_PARENT)
+        if parent in self._children:
+            self._children[parent].discard(volume_name)
+            if not self._children[parent]:
+                del self._children[parent]
+
+        if not keep_children:
+            self._children.pop(volume_name, None)
+
+    def rename(self, volume_name, new_name):
+        """Rename a volume, updating references held by its clones."""
+        children = self._children.pop(volume_name, set())
+        if volume_name in self._parents:
+            info = self._parents[volume_name]
+            self.remove(volume_name)
+            self.add(new_name, *info)
+
+        for child in children:
+            c_pool, c_parent, c_snap = self._parents[child]
+            self._parents[child] = (c_pool, new_name, c_snap)
+        if children:
+            self._children[new_name] = children
+
+    def flatten(self, volume_name):
+        """Record that a volume no longer depends on its parent."""
+        if volume_name in self._parents:
+            self.add(volume_name)
+
+    def get_parent_info(self, client, volume_name):
+        """Return (pool, parent, snap) if volume is a clone."""
+        if volume_name not in self._parents:
+            self._load(client, volume_name)
+
+        return self._parents[volume_name]
+
+    def get_children(self, volume_name):
+        """Return the names of the known clones of a volume."""
+        return set(self._children.get(volume_name, set()))
+
+    def get_depth(self, client, volume_name):
+        """Return the number of ancestral clones (if any) of a volume."""
+        depth = 0
+        while True:
+            pool, parent, snap = self.get_parent_info(client, volume_name)
+            if not parent:
+                return depth
+
+            # If clone depth was reached, flatten should have occurred so if
+            # it has been exceeded then something has gone wrong.
+            if depth > CONF.rbd_max_clone_depth:
+                raise Exception(_("clone depth exceeds limit of %s") %
+                                (CONF.rbd_max_clone_depth))
+
+            volume_name = parent
+            depth += 1
+
+
 class RADOSClient(object):
     """Context manager to simplify error handling for connecting to ceph."""
     def __init__(self, driver, pool=None):
@@ -237,7 +549,9 @@ class RADOSClient(object):
         return self
 
     def __exit__(self, type_, value, traceback):
-        self.driver._disconnect_from_rados(self.cluster, self.ioctx)
+        # Do not reuse the connection if something went wrong with it.
+        self.driver._disconnect_from_rados(self.cluster, self.ioctx,
+                                           discard=type_ is not None)
 
 
 class RBDDriver(driver.VolumeDriver):
@@ -252,6 +566,8 @@ class RBDDriver(driver.VolumeDriver):
         # allow overrides for testing
         self.rados = kwargs.get('rados', rados)
         self.rbd = kwargs.get('rbd', rbd)
+        self._clone_graph = RBDCloneGraph(self)
+        self._fsid = None
 
     def check_for_setup_error(self):
         """Returns an error if prerequisites aren't met."""
@@ -277,21 +593,12 @@ class RBDDriver(driver.VolumeDriver):
     def _connect_to_rados(self, pool=None):
         ascii_user = ascii_str(self.configuration.rbd_user)
         ascii_conf = ascii_str(self.configuration.rbd_ceph_conf)
-        client = self.rados.Rados(rados_id=ascii_user, conffile=ascii_conf)
-        try:
-            client.connect()
-            pool_to_open = str(pool or self.configuration.rbd_pool)
-            ioctx = client.open_ioctx(pool_to_open)
-            return client, ioctx
-        except self.rados.Error:
-            # shutdown cannot raise an exception
-            client.shutdown()
-            raise
+        pool_to_open = str(pool or self.configuration.rbd_pool)
+        return get_rados_connection_pool().get(self.rados, ascii_conf,
+                                               ascii_user, pool_to_open)
 
-    def _disconnect_from_rados(self, client, ioctx):
-        # closing an ioctx cannot raise an exception
-        ioctx.close()
-        client.shutdown()
+    def _disconnect_from_rados(self, client, ioctx, discard=False):
+        get_rados_connection_pool().put(client, ioctx, discard=discard)
 
     def _get_backup_snaps(self, rbd_image):
         """Get list of any backup snapshots that exist on this volume.
@@ -341,6 +648,7 @@ class RBDDriver(driver.VolumeDriver):
                 new_stats = client.cluster.get_cluster_stats()
             stats['total_capacity_gb'] = new_stats['kb'] / units.MiB
             stats['free_capacity_gb'] = new_stats['kb_avail'] / units.MiB
+            stats['copy_offload'] = self._get_copy_offload_id()
         except self.rados.Error:
             # just log and return unknown capacities
             LOG.exception(_('error refreshing volume stats'))
@@ -358,26 +666,10 @@ class RBDDriver(driver.VolumeDriver):
     def _supports_layering(self):
         return hasattr(self.rbd, 'RBD_FEATURE_LAYERING')
 
-    def _get_clone_depth(self, client, volume_name, depth=0):
+    def _get_clone_depth(self, client, volume_name):
         """Returns the number of ancestral clones (if any) of the given volume.
         """
-        parent_volume = self.rbd.Image(client.ioctx, volume_name)
-        try:
-            pool, parent, snap = self._get_clone_info(parent_volume,
-                                                      volume_name)
-        finally:
-            parent_volume.close()
-
-        if not parent:
-            return depth
-
-        # If clone depth was reached, flatten should have occurred so if it has
-        # been exceeded then something has gone wrong.
-        if depth > CONF.rbd_max_clone_depth:
-            raise Exception(_("clone depth exceeds limit of %s") %
-                            (CONF.rbd_max_clone_depth))
-
-        return self._get_clone_depth(client, parent, depth + 1)
+        return self._clone_graph.get_depth(client, volume_name)
 
     def create_cloned_volume(self, volume, src_vref):
         """Create a cloned volume from another volume.
@@ -399,6 +691,7 @@ class RBDDriver(driver.VolumeDriver):
             with RBDVolumeProxy(self, src_name, read_only=True) as vol:
                 vol.copy(vol.ioctx, dest_name)
 
+            self._clone_graph.add(dest_name)
             return
 
         # Otherwise do COW clone.
@@ -422,6 +715,7 @@ class RBDDriver(driver.VolumeDriver):
                     # Flatten source volume
                     LOG.debug(_("flattening source volume %s") % (src_name))
                     src_volume.flatten()
+                    self._clone_graph.flatten(src_name)
                     # Delete parent clone snap
                     parent_volume = self.rbd.Image(client.ioctx, parent)
                     try:
@@ -456,6 +750,9 @@ class RBDDriver(driver.VolumeDriver):
             finally:
                 src_volume.close()
 
+            self._clone_graph.add(dest_name, str(self.configuration.rbd_pool),
+                                  src_name, clone_snap)
+
         LOG.debug(_("clone created successfully"))
 
     def create_volume(self, volume):
@@ -480,12 +777,16 @@ class RBDDriver(driver.VolumeDriver):
                                   old_format=old_format,
                                   features=features)
 
+        self._clone_graph.add(str(volume['name']))
+
     def _flatten(self, pool, volume_name):
         LOG.debug(_('flattening %(pool)s/%(img)s') %
                   dict(pool=pool, img=volume_name))
         with RBDVolumeProxy(self, volume_name, pool) as vol:
             vol.flatten()
 
+        self._clone_graph.flatten(str(volume_name))
+
     def _clone(self, volume, src_pool, src_image, src_snap):
         LOG.debug(_('cloning %(pool)s/%(img)s@%(snap)s to %(dst)s') %
                   dict(pool=src_pool, img=src_image, snap=src_snap,
@@ -499,6 +800,11 @@ class RBDDriver(driver.VolumeDriver):
                                      str(volume['name']),
                                      features=self.rbd.RBD_FEATURE_LAYERING)
 
+        # Only clones of volumes (taken via a <volume>.clone_snap snapshot)
+        # count towards clone depth so clones of snapshots and images are
+        # recorded without a parent, as _get_clone_info() would report them.
+        self._clone_graph.add(str(volume['name']))
+
     def _resize(self, volume, **kwargs):
         size = kwargs.get('size', None)
         if not size:
@@ -578,6 +884,7 @@ class RBDDriver(driver.VolumeDriver):
         if (not parent_has_snaps) and parent_name.endswith('.deleted'):
             LOG.debug(_("deleting parent %s") % (parent_name))
             self.rbd.RBD().remove(client.ioctx, parent_name)
+            self._clone_graph.remove(parent_name)
 
             # Now move up to grandparent if there is one
             if g_parent:
@@ -614,10 +921,10 @@ class RBDDriver(driver.VolumeDriver):
 
                     raise exception.VolumeIsBusy(volume_name=volume_name)
 
-                # Determine if this volume is itself a clone
-                pool, parent, parent_snap = self._get_clone_info(rbd_image,
-                                                                 volume_name,
-                                                                 clone_snap)
+                # Determine if this volume is itself a clone. The image is
+                # open already, so read it rather than trust the clone graph.
+                pool, parent, parent_snap = \
+                    self._get_clone_info(rbd_image, volume_name, clone_snap)
             finally:
                 rbd_image.close()
 
@@ -636,6 +943,8 @@ class RBDDriver(driver.VolumeDriver):
                     # delete can be retried.
                     raise exception.VolumeIsBusy(msg, volume_name=volume_name)
 
+                self._clone_graph.remove(volume_name)
+
                 # If it is a clone, walk back up the parent chain deleting
                 # references.
                 if parent:
@@ -647,6 +956,7 @@ class RBDDriver(driver.VolumeDriver):
                 # will be deleted when it's snapshot and clones are deleted.
                 new_name = "%s.deleted" % (volume_name)
                 self.rbd.RBD().rename(client.ioctx, volume_name, new_name)
+                self._clone_graph.rename(volume_name, new_name)
 
     def create_snapshot(self, snapshot):
         """Creates an rbd snapshot."""
@@ -714,8 +1024,47 @@ class RBDDriver(driver.VolumeDriver):
         return pieces
 
     def _get_fsid(self):
-        with RADOSClient(self) as client:
-            return client.cluster.get_fsid()
+        # The fsid of a cluster never changes so only fetch it once.
+        if self._fsid is None:
+            with RADOSClient(self) as client:
+                self._fsid = client.cluster.get_fsid()
+
+        return self._fsid
+
+    def _get_copy_offload_id(self):
+        return 'RBDDriver:%s' % self._get_fsid()
+
+    def get_copy_offload_source(self, volume):
+        return {'copy_offload': self._get_copy_offload_id(),
+                'pool': self.configuration.rbd_pool,
+                'name': str(volume['name'])}
+
+    def copy_volume_offload(self, context, src_info, volume):
+        """Copy an image of another pool of the cluster into volume."""
+        if src_info.get('copy_offload') != self._get_copy_offload_id():
+            return False
+
+        dest_name = str(volume['name'])
+        # Open the source before touching the destination, so a source we
+        # cannot read leaves the volume for the generic copy to fill.
+        try:
+            source = RBDVolumeProxy(self, src_info['name'],
+                                    pool=src_info['pool'], read_only=True)
+        except (KeyError, self.rbd.Error) as e:
+            LOG.debug(_('Unable to open copy offload source %(src)s: '
+                        '%(err)s') % {'src': src_info, 'err': e})
+            return False
+
+        LOG.debug(_("copying %(pool)s/%(src)s to %(dest)s") %
+                  {'pool': src_info['pool'], 'src': src_info['name'],
+                   'dest': dest_name})
+        with source as src_volume:
+            with RADOSClient(self) as client:
+                # The copy replaces the empty image created for the migration
+                self.rbd.RBD().remove(client.ioctx, dest_name)
+                src_volume.copy(client.ioctx, dest_name)
+
+        return True
 
     def _is_cloneable(self, image_location, image_meta):
         try:
@@ -784,6 +1133,7 @@ class RBDDriver(driver.VolumeDriver):
                 args.append('--new-format')
             args.extend(self._ceph_args())
             self._try_execute(*args)
+        self._clone_graph.add(str(volume['name']))
         self._resize(volume)
 
     def copy_volume_to_image(self, context, volume, image_service, image_meta):
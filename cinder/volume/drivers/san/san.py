@@ -20,6 +20,7 @@ controller on the SAN hardware.  We expect to access it over SSH or some API.
 """
 
 import random
+import time
 
 from eventlet import greenthread
 from oslo.config import cfg
@@ -69,6 +70,10 @@ san_opts = [
     cfg.IntOpt('ssh_max_pool_conn',
                default=5,
                help='Maximum ssh connections in the pool'),
+    cfg.IntOpt('ssh_cmd_cache_ttl',
+               default=0,
+               help='Seconds the output of read-only SSH commands is reused '
+                    'for identical commands. 0 disables caching'),
 ]
 
 CONF = cfg.CONF
@@ -83,6 +88,10 @@ class SanDriver(driver.VolumeDriver):
     remote protocol.
     """
 
+    # Read-only commands whose output may be cached for ssh_cmd_cache_ttl
+    # seconds.  Running any other command empties the cache.
+    SSH_CACHEABLE_COMMANDS = ()
+
     def __init__(self, *args, **kwargs):
         execute = kwargs.pop('execute', self.san_execute)
         super(SanDriver, self).__init__(execute=execute,
@@ -90,6 +99,9 @@ class SanDriver(driver.VolumeDriver):
         self.configuration.append_config_values(san_opts)
         self.run_local = self.configuration.san_is_local
         self.sshpool = None
+        self._ssh_cache = {}
+        self._ssh_cache_generation = 0
+        self._ssh_stats = {}
 
     def san_execute(self, *cmd, **kwargs):
         if self.run_local:
@@ -99,10 +111,70 @@ class SanDriver(driver.VolumeDriver):
             command = ' '.join(cmd)
             return self._run_ssh(command, check_exit_code)
 
+    def _get_ssh_cmd_name(self, command):
+        """Returns the name used to cache and account for a command."""
+        return command.split(' ', 1)[0]
+
+    def _record_ssh_call(self, cmd_name, elapsed, failed=False,
+                         cached=False):
+        stats = self._ssh_stats.get(cmd_name)
+        if stats is None:
+            stats = self._ssh_stats.setdefault(
+                cmd_name, {'calls': 0, 'failures': 0, 'cache_hits': 0,
+                           'total_time': 0.0, 'max_time': 0.0})
+        stats['calls'] += 1
+        if cached:
+            stats['cache_hits'] += 1
+            return
+        stats['total_time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+        if failed:
+            stats['failures'] += 1
+
+    def get_ssh_stats(self):
+        """Returns the call count and latency of each SSH command run."""
+        ssh_stats = {}
+        for cmd_name, stats in self._ssh_stats.items():
+            ssh_stats[cmd_name] = dict(stats)
+            executed = stats['calls'] - stats['cache_hits']
+            ssh_stats[cmd_name]['avg_time'] = (stats['total_time'] /
+                                               executed if executed else 0.0)
+        return ssh_stats
+
     def _run_ssh(self, cmd_list, check_exit_code=True, attempts=1):
         utils.check_ssh_injection(cmd_list)
         command = ' '. join(cmd_list)
-
+        cmd_name = self._get_ssh_cmd_name(command)
+        ttl = self.configuration.ssh_cmd_cache_ttl
+        cacheable = ttl > 0 and cmd_name in self.SSH_CACHEABLE_COMMANDS
+
+        if cacheable:
+            cached = self._ssh_cache.get(command)
+            if cached and time.time() - cached[0] < ttl:
+                self._record_ssh_call(cmd_name, 0, cached=True)
+                return cached[1]
+
+        generation = self._ssh_cache_generation
+        start = time.time()
+        try:
+            result = self._execute_ssh(command, check_exit_code, attempts)
+        except Exception:
+            self._record_ssh_call(cmd_name, time.time() - start, failed=True)
+            raise
+        finally:
+            # Whatever a modifying command changed on the array, listings
+            # taken before it completed are stale now
+            if not cacheable:
+                self._ssh_cache_generation += 1
+                self._ssh_cache.clear()
+        self._record_ssh_call(cmd_name, time.time() - start)
+        # Output of a listing that overlapped a modifying command may
+        # already be out of date, so it is not cached
+        if cacheable and generation == self._ssh_cache_generation:
+            self._ssh_cache[command] = (start, result)
+        return result
+
+    def _execute_ssh(self, command, check_exit_code, attempts):
         if not self.sshpool:
             password = self.configuration.san_password
             privatekey = self.configuration.san_private_key
@@ -14,7 +14,6 @@
 #    under the License.
 
 import base64
-import httplib
 import json
 import math
 import random
@@ -30,6 +29,7 @@ from cinder import exception
 from cinder.openstack.common import log as logging
 from cinder.openstack.common import timeutils
 from cinder.volume.drivers.san.san import SanISCSIDriver
+from cinder.volume import http_pool
 from cinder.volume import qos_specs
 from cinder.volume import volume_types
 
@@ -54,7 +54,13 @@ sf_opts = [
     cfg.IntOpt('sf_api_port',
                default=443,
                help='SolidFire API port. Useful if the device api is behind '
-                    'a proxy on a different port.'), ]
+                    'a proxy on a different port.'),
+
+    cfg.IntOpt('sf_account_cache_ttl',
+               default=300,
+               help='Seconds a SolidFire account, including its CHAP '
+                    'secrets, is cached for before it is looked up on the '
+                    'cluster again. 0 disables the cache.'), ]
 
 
 CONF = cfg.CONF
@@ -90,10 +96,20 @@ class SolidFireDriver(SanISCSIDriver):
     cluster_stats = {}
 
     GB = math.pow(2, 30)
+    MAX_CONNECTIONS = 4
 
     def __init__(self, *args, **kwargs):
         super(SolidFireDriver, self).__init__(*args, **kwargs)
         self.configuration.append_config_values(sf_opts)
+        self._pool = None
+        self._api_headers = None
+        self._cluster_info = None
+        # SolidFire accounts by name and volumes by cinder UUID, filled
+        # from the API responses and kept current by the driver's calls.
+        # Accounts are kept as (time loaded, account) since their CHAP
+        # secrets can be changed on the cluster.
+        self._sf_accounts = {}
+        self._sf_volumes = {}
         try:
             self._update_cluster_status()
         except exception.SolidFireAPIException:
@@ -111,12 +127,6 @@ class SolidFireDriver(SanISCSIDriver):
                                    'xMaxClonesPerVolumeExceeded',
                                    'xMaxSnapshotsPerNodeExceeded',
                                    'xMaxClonesPerNodeExceeded']
-        host = self.configuration.san_ip
-        port = self.configuration.sf_api_port
-
-        cluster_admin = self.configuration.san_login
-        cluster_password = self.configuration.san_password
-
         # NOTE(jdg): We're wrapping a retry loop for a know XDB issue
         # Shows up in very high request rates (ie create 1000 volumes)
         # we have to wrap the whole sequence because the request_id
@@ -132,54 +142,32 @@ class SolidFireDriver(SanISCSIDriver):
 
             payload = json.dumps(command, ensure_ascii=False)
             payload.encode('utf-8')
-            header = {'Content-Type': 'application/json-rpc; charset=utf-8'}
-
-            if cluster_password is not None:
-                # base64.encodestring includes a newline character
-                # in the result, make sure we strip it off
-                auth_key = base64.encodestring('%s:%s' % (cluster_admin,
-                                               cluster_password))[:-1]
-                header['Authorization'] = 'Basic %s' % auth_key
 
             LOG.debug(_("Payload for SolidFire API call: %s"), payload)
 
             api_endpoint = '/json-rpc/%s' % version
-            connection = httplib.HTTPSConnection(host, port)
-            try:
-                connection.request('POST', api_endpoint, payload, header)
-            except Exception as ex:
-                LOG.error(_('Failed to make httplib connection '
-                            'SolidFire Cluster: %s (verify san_ip '
-                            'settings)') % ex.message)
-                msg = _("Failed to make httplib connection: %s") % ex.message
-                raise exception.SolidFireAPIException(msg)
-            response = connection.getresponse()
+            (status, reason, data) = self._send_api_request(api_endpoint,
+                                                            payload)
 
-            data = {}
-            if response.status != 200:
-                connection.close()
+            if status != 200:
                 LOG.error(_('Request to SolidFire cluster returned '
                             'bad status: %(status)s / %(reason)s (check '
                             'san_login/san_password settings)') %
-                          {'status': response.status,
-                           'reason': response.reason})
+                          {'status': status,
+                           'reason': reason})
                 msg = (_("HTTP request failed, with status: %(status)s "
                          "and reason: %(reason)s") %
-                       {'status': response.status, 'reason': response.reason})
+                       {'status': status, 'reason': reason})
                 raise exception.SolidFireAPIException(msg)
 
             else:
-                data = response.read()
                 try:
                     data = json.loads(data)
                 except (TypeError, ValueError) as exc:
-                    connection.close()
                     msg = _("Call to json.loads() raised "
                             "an exception: %s") % exc
                     raise exception.SfJsonEncodeFailure(msg)
 
-                connection.close()
-
             LOG.debug(_("Results of SolidFire API call: %s"), data)
 
             if 'error' in data:
@@ -197,6 +185,9 @@ class SolidFireDriver(SanISCSIDriver):
                     time.sleep(1)
                     retry_count -= 1
                 elif 'xUnknownAccount' in data['error']['name']:
+                    # The cached accounts and volumes may be gone too
+                    self._sf_accounts.clear()
+                    self._sf_volumes.clear()
                     retry_count = 0
                 else:
                     msg = _("API response: %s") % data
@@ -206,21 +197,93 @@ class SolidFireDriver(SanISCSIDriver):
 
         return data
 
+    def _get_api_headers(self):
+        """Build the request headers once, including the credentials."""
+        if self._api_headers is None:
+            header = {'Content-Type': 'application/json-rpc; charset=utf-8'}
+            cluster_admin = self.configuration.san_login
+            cluster_password = self.configuration.san_password
+            if cluster_password is not None:
+                # base64.encodestring includes a newline character
+                # in the result, make sure we strip it off
+                auth_key = base64.encodestring('%s:%s' % (cluster_admin,
+                                               cluster_password))[:-1]
+                header['Authorization'] = 'Basic %s' % auth_key
+            self._api_headers = header
+        return self._api_headers
+
+    def _send_api_request(self, api_endpoint, payload):
+        """Posts the payload over a pooled keep-alive connection.
+
+        Returns the status, reason and body of the response.
+        """
+        if self._pool is None:
+            self._pool = http_pool.HTTPConnectionPool(
+                'https', self.configuration.san_ip,
+                self.configuration.sf_api_port,
+                max_size=self.MAX_CONNECTIONS)
+        headers = self._get_api_headers()
+        connection = self._pool.get()
+        try:
+            try:
+                response = http_pool.post(connection, api_endpoint, payload,
+                                          headers)
+            except Exception as ex:
+                connection.close()
+                LOG.error(_('Failed to make httplib connection '
+                            'SolidFire Cluster: %s (verify san_ip '
+                            'settings)') % ex)
+                msg = _("Failed to make httplib connection: %s") % ex
+                raise exception.SolidFireAPIException(msg)
+            # The body must be read before the connection is reused
+            data = response.read()
+            if response.status != 200:
+                connection.close()
+            return (response.status, response.reason, data)
+        finally:
+            self._pool.put(connection)
+
+    def _index_sf_volumes(self, volumes):
+        """Adds the listed volumes to the volume index by cinder UUID."""
+        found = {}
+        duplicates = set()
+        for v in volumes:
+            attributes = v.get('attributes') or {}
+            vol_uuid = attributes.get('uuid')
+            if vol_uuid is None and v['name'].startswith('UUID-'):
+                vol_uuid = v['name'][len('UUID-'):]
+            if vol_uuid is None:
+                continue
+            if vol_uuid in found:
+                duplicates.add(vol_uuid)
+            found[vol_uuid] = v
+        for vol_uuid in duplicates:
+            # Leave duplicates to the full lookup, which reports them
+            found.pop(vol_uuid)
+            self._sf_volumes.pop(vol_uuid, None)
+        self._sf_volumes.update(found)
+
     def _get_volumes_by_sfaccount(self, account_id):
         """Get all volumes on cluster for specified account."""
         params = {'accountID': account_id}
         data = self._issue_api_request('ListVolumesForAccount', params)
         if 'result' in data:
+            self._index_sf_volumes(data['result']['volumes'])
             return data['result']['volumes']
 
     def _get_sfaccount_by_name(self, sf_account_name):
         """Get SolidFire account object by name."""
+        ttl = self.configuration.sf_account_cache_ttl
+        cached = self._sf_accounts.get(sf_account_name)
+        if cached is not None and time.time() - cached[0] < ttl:
+            return cached[1]
         sfaccount = None
         params = {'username': sf_account_name}
         data = self._issue_api_request('GetAccountByName', params)
         if 'result' in data and 'account' in data['result']:
             LOG.debug(_('Found solidfire account: %s'), sf_account_name)
             sfaccount = data['result']['account']
+            self._sf_accounts[sf_account_name] = (time.time(), sfaccount)
         return sfaccount
 
     def _get_sf_account_name(self, project_id):
@@ -264,14 +327,20 @@ class SolidFireDriver(SanISCSIDriver):
         return sfaccount
 
     def _get_cluster_info(self):
-        """Query the SolidFire cluster for some property info."""
+        """Query the SolidFire cluster for some property info.
+
+        The info is kept until the next cluster status update.
+        """
+        if self._cluster_info is not None:
+            return self._cluster_info
         params = {}
         data = self._issue_api_request('GetClusterInfo', params)
         if 'result' not in data:
             msg = _("API response: %s") % data
             raise exception.SolidFireAPIException(msg)
 
-        return data['result']
+        self._cluster_info = data['result']
+        return self._cluster_info
 
     def _do_export(self, volume):
         """Gets the associated account, retrieves CHAP info and updates."""
@@ -454,11 +523,18 @@ class SolidFireDriver(SanISCSIDriver):
                 qos[key] = int(value)
         return qos
 
-    def _get_sf_volume(self, uuid, params):
+    def _get_sf_volume(self, uuid, params, refresh=False):
+        sf_volref = self._sf_volumes.get(uuid)
+        if (not refresh and sf_volref is not None and
+                sf_volref['accountID'] == params['accountID']):
+            return sf_volref
+
         data = self._issue_api_request('ListVolumesForAccount', params)
         if 'result' not in data:
             msg = _("Failed to get SolidFire Volume: %s") % data
             raise exception.SolidFireAPIException(msg)
+        self._sf_volumes.pop(uuid, None)
+        self._index_sf_volumes(data['result']['volumes'])
 
         found_count = 0
         sf_volref = None
@@ -562,12 +638,23 @@ class SolidFireDriver(SanISCSIDriver):
         sf_vol = self._get_sf_volume(volume['id'], params)
 
         if sf_vol is not None:
-            params = {'volumeID': sf_vol['volumeID']}
-            data = self._issue_api_request('DeleteVolume', params)
+            try:
+                data = self._issue_api_request(
+                    'DeleteVolume', {'volumeID': sf_vol['volumeID']})
+            except exception.SolidFireAPIException:
+                # The cached volume may have been deleted on the cluster
+                sf_vol = self._get_sf_volume(volume['id'], params,
+                                             refresh=True)
+                if sf_vol is None:
+                    LOG.debug(_("Leaving SolidFire delete_volume"))
+                    return
+                data = self._issue_api_request(
+                    'DeleteVolume', {'volumeID': sf_vol['volumeID']})
 
             if 'result' not in data:
                 msg = _("Failed to delete SolidFire Volume: %s") % data
                 raise exception.SolidFireAPIException(msg)
+            self._sf_volumes.pop(volume['id'], None)
         else:
             LOG.error(_("Volume ID %s was not found on "
                         "the SolidFire Cluster!"), volume['id'])
@@ -656,6 +743,7 @@ class SolidFireDriver(SanISCSIDriver):
 
         if 'result' not in data:
             raise exception.SolidFireAPIDataException(data=data)
+        sf_vol['totalSize'] = params['totalSize']
 
         LOG.debug(_("Leaving SolidFire extend_volume"))
 
@@ -664,6 +752,7 @@ class SolidFireDriver(SanISCSIDriver):
 
         LOG.debug(_("Updating cluster status info"))
 
+        self._cluster_info = None
         params = {}
 
         # NOTE(jdg): The SF api provides an UNBELIEVABLE amount
@@ -721,6 +810,8 @@ class SolidFireDriver(SanISCSIDriver):
         data = self._issue_api_request('ModifyVolume', params)
 
         if 'result' not in data:
+            # The attributes were changed in place in the cached volume
+            self._sf_volumes.pop(volume['id'], None)
             raise exception.SolidFireAPIDataException(data=data)
 
     def detach_volume(self, context, volume):
@@ -746,6 +837,8 @@ class SolidFireDriver(SanISCSIDriver):
         data = self._issue_api_request('ModifyVolume', params)
 
         if 'result' not in data:
+            # The attributes were changed in place in the cached volume
+            self._sf_volumes.pop(volume['id'], None)
             raise exception.SolidFireAPIDataException(data=data)
 
     def accept_transfer(self, context, volume,
@@ -769,5 +862,6 @@ class SolidFireDriver(SanISCSIDriver):
 
         if 'result' not in data:
             raise exception.SolidFireAPIDataException(data=data)
+        sf_vol['accountID'] = sfaccount['accountID']
 
         LOG.debug(_("Leaving SolidFire transfer volume"))
@@ -212,6 +212,54 @@ def get_objects(vim, type, max_objects, props_to_collect=None,
                                     options=options)
 
 
+def create_filter(vim, type_props):
+    """Creates a property collector filter over the whole inventory.
+
+    The filter is used with WaitForUpdatesEx to track changes to the
+    properties of all managed objects of the given types.
+
+    :param vim: Vim object
+    :param type_props: Dict of managed object type to the properties of
+                       that type to be collected
+    :return: Reference to the property filter
+    """
+
+    client_factory = vim.client.factory
+    recur_trav_spec = build_recursive_traversal_spec(client_factory)
+    object_spec = build_object_spec(client_factory,
+                                    vim.service_content.rootFolder,
+                                    [recur_trav_spec])
+    property_specs = []
+    for type, props in type_props.items():
+        property_specs.append(build_property_spec(
+            client_factory, type=type, properties_to_collect=props))
+    property_filter_spec = build_property_filter_spec(client_factory,
+                                                      property_specs,
+                                                      [object_spec])
+    return vim.CreateFilter(vim.service_content.propertyCollector,
+                            spec=property_filter_spec, partialUpdates=False)
+
+
+def wait_for_updates_ex(vim, version, max_objects, max_wait_seconds=0):
+    """Gets the changes reported by the property filters since version.
+
+    :param vim: Vim object
+    :param version: Version returned by the previous call, an empty string
+                    to get the current state of all filtered objects
+    :param max_objects: Maximum number of object updates that should be
+                        returned in a single call
+    :param max_wait_seconds: Seconds to wait for a change when there is none
+    :return: UpdateSet with the changes, None if nothing changed
+    """
+
+    client_factory = vim.client.factory
+    options = client_factory.create('ns0:WaitOptions')
+    options.maxWaitSeconds = max_wait_seconds
+    options.maxObjectUpdates = max_objects
+    return vim.WaitForUpdatesEx(vim.service_content.propertyCollector,
+                                version=version, options=options)
+
+
 def get_object_properties(vim, mobj, properties):
     """Gets properties of the managed object specified.
 
@@ -17,6 +17,8 @@
 Implements operations on volumes residing on VMware datastores.
 """
 
+from eventlet import semaphore
+
 from cinder.openstack.common import log as logging
 from cinder.volume.drivers.vmware import error_util
 from cinder.volume.drivers.vmware import vim_util
@@ -59,9 +61,129 @@ def split_datastore_path(datastore_path):
 class VMwareVolumeOps(object):
     """Manages volume operations."""
 
+    # Properties tracked by the inventory index
+    INDEX_PROPERTIES = {'VirtualMachine': ['name', 'runtime.host'],
+                        'HostSystem': ['datastore', 'parent']}
+
     def __init__(self, session, max_objects):
         self._session = session
         self._max_objects = max_objects
+        self._index_session = None
+        # Serializes the updates of the index, a property collector only
+        # serves one WaitForUpdatesEx call at a time
+        self._index_lock = semaphore.Semaphore()
+        # Number of updates of the index started, and the number of the
+        # last one completed
+        self._index_updates_started = 0
+        self._index_updated = 0
+        self._reset_index()
+
+    def _reset_index(self):
+        self._index_filter = None
+        self._index_version = None
+        # (type, value) of the managed object -> (reference, properties)
+        self._index = {}
+        # Backing name -> key of the backing in the index
+        self._backing_keys = {}
+
+    @staticmethod
+    def _get_index_key(mobj):
+        return (getattr(mobj, '_type', None), getattr(mobj, 'value', None))
+
+    def _get_indexed_props(self, mobj):
+        """Get the indexed properties of a managed object, if any."""
+        if self._index_version is None:
+            return None
+        entry = self._index.get(self._get_index_key(mobj))
+        return entry[1] if entry else None
+
+    def _apply_index_updates(self, update_set):
+        for filter_update in update_set.filterSet:
+            for obj_update in filter_update.objectSet:
+                mobj = obj_update.obj
+                key = self._get_index_key(mobj)
+                if obj_update.kind == 'leave':
+                    entry = self._index.pop(key, None)
+                    if entry and self._backing_keys.get(
+                            entry[1].get('name')) == key:
+                        del self._backing_keys[entry[1]['name']]
+                    continue
+                props = self._index.setdefault(key, (mobj, {}))[1]
+                for change in getattr(obj_update, 'changeSet', None) or []:
+                    val = None
+                    if change.op not in ('remove', 'indirectRemove'):
+                        val = getattr(change, 'val', None)
+                    if change.name == 'name':
+                        old_name = props.get('name')
+                        if self._backing_keys.get(old_name) == key:
+                            del self._backing_keys[old_name]
+                        if val is not None:
+                            self._backing_keys[val] = key
+                    props[change.name] = val
+
+    def _destroy_index_filter(self, session_id):
+        if self._index_filter is None or self._index_session != session_id:
+            return
+        try:
+            self._session.invoke_api(self._session.vim,
+                                     'DestroyPropertyFilter',
+                                     self._index_filter)
+        except (error_util.VimException, error_util.VimFaultException):
+            LOG.debug(_("Unable to destroy property filter: %s.") %
+                      self._index_filter)
+
+    def _update_index(self):
+        """Bring the inventory index up to date.
+
+        The first call collects the indexed properties of every virtual
+        machine and host through a property collector filter; later calls
+        only fetch the changes made since the previous one. Callers which
+        waited for an update started after they were called use its result.
+
+        :return: True if the index can be used
+        """
+        started = self._index_updates_started
+        with self._index_lock:
+            if self._index_updated <= started:
+                self._index_updates_started += 1
+                update = self._index_updates_started
+                self._fetch_index_updates()
+                self._index_updated = update
+            return self._index_version is not None
+
+    def _fetch_index_updates(self):
+        session_id = getattr(self._session, '_session_id', None)
+        try:
+            if (self._index_version is None or
+                    self._index_session != session_id):
+                # Filters do not survive the session they were created in
+                self._destroy_index_filter(session_id)
+                self._reset_index()
+                self._index_session = session_id
+                self._index_filter = self._session.invoke_api(
+                    vim_util, 'create_filter', self._session.vim,
+                    self.INDEX_PROPERTIES)
+                self._index_version = ''
+            while True:
+                update_set = self._session.invoke_api(
+                    vim_util, 'wait_for_updates_ex', self._session.vim,
+                    self._index_version, self._max_objects)
+                if not update_set:
+                    break
+                self._apply_index_updates(update_set)
+                self._index_version = update_set.version
+                if not getattr(update_set, 'truncated', False):
+                    break
+        except (error_util.VimException,
+                error_util.VimFaultException) as excep:
+            LOG.warn(_("Unable to update the inventory index: %s.") % excep)
+            self._destroy_index_filter(session_id)
+            self._reset_index()
+            return
+
+        if getattr(self._session, '_session_id', None) != session_id:
+            # The session was re-established while updating
+            self._reset_index()
 
     def get_backing(self, name):
         """Get the backing based on name.
@@ -70,6 +192,13 @@ class VMwareVolumeOps(object):
         :return: Managed object reference to the backing
         """
 
+        if self._update_index():
+            key = self._backing_keys.get(name)
+            if key:
+                return self._index[key][0]
+            LOG.debug(_("Did not find any backing with name: %s") % name)
+            return
+
         retrieve_result = self._session.invoke_api(vim_util, 'get_objects',
                                                    self._session.vim,
                                                    'VirtualMachine',
@@ -106,6 +235,9 @@ class VMwareVolumeOps(object):
         :param instance: Managed object reference of the instance VM
         :return: Host managing the instance VM
         """
+        props = self._get_indexed_props(instance)
+        if props and props.get('runtime.host'):
+            return props['runtime.host']
         return self._session.invoke_api(vim_util, 'get_object_property',
                                         self._session.vim, instance,
                                         'runtime.host')
@@ -209,19 +341,26 @@ class VMwareVolumeOps(object):
                  the host belongs to
         """
 
-        props = self._session.invoke_api(vim_util, 'get_object_properties',
-                                         self._session.vim, host,
-                                         ['datastore', 'parent'])
         # Get datastores and compute resource or cluster compute resource
         datastores = []
         compute_resource = None
-        for elem in props:
-            for prop in elem.propSet:
-                if prop.name == 'datastore' and prop.val:
-                    # Consider only if datastores are present under host
-                    datastores = prop.val.ManagedObjectReference
-                elif prop.name == 'parent':
-                    compute_resource = prop.val
+        indexed_props = self._get_indexed_props(host)
+        if indexed_props and indexed_props.get('parent'):
+            if indexed_props.get('datastore'):
+                datastores = indexed_props['datastore'].ManagedObjectReference
+            compute_resource = indexed_props['parent']
+        else:
+            props = self._session.invoke_api(vim_util,
+                                             'get_object_properties',
+                                             self._session.vim, host,
+                                             ['datastore', 'parent'])
+            for elem in props:
+                for prop in elem.propSet:
+                    if prop.name == 'datastore' and prop.val:
+                        # Consider only if datastores are present under host
+                        datastores = prop.val.ManagedObjectReference
+                    elif prop.name == 'parent':
+                        compute_resource = prop.val
         # Filter datastores based on if it is accessible, mounted and writable
         valid_dss = []
         for datastore in datastores:
@@ -0,0 +1,121 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Keep-alive HTTP connections and call statistics for storage APIs.
+
+Used by the drivers that talk to their storage system over HTTP(S) request
+and response APIs, so that each call does not have to open a new connection
+(and go through a new TLS handshake).
+"""
+
+import httplib
+import socket
+
+from eventlet import pools
+
+
+class HTTPConnectionPool(pools.Pool):
+    """Pool of persistent HTTP/1.1 connections to a single server.
+
+    The port may be left out if host is given as 'host:port'.
+    """
+
+    def __init__(self, scheme, host, port=None, timeout=None, max_size=4):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        super(HTTPConnectionPool, self).__init__(max_size=max_size)
+
+    def create(self):
+        if self.scheme == 'https':
+            conn_class = httplib.HTTPSConnection
+        else:
+            conn_class = httplib.HTTPConnection
+        kwargs = {}
+        if self.port is not None:
+            kwargs['port'] = self.port
+        if self.timeout:
+            kwargs['timeout'] = self.timeout
+        return conn_class(self.host, **kwargs)
+
+    def close(self):
+        """Close the idle connections of the pool."""
+        while self.free_items:
+            self.free_items.popleft().close()
+
+
+def _is_closed_without_response(exc):
+    """Whether a BadStatusLine means the server sent nothing at all."""
+    # Depending on the python version httplib reports an empty status line
+    # as '', "''" or with a message.
+    line = exc.line or ''
+    return line in ('', "''") or line.startswith('No status line received')
+
+
+def post(connection, path, body, headers):
+    """Posts body over a pooled connection and returns the response.
+
+    A connection the server closed while it sat idle in the pool either
+    fails to send or is closed without any response, in which case the
+    request never reached the server and is retried once on a fresh
+    connection. Any other failure is raised, since the server may already
+    have acted on the request.
+    """
+    reused = getattr(connection, 'sock', None) is not None
+    try:
+        connection.request('POST', path, body, headers)
+    except (httplib.HTTPException, socket.error):
+        connection.close()
+        if not reused:
+            raise
+        connection.request('POST', path, body, headers)
+        return connection.getresponse()
+
+    try:
+        return connection.getresponse()
+    except httplib.BadStatusLine as e:
+        connection.close()
+        if not reused or not _is_closed_without_response(e):
+            raise
+        connection.request('POST', path, body, headers)
+        return connection.getresponse()
+
+
+class CallStats(object):
+    """Call count, failures and latency of each API method called."""
+
+    def __init__(self):
+        self._stats = {}
+
+    def record(self, name, elapsed, failed=False):
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats.setdefault(
+                name, {'calls': 0, 'failures': 0, 'total_time': 0.0,
+                       'max_time': 0.0})
+        stats['calls'] += 1
+        stats['total_time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+        if failed:
+            stats['failures'] += 1
+
+    def get(self):
+        """Returns the stats of each method, including the average time."""
+        api_stats = {}
+        for name, stats in self._stats.items():
+            api_stats[name] = dict(stats)
+            api_stats[name]['avg_time'] = (stats['total_time'] /
+                                           stats['calls'])
+        return api_stats
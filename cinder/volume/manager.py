@@ -73,6 +73,18 @@ volume_manager_opts = [
                default=300,
                help='Timeout for creating the volume to migrate to '
                     'when performing volume migration (seconds)'),
+    cfg.IntOpt('migration_copy_offload_timeout_secs',
+               default=3600,
+               help='Timeout for the destination backend to copy the data '
+                    'on the storage array when performing volume migration '
+                    'between backends of the same array (seconds), to which '
+                    'migration_copy_offload_timeout_secs_per_gb is added '
+                    'for each GB of the volume'),
+    cfg.IntOpt('migration_copy_offload_timeout_secs_per_gb',
+               default=60,
+               help='Seconds added to migration_copy_offload_timeout_secs '
+                    'for each GB of the volume being copied on the storage '
+                    'array'),
     cfg.BoolOpt('volume_service_inithost_offload',
                 default=False,
                 help='Offload pending volume delete during '
@@ -182,7 +194,7 @@ def locked_snapshot_operation(f):
 class VolumeManager(manager.SchedulerDependentManager):
     """Manages attachable block storage devices."""
 
-    RPC_API_VERSION = '1.12'
+    RPC_API_VERSION = '1.13'
 
     def __init__(self, volume_driver=None, service_name=None,
                  *args, **kwargs):
@@ -431,7 +443,7 @@ class VolumeManager(manager.SchedulerDependentManager):
             QUOTAS.commit(context, reservations, project_id=project_id)
 
         self.stats['allocated_capacity_gb'] -= volume_ref['size']
-        self.publish_service_capabilities(context)
+        self._publish_driver_status(context)
 
         return True
 
@@ -812,7 +824,31 @@ class VolumeManager(manager.SchedulerDependentManager):
         volume_ref = self.db.volume_get(context.elevated(), volume_id)
         self.driver.accept_transfer(context, volume_ref, new_user, new_project)
 
-    def _migrate_volume_generic(self, ctxt, volume, host, new_type_id):
+    def _copy_volume_data_offload(self, ctxt, volume, new_volume, host):
+        """Have the destination backend copy the volume on the array.
+
+        Returns False if the destination does not share the array of the
+        source volume or declines to copy it.
+        """
+        src_info = self.driver.get_copy_offload_source(volume)
+        capabilities = host.get('capabilities') or {}
+        if (not src_info or src_info.get('copy_offload') !=
+                capabilities.get('copy_offload')):
+            return False
+        LOG.debug(_("Offloading the copy of volume %(vol1)s to %(vol2)s to "
+                    "%(host)s") % {'vol1': volume['id'],
+                                   'vol2': new_volume['id'],
+                                   'host': new_volume['host']})
+        rpcapi = volume_rpcapi.VolumeAPI()
+        # The array copies in the time it takes to reach the volume size
+        timeout = (CONF.migration_copy_offload_timeout_secs +
+                   CONF.migration_copy_offload_timeout_secs_per_gb *
+                   volume['size'])
+        return rpcapi.copy_volume_offload(ctxt, new_volume, src_info,
+                                          timeout=timeout)
+
+    def _migrate_volume_generic(self, ctxt, volume, host, new_type_id,
+                                force_host_copy=False):
         rpcapi = volume_rpcapi.VolumeAPI()
 
         # Create new volume on remote host
@@ -852,13 +888,27 @@ class VolumeManager(manager.SchedulerDependentManager):
                 time.sleep(tries ** 2)
             new_volume = self.db.volume_get(ctxt, new_volume['id'])
 
-        # Copy the source volume to the destination volume
+        # Copy the source volume to the destination volume, on the array
+        # when the destination backend can
         try:
             if (volume['instance_uuid'] is None and
                     volume['attached_host'] is None):
-                self.driver.copy_volume_data(ctxt, volume, new_volume,
-                                             remote='dest')
-                # The above call is synchronous so we complete the migration
+                start = time.time()
+                if (not force_host_copy and
+                        self._copy_volume_data_offload(ctxt, volume,
+                                                       new_volume, host)):
+                    copy_path = 'array'
+                else:
+                    copy_path = 'host'
+                    self.driver.copy_volume_data(ctxt, volume, new_volume,
+                                                 remote='dest')
+                elapsed = max(time.time() - start, 0.001)
+                LOG.info(_("Copied volume %(vol1)s to %(vol2)s through the "
+                           "%(path)s in %(elapsed).1fs (%(rate).1f MB/s)") %
+                         {'vol1': volume['id'], 'vol2': new_volume['id'],
+                          'path': copy_path, 'elapsed': elapsed,
+                          'rate': volume['size'] * 1024 / elapsed})
+                # Both copies are synchronous so we complete the migration
                 self.migrate_volume_completion(ctxt, volume['id'],
                                                new_volume['id'], error=False)
             else:
@@ -879,6 +929,20 @@ class VolumeManager(manager.SchedulerDependentManager):
                     rpcapi.delete_volume(ctxt, new_volume)
                 new_volume['migration_status'] = None
 
+    def copy_volume_offload(self, context, volume_id, src_info):
+        """Copy a volume of the same array into volume_id on the array.
+
+        Called on the destination host of a migration, returns whether
+        the driver copied the data.
+        """
+        # NOTE(flaper87): Verify the driver is enabled
+        # before going forward. The exception will be caught
+        # and the migration status updated.
+        utils.require_driver_initialized(self.driver)
+
+        volume_ref = self.db.volume_get(context, volume_id)
+        return self.driver.copy_volume_offload(context, src_info, volume_ref)
+
     def _get_original_status(self, volume):
         if (volume['instance_uuid'] is None and
                 volume['attached_host'] is None):
@@ -992,7 +1056,7 @@ class VolumeManager(manager.SchedulerDependentManager):
         if not moved:
             try:
                 self._migrate_volume_generic(ctxt, volume_ref, host,
-                                             new_type_id)
+                                             new_type_id, force_host_copy)
             except Exception:
                 with excutils.save_and_reraise_exception():
                     updates = {'migration_status': None}
@@ -1028,6 +1092,15 @@ class VolumeManager(manager.SchedulerDependentManager):
                 self.update_service_capabilities(volume_stats)
 
     def publish_service_capabilities(self, context):
+        """Collect driver status and then publish a full snapshot.
+
+        Schedulers call this when they need all of the capabilities again,
+        e.g. when they start or missed a capabilities delta.
+        """
+        self.reset_published_capabilities()
+        self._publish_driver_status(context)
+
+    def _publish_driver_status(self, context):
         """Collect driver status and then publish."""
         self._report_driver_status(context)
         self._publish_service_capabilities(context)
@@ -1224,4 +1297,4 @@ class VolumeManager(manager.SchedulerDependentManager):
             QUOTAS.commit(context, old_reservations, project_id=project_id)
         if new_reservations:
             QUOTAS.commit(context, new_reservations, project_id=project_id)
-        self.publish_service_capabilities(context)
+        self._publish_driver_status(context)
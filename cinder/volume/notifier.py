@@ -0,0 +1,200 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Asynchronous emitter for volume and snapshot usage notifications.
+
+Usage notifications are queued in memory and sent to the notification
+drivers from a greenthread, so that the request and manager threads do not
+wait on the message broker.  When the queue is full callers are held for up
+to usage_notification_queue_timeout seconds before the notification is
+dropped.
+
+The notification drivers take one message at a time; with the
+cinder.common.rpc_kombu rpc_backend, amqp_publish_batch_size batches the
+publishing of the messages.
+"""
+
+import uuid
+
+from eventlet import greenthread
+from eventlet import queue
+from eventlet import semaphore
+from oslo.config import cfg
+
+from cinder.openstack.common import jsonutils
+from cinder.openstack.common import log as logging
+from cinder.openstack.common.notifier import api as notifier_api
+from cinder.openstack.common import timeutils
+
+
+LOG = logging.getLogger(__name__)
+
+usage_notifier_opts = [
+    cfg.IntOpt('usage_notification_queue_size',
+               default=0,
+               help='Maximum number of usage notifications queued for '
+                    'asynchronous sending. 0 sends them synchronously'),
+    cfg.FloatOpt('usage_notification_queue_timeout',
+                 default=1.0,
+                 help='Seconds to wait for room in a full usage notification '
+                      'queue before the notification is dropped'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(usage_notifier_opts)
+
+
+# Queued by stop() to end the sending greenthread
+_STOP = object()
+
+
+class NotificationQueue(object):
+    """Bounded queue of notifications sent from a greenthread."""
+
+    def __init__(self, maxsize, timeout):
+        self.queue = queue.LightQueue(maxsize)
+        self.timeout = timeout
+        self.thread = None
+        # Notifications queued or being sent
+        self.pending = 0
+        self.stats = {'queued': 0, 'sent': 0, 'blocked': 0, 'dropped': 0}
+
+    def put(self, context, msg):
+        try:
+            self.queue.put_nowait((context, msg))
+        except queue.Full:
+            self.stats['blocked'] += 1
+            try:
+                self.queue.put((context, msg), timeout=self.timeout)
+            except queue.Full:
+                self.stats['dropped'] += 1
+                LOG.warn(_("Usage notification queue is full, dropped "
+                           "%(event_type)s notification %(message_id)s "
+                           "(%(dropped)d dropped so far).") %
+                         {'event_type': msg['event_type'],
+                          'message_id': msg['message_id'],
+                          'dropped': self.stats['dropped']})
+                return
+        self.pending += 1
+        self.stats['queued'] += 1
+        if self.thread is None:
+            self.thread = greenthread.spawn(self._run)
+
+    def _send(self, context, msg):
+        try:
+            for driver in notifier_api._get_drivers():
+                try:
+                    driver.notify(context, msg)
+                except Exception as e:
+                    LOG.exception(_("Problem '%(e)s' attempting to "
+                                    "send to notification system. "
+                                    "Payload=%(payload)s")
+                                  % {'e': e, 'payload': msg['payload']})
+            self.stats['sent'] += 1
+        finally:
+            self.pending -= 1
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            self._send(*item)
+
+    def flush(self):
+        """Send all queued notifications before returning.
+
+        Queued notifications are sent from the calling thread, then the
+        call waits for the one the greenthread may be sending.
+        """
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self.queue.put(item)
+                break
+            self._send(*item)
+        while self.pending > 0:
+            greenthread.sleep(0.01)
+
+    def stop(self):
+        """Send the queued notifications and end the greenthread."""
+        self.flush()
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.wait()
+            self.thread = None
+
+
+_queue = None
+_queue_create_sem = semaphore.Semaphore()
+
+
+def _get_queue():
+    global _queue
+    with _queue_create_sem:
+        if _queue is None:
+            _queue = NotificationQueue(
+                CONF.usage_notification_queue_size,
+                CONF.usage_notification_queue_timeout)
+    return _queue
+
+
+def notify(context, publisher_id, event_type, priority, payload):
+    """Send a usage notification, asynchronously if queueing is enabled.
+
+    Takes the same arguments as the openstack.common notifier api notify().
+    """
+    if CONF.usage_notification_queue_size <= 0:
+        notifier_api.notify(context, publisher_id, event_type, priority,
+                            payload)
+        return
+
+    if priority not in notifier_api.log_levels:
+        raise notifier_api.BadPriorityException(
+            _('%s not in valid priorities') % priority)
+
+    msg = dict(message_id=str(uuid.uuid4()),
+               publisher_id=publisher_id,
+               event_type=event_type,
+               priority=priority,
+               payload=jsonutils.to_primitive(payload,
+                                              convert_instances=True),
+               timestamp=str(timeutils.utcnow()))
+    _get_queue().put(context, msg)
+
+
+def flush():
+    """Send any queued usage notifications before the caller exits."""
+    if _queue is not None:
+        _queue.flush()
+
+
+def get_stats():
+    """Return the queued/sent/blocked/dropped counters of the queue."""
+    if _queue is None:
+        return {'queued': 0, 'sent': 0, 'blocked': 0, 'dropped': 0}
+    return dict(_queue.stats)
+
+
+def reset():
+    """Stop and discard the queue; used at shutdown and by unit tests."""
+    global _queue
+    with _queue_create_sem:
+        if _queue is not None:
+            _queue.stop()
+            _queue = None
@@ -84,6 +84,7 @@ def create(context, name, specs=None):
         LOG.exception(_('DB error: %s') % e)
         raise exception.QoSSpecsCreateFailed(name=name,
                                              qos_specs=specs)
+    volume_types.invalidate_cache()
     return qos_specs_ref
 
 
@@ -106,6 +107,7 @@ def update(context, qos_specs_id, specs):
         raise exception.QoSSpecsUpdateFailed(specs_id=qos_specs_id,
                                              qos_specs=specs)
 
+    volume_types.invalidate_cache()
     return res
 
 
@@ -132,6 +134,7 @@ def delete(context, qos_specs_id, force=False):
         db.qos_specs_disassociate_all(context, qos_specs_id)
 
     db.qos_specs_delete(context, qos_specs_id)
+    volume_types.invalidate_cache()
 
 
 def delete_keys(context, qos_specs_id, keys):
@@ -142,8 +145,11 @@ def delete_keys(context, qos_specs_id, keys):
 
     # make sure qos_specs_id is valid
     get_qos_specs(context, qos_specs_id)
-    for key in keys:
-        db.qos_specs_item_delete(context, qos_specs_id, key)
+    try:
+        for key in keys:
+            db.qos_specs_item_delete(context, qos_specs_id, key)
+    finally:
+        volume_types.invalidate_cache()
 
 
 def get_associations(context, specs_id):
@@ -193,6 +199,7 @@ def associate_qos_with_type(context, specs_id, type_id):
                 raise exception.InvalidVolumeType(reason=msg)
         else:
             db.qos_specs_associate(context, specs_id, type_id)
+            volume_types.invalidate_cache()
     except db_exc.DBError as e:
         LOG.exception(_('DB error: %s') % e)
         LOG.warn(_('Failed to associate qos specs '
@@ -207,6 +214,7 @@ def disassociate_qos_specs(context, specs_id, type_id):
     try:
         get_qos_specs(context, specs_id)
         db.qos_specs_disassociate(context, specs_id, type_id)
+        volume_types.invalidate_cache()
     except db_exc.DBError as e:
         LOG.exception(_('DB error: %s') % e)
         LOG.warn(_('Failed to disassociate qos specs '
@@ -221,6 +229,7 @@ def disassociate_all(context, specs_id):
     try:
         get_qos_specs(context, specs_id)
         db.qos_specs_disassociate_all(context, specs_id)
+        volume_types.invalidate_cache()
     except db_exc.DBError as e:
         LOG.exception(_('DB error: %s') % e)
         LOG.warn(_('Failed to disassociate qos specs %s.') % specs_id)
@@ -275,7 +284,8 @@ def get_qos_specs(ctxt, id):
     if ctxt is None:
         ctxt = context.get_admin_context()
 
-    return db.qos_specs_get(ctxt, id)
+    return volume_types._CACHE.get(('qos_specs', id),
+                                   lambda: db.qos_specs_get(ctxt, id))
 
 
 def get_qos_specs_by_name(context, name):
@@ -47,6 +47,7 @@ class VolumeAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
         1.11 - Adds mode parameter to attach_volume()
                to support volume read-only attaching.
         1.12 - Adds retype.
+        1.13 - Adds copy_volume_offload.
     '''
 
     BASE_RPC_API_VERSION = '1.0'
@@ -140,9 +141,15 @@ class VolumeAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
                                                  self.topic,
                                                  volume['host']))
 
-    def publish_service_capabilities(self, ctxt):
-        self.fanout_cast(ctxt, self.make_msg('publish_service_capabilities'),
-                         version='1.2')
+    def publish_service_capabilities(self, ctxt, host=None):
+        if host is None:
+            self.fanout_cast(ctxt,
+                             self.make_msg('publish_service_capabilities'),
+                             version='1.2')
+        else:
+            self.cast(ctxt, self.make_msg('publish_service_capabilities'),
+                      topic=rpc.queue_get_for(ctxt, self.topic, host),
+                      version='1.2')
 
     def accept_transfer(self, ctxt, volume, new_user, new_project):
         self.cast(ctxt,
@@ -195,3 +202,13 @@ class VolumeAPI(cinder.openstack.common.rpc.proxy.RpcProxy):
                                 reservations=reservations),
                   topic=rpc.queue_get_for(ctxt, self.topic, volume['host']),
                   version='1.12')
+
+    def copy_volume_offload(self, ctxt, volume, src_info, timeout=None):
+        return self.call(ctxt,
+                         self.make_msg('copy_volume_offload',
+                                       volume_id=volume['id'],
+                                       src_info=src_info),
+                         topic=rpc.queue_get_for(ctxt, self.topic,
+                                                 volume['host']),
+                         version='1.13',
+                         timeout=timeout)
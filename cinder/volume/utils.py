@@ -27,6 +27,7 @@ from cinder.openstack.common import strutils
 from cinder.openstack.common import timeutils
 from cinder import units
 from cinder import utils
+from cinder.volume import notifier
 
 
 CONF = cfg.CONF
@@ -93,9 +94,9 @@ def notify_about_volume_usage(context, volume, event_suffix,
 
     usage_info = _usage_from_volume(context, volume, **extra_usage_info)
 
-    notifier_api.notify(context, 'volume.%s' % host,
-                        'volume.%s' % event_suffix,
-                        notifier_api.INFO, usage_info)
+    notifier.notify(context, 'volume.%s' % host,
+                    'volume.%s' % event_suffix,
+                    notifier_api.INFO, usage_info)
 
 
 def _usage_from_snapshot(context, snapshot_ref, **extra_usage_info):
@@ -126,9 +127,9 @@ def notify_about_snapshot_usage(context, snapshot, event_suffix,
 
     usage_info = _usage_from_snapshot(context, snapshot, **extra_usage_info)
 
-    notifier_api.notify(context, 'snapshot.%s' % host,
-                        'snapshot.%s' % event_suffix,
-                        notifier_api.INFO, usage_info)
+    notifier.notify(context, 'snapshot.%s' % host,
+                    'snapshot.%s' % event_suffix,
+                    notifier_api.INFO, usage_info)
 
 
 def _calculate_count(size_in_m, blocksize):
@@ -20,6 +20,9 @@
 """Built-in volume type properties."""
 
 
+import copy
+import time
+
 from oslo.config import cfg
 
 from cinder import context
@@ -29,10 +32,77 @@ from cinder.openstack.common.db import exception as db_exc
 from cinder.openstack.common import log as logging
 
 
+volume_types_opts = [
+    cfg.IntOpt('volume_type_cache_ttl',
+               default=0,
+               help='Seconds volume types, their extra specs, encryption '
+                    'and QoS specs are cached for in each service. '
+                    'Changes are only seen straight away by the service '
+                    'that made them; other services, such as the '
+                    'scheduler and volume services, may use the old '
+                    'values for up to this many seconds. 0 disables the '
+                    'cache'),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(volume_types_opts)
 LOG = logging.getLogger(__name__)
 
 
+class LookupCache(object):
+    """Process-local cache of volume type and QoS specs lookups.
+
+    Entries expire volume_type_cache_ttl seconds after they were loaded.
+    invalidate() bumps the cache generation, which expires all entries at
+    once, including lookups that were in progress; the volume type and QoS
+    specs APIs call it whenever they change something.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self.entries = {}
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, key, load):
+        ttl = CONF.volume_type_cache_ttl
+        if ttl <= 0:
+            return load()
+
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry and entry[0] == self.generation and entry[1] > now:
+            self.stats['hits'] += 1
+            return copy.deepcopy(entry[2])
+
+        self.stats['misses'] += 1
+        generation = self.generation
+        value = load()
+        if generation == self.generation:
+            self.entries[key] = (generation, now + ttl, copy.deepcopy(value))
+        return value
+
+    def invalidate(self):
+        self.generation += 1
+        self.entries = {}
+        self.stats['invalidations'] += 1
+
+
+_CACHE = LookupCache()
+
+
+def invalidate_cache():
+    """Drop the cached volume types, extra specs, encryption and QoS specs."""
+    _CACHE.invalidate()
+
+
+def get_cache_stats():
+    """Return the hit, miss and invalidation counts of the lookup cache."""
+    stats = dict(_CACHE.stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = float(stats['hits']) / lookups if lookups else 0.0
+    return stats
+
+
 def create(context, name, extra_specs={}):
     """Creates volume types."""
     try:
@@ -43,6 +113,7 @@ def create(context, name, extra_specs={}):
         LOG.exception(_('DB error: %s') % e)
         raise exception.VolumeTypeCreateFailed(name=name,
                                                extra_specs=extra_specs)
+    invalidate_cache()
     return type_ref
 
 
@@ -53,6 +124,7 @@ def destroy(context, id):
         raise exception.InvalidVolumeType(reason=msg)
     else:
         db.volume_type_destroy(context, id)
+        invalidate_cache()
 
 
 def get_all_types(context, inactive=0, search_opts={}):
@@ -102,7 +174,7 @@ def get_volume_type(ctxt, id):
     if ctxt is None:
         ctxt = context.get_admin_context()
 
-    return db.volume_type_get(ctxt, id)
+    return _CACHE.get(('type', id), lambda: db.volume_type_get(ctxt, id))
 
 
 def get_volume_type_by_name(context, name):
@@ -111,7 +183,8 @@ def get_volume_type_by_name(context, name):
         msg = _("name cannot be None")
         raise exception.InvalidVolumeType(reason=msg)
 
-    return db.volume_type_get_by_name(context, name)
+    return _CACHE.get(('type_name', name),
+                      lambda: db.volume_type_get_by_name(context, name))
 
 
 def get_default_volume_type():
@@ -150,22 +223,27 @@ def is_encrypted(context, volume_type_id):
     if volume_type_id is None:
         return False
 
-    encryption = db.volume_type_encryption_get(context, volume_type_id)
+    encryption = get_volume_type_encryption(context, volume_type_id)
     return encryption is not None
 
 
 def get_volume_type_encryption(context, volume_type_id):
+    """Return the encryption specs of a volume type as a dict, or None."""
     if volume_type_id is None:
         return None
 
-    encryption = db.volume_type_encryption_get(context, volume_type_id)
-    return encryption
+    def _get_encryption():
+        encryption = db.volume_type_encryption_get(context, volume_type_id)
+        return dict(encryption) if encryption is not None else None
+
+    return _CACHE.get(('encryption', volume_type_id), _get_encryption)
 
 
 def get_volume_type_qos_specs(volume_type_id):
     ctxt = context.get_admin_context()
-    res = db.volume_type_qos_specs_get(ctxt,
-                                       volume_type_id)
+    res = _CACHE.get(('type_qos_specs', volume_type_id),
+                     lambda: db.volume_type_qos_specs_get(ctxt,
+                                                          volume_type_id))
     return res
 
 
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Report the import cost of each module loaded while starting cinder-api.
+
+Loads the osapi_volume WSGI application from a paste config the way
+cinder-api does, timing every module imported on the way, then prints the
+modules that took longest to import.  'self' is the time spent in the
+module itself and 'total' includes the modules it imported in turn.
+
+    tools/import_profile.py [--config-file etc/cinder/cinder.conf]
+                            [--paste-config etc/cinder/api-paste.ini]
+                            [--sort self|total] [-n 30]
+"""
+
+from __future__ import print_function
+
+import __builtin__
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir)))
+
+
+class ImportProfiler(object):
+    """Times imports by wrapping the __import__ builtin."""
+
+    def __init__(self):
+        self.stats = {}
+        self._stack = []
+        self._import = None
+
+    def __enter__(self):
+        self._import = __builtin__.__import__
+        __builtin__.__import__ = self._timed_import
+        return self
+
+    def __exit__(self, *exc_info):
+        __builtin__.__import__ = self._import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=None,
+                      level=-1):
+        before = set(sys.modules)
+        # Time spent importing nested modules is subtracted from the parent
+        self._stack.append(0.0)
+        start = time.time()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.time() - start
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            # Implicit relative imports leave None placeholders behind
+            loaded = [m for m in set(sys.modules) - before
+                      if sys.modules[m] is not None]
+            if loaded:
+                module = name
+                for candidate in loaded:
+                    if candidate.endswith('.' + name):
+                        module = candidate
+                self.stats[module] = (elapsed - nested, elapsed)
+
+    def report(self, sort, count):
+        index = 0 if sort == 'self' else 1
+        rows = sorted(self.stats.items(), key=lambda r: r[1][index],
+                      reverse=True)
+        print("%10s %10s  %s" % ('self (ms)', 'total (ms)', 'module'))
+        for module, (self_time, total) in rows[:count]:
+            print("%10.1f %10.1f  %s" % (self_time * 1000, total * 1000,
+                                         module))
+        print("%d modules imported" % len(self.stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--config-file', action='append', default=[])
+    parser.add_argument('--paste-config', default='etc/cinder/api-paste.ini')
+    parser.add_argument('--sort', choices=['self', 'total'], default='self')
+    parser.add_argument('-n', '--count', type=int, default=30)
+    args = parser.parse_args()
+
+    with ImportProfiler() as profiler:
+        start = time.time()
+        from cinder.openstack.common import gettextutils
+        gettextutils.install('cinder', lazy=False)
+
+        from oslo.config import cfg
+
+        from cinder.common import config  # noqa
+        from cinder import wsgi
+
+        cfg.CONF(['--config-file=%s' % f for f in args.config_file],
+                 project='cinder', default_config_files=[])
+        cfg.CONF.set_override('api_paste_config',
+                              os.path.abspath(args.paste_config))
+        wsgi.Loader().load_app('osapi_volume')
+        elapsed = time.time() - start
+
+    profiler.report(args.sort, args.count)
+    print("osapi_volume loaded in %.3fs" % elapsed)
+
+
+if __name__ == '__main__':
+    main()
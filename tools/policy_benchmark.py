@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Micro-benchmark of policy enforcement throughput.
+
+Runs the checks of every action in a policy file through the rule
+interpreter of the openstack.common policy brain, through the compiled rules
+of cinder.policy, and through cinder.policy.enforce() with one context for
+all checks as a single API request does.
+
+    tools/policy_benchmark.py [--policy-file etc/cinder/policy.json] [-n N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir)))
+
+from oslo.config import cfg
+
+from cinder.common import config  # noqa
+from cinder import context
+from cinder import exception
+from cinder.openstack.common import policy as common_policy
+from cinder import policy
+
+
+def _run(name, count, actions, check):
+    start = time.time()
+    for i in xrange(count):
+        for action in actions:
+            try:
+                check(action)
+            except exception.PolicyNotAuthorized:
+                pass
+    elapsed = time.time() - start
+    checks = count * len(actions)
+    print("%-24s %8d checks %8.3fs %10.0f checks/s" %
+          (name, checks, elapsed, checks / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--policy-file', default='etc/cinder/policy.json')
+    parser.add_argument('-n', '--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    cfg.CONF([], project='cinder', default_config_files=[])
+    cfg.CONF.set_override('policy_file', os.path.abspath(args.policy_file))
+
+    policy.reset()
+    policy.init()
+    actions = sorted(common_policy._BRAIN.rules)
+    target = {'project_id': 'project', 'user_id': 'user'}
+    ctxt = context.RequestContext('user', 'project', roles=['member'])
+
+    def interpreted(action):
+        common_policy.enforce(('rule:%s' % action,), target,
+                              ctxt.to_dict(), exception.PolicyNotAuthorized,
+                              action=action)
+
+    rules = policy._get_compiled_rules()
+
+    def compiled(action):
+        if not rules.check(action, target, ctxt.to_dict()):
+            raise exception.PolicyNotAuthorized(action=action)
+
+    def enforce(action):
+        policy.enforce(ctxt, action, target)
+
+    _run('interpreted', args.iterations, actions, interpreted)
+    _run('compiled', args.iterations, actions, compiled)
+    _run('enforce, same request', args.iterations, actions, enforce)
+
+
+if __name__ == '__main__':
+    main()